@@ -0,0 +1,24 @@
+import asyncio
+from fastapi import APIRouter, HTTPException
+from app.api.deps import require_session
+from app.models.analytics import AnalyticsQueryRequest, AnalyticsResult
+from app.services import analytics, query_cache
+
+router = APIRouter()
+
+@router.post("/analytics/query", response_model=AnalyticsResult)
+async def analytics_query(request: AnalyticsQueryRequest):
+    """Counts, unique users, conversion, funnels and top values over stored events"""
+    session = await require_session(request.session_id)
+    cache = query_cache.get_query_cache()
+    run = cache.run if cache is not None else analytics.run_query
+    try:
+        return await asyncio.to_thread(run, session.project_id or session.id, request.query)
+    except analytics.AnalyticsError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.get("/analytics/cache/stats")
+async def analytics_cache_stats():
+    """Query result cache size, hit rate and invalidations"""
+    cache = query_cache.get_query_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
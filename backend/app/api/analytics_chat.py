@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from app.api.deps import require_session
+from app.models.analytics import AnalyticsChatRequest, AnalyticsChatResponse
+
+# The analytics graph and planner import LangChain: loaded on first request
+router = APIRouter()
+
+@router.post("/analytics/chat", response_model=AnalyticsChatResponse)
+async def analytics_chat(request: AnalyticsChatRequest):
+    """Answer a question about the session's events ("What's our conversion rate today?")"""
+    session = await require_session(request.session_id)
+    from app.graphs import analytics_graph
+    state = await analytics_graph.ask(session.project_id or session.id, session.taxonomy, request.message)
+    return AnalyticsChatResponse(
+        reply=state["messages"][-1]["content"],
+        plan=state["plan"],
+        plan_source=state["plan_source"],
+        query=state["query"],
+        result=state["result"],
+    )
+
+@router.get("/analytics/chat/stats")
+async def analytics_chat_stats():
+    """Query plan cache hits and planning LLM calls"""
+    from app.graphs import query_planner
+    return query_planner.get_plan_cache().stats()
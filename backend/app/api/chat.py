@@ -1,18 +1,32 @@
 from fastapi import APIRouter, HTTPException
-from app.models.session import ChatRequest, ChatResponse, Message, SessionStatus
-from app.services import storage
-from app.graphs.conversation_graph import conversation_workflow
+from app.models.session import ChatRequest, ChatResponse, Message, SessionStatus, SetupSession
+from app.services import storage, tracing
+from app.services.context_window import CONTEXT_LOAD_MESSAGES, MessageLog, facts_summary
+from app.services.speculation import get_speculator
+from app.graphs.conversation_graph import get_conversation_workflow, predict_reply
+from app.graphs.checkpoint import run_turn
 from app.graphs.states import ConversationState
 from datetime import datetime
+from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.post("/sessions/{session_id}/message", response_model=ChatResponse)
 async def send_message(session_id: str, request: ChatRequest):
     """Send a message and get AI response"""
-    
-    # Get session
-    session = await storage.get_session(session_id)
+    with tracing.span("chat.turn", graph="conversation", session_id=session_id):
+        return await _send_message(session_id, request)
+
+async def _send_message(session_id: str, request: ChatRequest) -> ChatResponse:
+    speculator = get_speculator()
+    # The previous turn may still be finishing behind a speculated reply
+    await speculator.settle(session_id)
+
+    # Get session with its latest messages only
+    session = await storage.get_session(session_id, message_limit=CONTEXT_LOAD_MESSAGES)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -24,23 +38,59 @@ async def send_message(session_id: str, request: ChatRequest):
     )
     session.messages.append(user_message)
     
-    # Convert to graph state
+    # Convert to graph state: recent turns within the token budget, plus a
+    # summary of the facts extracted so far
+    context = MessageLog(session.messages).window()
     state: ConversationState = {
-        "messages": [{"role": m.role, "content": m.content} for m in session.messages],
+        # A copy: nodes append to the state's list in place
+        "messages": list(context),
+        "context_summary": facts_summary(session),
         "product_description": session.product_description,
         "domain": session.domain,
         "key_actions": session.key_actions,
         "user_segments": session.user_segments,
         "business_goals": session.business_goals,
-        "current_step": "greeting" if len(session.messages) == 1 else session.messages[-2].content,
-        "ready_for_labeling": False
+        "current_step": session.current_step or "greeting",
+        "ready_for_labeling": session.status == SessionStatus.READY_FOR_LABELING
     }
     
-    # Run through graph
-    result = conversation_workflow.invoke(state)
+    predicted = speculator.take(session_id, session.message_count, session.current_step)
+    if predicted is not None:
+        # The answer can't change the reply: send it now, extract behind it
+        speculator.defer(session_id, _finish_turn(session, context, state, predicted))
+        ready = predicted["ready_for_labeling"]
+        return ChatResponse(
+            response=predicted["reply"],
+            status=SessionStatus.READY_FOR_LABELING if ready else session.status,
+            ready_for_labeling=ready
+        )
+    return await _finish_turn(session, context, state)
+
+async def _finish_turn(
+    session: SetupSession, context: List[dict], state: ConversationState, predicted: Optional[dict] = None
+) -> ChatResponse:
+    # Run through graph (checkpointed per node, resumes a failed attempt at this turn)
+    try:
+        result = await run_turn(get_conversation_workflow(), session.id, state)
+    except Exception:
+        if predicted is None:
+            raise
+        # The reply is out already: move on without this answer's details
+        logger.exception("Deferred turn for %s failed; storing the speculated reply", session.id)
+        result = {
+            **state,
+            "messages": context + [{"role": "assistant", "content": predicted["reply"]}],
+            "current_step": predicted["current_step"],
+            "ready_for_labeling": predicted["ready_for_labeling"],
+        }
     
-    # Extract assistant response
-    assistant_messages = [m for m in result["messages"] if m["role"] == "assistant" and m not in state["messages"]]
+    # Extract assistant response (nodes only append, so new replies follow the context)
+    assistant_messages = [m for m in result["messages"][len(context):] if m["role"] == "assistant"]
+    if predicted is not None:
+        # Store what the user was shown
+        actual = assistant_messages[-1]["content"] if assistant_messages else ""
+        get_speculator().confirm(session.id, predicted["reply"], actual)
+        assistant_messages = [{"role": "assistant", "content": predicted["reply"]}]
     if assistant_messages:
         assistant_message = Message(
             role="assistant",
@@ -55,6 +105,7 @@ async def send_message(session_id: str, request: ChatRequest):
     session.key_actions = result.get("key_actions", [])
     session.user_segments = result.get("user_segments", [])
     session.business_goals = result.get("business_goals", [])
+    session.current_step = result.get("current_step")
     
     # Update status
     if result.get("ready_for_labeling"):
@@ -63,6 +114,9 @@ async def send_message(session_id: str, request: ChatRequest):
     # Save session
     await storage.update_session(session)
     
+    # Guess the next turn's reply while the user reads this one
+    get_speculator().prepare(session.id, session.message_count, session.current_step, lambda: predict_reply(result))
+    
     return ChatResponse(
         response=assistant_messages[-1]["content"] if assistant_messages else "I'm processing your response...",
         status=session.status,
@@ -0,0 +1,9 @@
+from fastapi import HTTPException
+from app.services import storage
+
+async def require_session(session_id: str, elements: bool = False):
+    """Session (without messages) or 404"""
+    session = await storage.get_session(session_id, message_limit=0, elements=elements)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
@@ -0,0 +1,44 @@
+from fastapi import APIRouter
+from app.api.deps import require_session
+from app.models.element import AnalyzeElementRequest, AnalyzeElementResponse
+from app.services import html_analyzer
+from app.services.element_index import check_and_add
+from app.services.html_analyzer import analyze_element
+
+router = APIRouter()
+
+@router.post("/elements/analyze", response_model=AnalyzeElementResponse)
+async def analyze_labeled_element(request: AnalyzeElementRequest):
+    """Page type, scope and property suggestions for a labeled element
+
+    With a session_id, also reports elements already labeled in that session
+    that look like this one, and records this element for later checks.
+    """
+    analysis = await analyze_element(request.element, llm_factory=_element_llm)
+    questions = list(analysis.clarification_questions)
+
+    similar = []
+    if request.session_id:
+        await require_session(request.session_id)
+        similar = await check_and_add(request.session_id, request.element, analysis.page_type)
+        if similar:
+            questions.insert(0, (
+                f"You already labeled '{similar[0].intent}' which looks similar. "
+                "Are these the same action or different?"
+            ))
+
+    return AnalyzeElementResponse(
+        analysis=analysis,
+        clarification_questions=questions,
+        requires_user_input=bool(questions),
+        similar_elements=similar,
+    )
+
+@router.get("/elements/cache/stats")
+async def element_cache_stats():
+    """Hit rate and size of the local element analysis cache"""
+    return html_analyzer.cache_stats()
+
+def _element_llm():
+    from app.graphs.conversation_graph import get_llm
+    return get_llm("analyze_element")
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Request
+from app.api.deps import require_session
+from app.services import ingestion
+from app.services.rule_engine import get_engine
+
+router = APIRouter()
+
+@router.post("/events/batch", status_code=202)
+async def ingest_events(session_id: str, request: Request):
+    """Bulk event ingestion: NDJSON body, optionally `Content-Encoding: gzip`
+
+    Events are cleaned with the session's approved taxonomy and queued for the
+    event sink. Responds 429 with Retry-After (and the line to resume from)
+    when the queue is full.
+    """
+    session = await require_session(session_id)
+    if session.taxonomy is None or not session.taxonomy.approved:
+        raise HTTPException(status_code=409, detail="Session has no approved taxonomy")
+
+    gzip = request.headers.get("content-encoding", "").lower() == "gzip"
+    try:
+        return await ingestion.ingest(
+            get_engine(session.taxonomy), session.project_id or session.id, request.stream(), gzip=gzip
+        )
+    except ingestion.QueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail={"error": str(e), "resume_from_line": e.resume_from_line},
+            headers={"Retry-After": str(ingestion.RETRY_AFTER_SECONDS)},
+        )
+    except ingestion.BodyTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ingestion.IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/events/stats")
+async def ingest_stats():
+    """Ingestion queue depth and event counts"""
+    return ingestion.get_ingestor().stats()
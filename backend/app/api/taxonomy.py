@@ -0,0 +1,41 @@
+import re
+from fastapi import APIRouter, HTTPException
+from app.api.deps import require_session
+from app.models.taxonomy import (
+    ApproveTaxonomyRequest,
+    ApproveTaxonomyResponse,
+    GenerateTaxonomyRequest,
+    GenerateTaxonomyResponse,
+)
+from app.services import storage
+from app.services.rule_engine import get_engine
+from app.services.taxonomy import generate_taxonomy, next_version
+
+router = APIRouter()
+
+@router.post("/taxonomy/generate", response_model=GenerateTaxonomyResponse)
+async def generate_session_taxonomy(request: GenerateTaxonomyRequest):
+    """Taxonomy preview from the session's key actions and labeled elements"""
+    session = await require_session(request.session_id, elements=True)
+    session.taxonomy = generate_taxonomy(session, next_version(session))
+    await storage.update_session(session)
+    return GenerateTaxonomyResponse(taxonomy_id=session.taxonomy.id, preview=session.taxonomy)
+
+@router.post("/taxonomy/approve", response_model=ApproveTaxonomyResponse)
+async def approve_session_taxonomy(request: ApproveTaxonomyRequest):
+    """Approve (optionally edited) or reject the session's taxonomy"""
+    session = await require_session(request.session_id)
+    if session.taxonomy is None or session.taxonomy.id != request.taxonomy_id:
+        raise HTTPException(status_code=409, detail="Taxonomy is not the session's latest version")
+
+    taxonomy = request.taxonomy or session.taxonomy
+    try:
+        # Compile now so invalid rules (bad regexes) fail here, not at ingestion
+        get_engine(taxonomy)
+    except re.error as e:
+        raise HTTPException(status_code=422, detail=f"Invalid rule pattern: {e}")
+    session.taxonomy = taxonomy.model_copy(update={"id": request.taxonomy_id, "approved": request.approved})
+    await storage.update_session(session)
+    return ApproveTaxonomyResponse(
+        status="approved" if request.approved else "rejected", taxonomy_id=request.taxonomy_id
+    )
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException
+from app.api.deps import require_session
+from app.models.job import Job
+from app.models.taxonomy import GenerateTaxonomyRequest
+from app.services import jobs
+from app.services.taxonomy import inputs_key, next_version
+
+router = APIRouter()
+
+async def _taxonomy_job(payload: dict, job: jobs.JobContext) -> dict:
+    from app.graphs import taxonomy_builder
+    return await taxonomy_builder.run_job(payload, job)
+
+jobs.register("taxonomy", _taxonomy_job)
+
+@router.post("/taxonomy/jobs", response_model=Job, status_code=202)
+async def submit_taxonomy_job(request: GenerateTaxonomyRequest):
+    """Build the full taxonomy (properties per event) in the background; poll GET /api/v1/taxonomy/jobs/{id}.
+
+    Submitting again while the job for the same inputs is queued or running
+    returns that job. When done, the result holds the taxonomy, which is
+    also the session's latest version unless a newer one was generated or
+    approved meanwhile ("superseded").
+    """
+    session = await require_session(request.session_id, elements=True)
+    return await jobs.get_runner().submit(
+        "taxonomy", inputs_key(session), {"session_id": session.id, "version": next_version(session)}
+    )
+
+@router.get("/taxonomy/jobs/{job_id}", response_model=Job)
+async def taxonomy_job_status(job_id: str):
+    """Status and progress (events defined so far) of a taxonomy job"""
+    job = jobs.get_runner().get(job_id)
+    if job is None or job.kind != "taxonomy":
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/stats")
+async def job_stats():
+    """Background jobs per status, queue depth and resumed steps"""
+    return jobs.get_runner().stats()
@@ -1,12 +1,25 @@
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
-import os
 
 from app.state import ConversationState, Message
+from app.graphs.registry import graph_registry
+from app.graphs.checkpoint import get_checkpointer, run_turn
+from app.services.context_window import recent
+from app.services.session_store import create_session_store
+from app.services.model_router import get_router
+from app.services.streaming import generate
+from app.services import tracing
+from app.services.tracing import instrument
 
-# Initialize LLM
-llm = ChatOpenAI(model="gpt-4", temperature=0.7, api_key=os.getenv("OPENAI_API_KEY"))
+# LLM
+# Each node's model comes from the model router (built on first use, so
+# importing this module doesn't load the OpenAI client); benchmarks and
+# notebooks may assign a stand-in model here instead
+llm = None
+
+def get_llm(node: str):
+    """Chat model for `node`"""
+    return llm if llm is not None else get_router().model(node)
 
 # Node functions (each is a step in conversation)
 
@@ -16,10 +29,10 @@ def greeting_node(state: ConversationState) -> ConversationState:
         # First interaction
         response = "Hi! I'm here to help you set up analytics. What type of product or app are you building?"
         state["messages"].append(Message(role="assistant", content=response))
-        state["current_stage"] = "product_discovery"
+    state["current_stage"] = "product_discovery"
     return state
 
-def product_discovery_node(state: ConversationState) -> ConversationState:
+async def product_discovery_node(state: ConversationState) -> ConversationState:
     """Classify product type and ask follow-up questions"""
     last_user_message = next((m["content"] for m in reversed(state["messages"]) if m["role"] == "user"), "")
     
@@ -35,10 +48,10 @@ def product_discovery_node(state: ConversationState) -> ConversationState:
         HumanMessage(content=f"User said: {last_user_message}\n\nClassify their product type and ask a relevant follow-up question.")
     ]
     
-    ai_response = llm.invoke(messages)
+    reply = await generate(get_llm("product_discovery"), messages, node="product_discovery")
     
     # Parse product type (simplified - in production use structured output)
-    content = ai_response.content.lower()
+    content = reply.lower()
     if "ecommerce" in content or "selling" in content:
         state["product_type"] = "ecommerce"
     elif "saas" in content or "software" in content:
@@ -51,12 +64,12 @@ def product_discovery_node(state: ConversationState) -> ConversationState:
         state["product_type"] = "other"
     
     state["product_description"] = last_user_message
-    state["messages"].append(Message(role="assistant", content=ai_response.content))
+    state["messages"].append(Message(role="assistant", content=reply))
     state["current_stage"] = "goal_understanding"
     
     return state
 
-def goal_understanding_node(state: ConversationState) -> ConversationState:
+async def goal_understanding_node(state: ConversationState) -> ConversationState:
     """Ask about analytics goals"""
     last_user_message = next((m["content"] for m in reversed(state["messages"]) if m["role"] == "user"), "")
     
@@ -84,8 +97,8 @@ def goal_understanding_node(state: ConversationState) -> ConversationState:
     Ask them what specific user actions they want to track (e.g., button clicks, purchases, signups).
     Keep it conversational and under 2 sentences."""
     
-    ai_response = llm.invoke([SystemMessage(content=system_prompt)])
-    state["messages"].append(Message(role="assistant", content=ai_response.content))
+    reply = await generate(get_llm("goal_understanding"), [SystemMessage(content=system_prompt)], node="goal_understanding")
+    state["messages"].append(Message(role="assistant", content=reply))
     state["current_stage"] = "labeling_ready"
     
     return state
@@ -101,20 +114,21 @@ def labeling_ready_node(state: ConversationState) -> ConversationState:
     return state
 
 # Routing logic
+STAGES = ["greeting", "product_discovery", "goal_understanding", "labeling_ready", "complete"]
+
+def route_entry(state: ConversationState) -> str:
+    """Resume at the stage saved in state"""
+    stage = state["current_stage"]
+    return stage if stage in STAGES else "greeting"
+
 def route_conversation(state: ConversationState) -> str:
     """Decide which node to go to next based on current stage"""
-    stage = state["current_stage"]
-    
-    if stage == "greeting":
-        return "product_discovery"
-    elif stage == "product_discovery":
-        return "goal_understanding"
-    elif stage == "goal_understanding":
-        return "labeling_ready"
-    elif stage == "labeling_ready":
-        return "complete"
-    else:
+    messages = state["messages"]
+    if messages and messages[-1]["role"] == "assistant":
+        # Assistant replied - end the turn and wait for the user
         return END
+    
+    return route_entry(state)
 
 # Build the graph
 def create_conversation_graph() -> StateGraph:
@@ -122,64 +136,48 @@ def create_conversation_graph() -> StateGraph:
     workflow = StateGraph(ConversationState)
     
     # Add nodes
-    workflow.add_node("greeting", greeting_node)
-    workflow.add_node("product_discovery", product_discovery_node)
-    workflow.add_node("goal_understanding", goal_understanding_node)
-    workflow.add_node("labeling_ready", labeling_ready_node)
+    workflow.add_node("greeting", instrument("node.setup.greeting", greeting_node))
+    workflow.add_node("product_discovery", instrument("node.setup.product_discovery", product_discovery_node))
+    workflow.add_node("goal_understanding", instrument("node.setup.goal_understanding", goal_understanding_node))
+    workflow.add_node("labeling_ready", instrument("node.setup.labeling_ready", labeling_ready_node))
     workflow.add_node("complete", lambda state: state)
+    workflow.add_node("resume", lambda state: state)
     
-    # Set entry point
-    workflow.set_entry_point("greeting")
+    # Each turn starts at the stage the previous one stopped at
+    workflow.set_entry_point("resume")
+    workflow.add_conditional_edges("resume", route_entry)
     
     # Add conditional edges based on stage
-    workflow.add_conditional_edges(
-        "greeting",
-        route_conversation,
-        {
-            "product_discovery": "product_discovery",
-            END: END
-        }
-    )
-    
-    workflow.add_conditional_edges(
-        "product_discovery",
-        route_conversation,
-        {
-            "goal_understanding": "goal_understanding",
-            END: END
-        }
-    )
-    
-    workflow.add_conditional_edges(
-        "goal_understanding",
-        route_conversation,
-        {
-            "labeling_ready": "labeling_ready",
-            END: END
-        }
-    )
-    
-    workflow.add_conditional_edges(
-        "labeling_ready",
-        route_conversation,
-        {
-            "complete": "complete",
-            END: END
-        }
-    )
+    workflow.add_conditional_edges("greeting", route_conversation)
+    workflow.add_conditional_edges("product_discovery", route_conversation)
+    workflow.add_conditional_edges("goal_understanding", route_conversation)
+    workflow.add_conditional_edges("labeling_ready", route_conversation)
     
     workflow.add_edge("complete", END)
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=get_checkpointer())
+
+# Compiled once per process, reused by every turn
+graph_registry.register("setup", create_conversation_graph)
+
+# Session state: bounded in-memory cache with write-behind to SQLite
+_state_store = create_session_store()
 
-# In-memory state storage (replace with Supabase later)
-_state_store = {}
+def get_state_store():
+    """Session state store used by run_conversation"""
+    return _state_store
 
 async def run_conversation(session_id: str, user_message: str) -> dict:
     """Run one turn of conversation"""
+    with tracing.span("chat.turn", graph="setup", session_id=session_id):
+        return await _conversation_turn(session_id, user_message)
+
+async def _conversation_turn(session_id: str, user_message: str) -> dict:
     # Load or create state
-    if session_id not in _state_store:
-        _state_store[session_id] = ConversationState(
+    with tracing.span("state_store.get"):
+        state = await _state_store.get(session_id)
+    if state is None:
+        state = ConversationState(
             session_id=session_id,
             user_id="temp",
             project_name=None,
@@ -191,18 +189,22 @@ async def run_conversation(session_id: str, user_message: str) -> dict:
             user_types=None,
             next_action=None,
         )
-    
-    state = _state_store[session_id]
+    else:
+        # Don't touch the cached copy until the turn has succeeded
+        state = {**state, "messages": list(state["messages"])}
     
     # Add user message
     state["messages"].append(Message(role="user", content=user_message))
     
-    # Run graph
-    graph = create_conversation_graph()
-    result = graph.invoke(state)
+    # Run graph (checkpointed per node, resumes a failed attempt at this turn)
+    graph = graph_registry.get("setup")
+    result = await run_turn(graph, session_id, state)
+    # Keep the stored history to the context window
+    result["messages"] = recent(result["messages"])
     
     # Save state
-    _state_store[session_id] = result
+    with tracing.span("state_store.put"):
+        await _state_store.put(session_id, result)
     
     # Return last assistant message
     last_assistant_msg = next((m["content"] for m in reversed(result["messages"]) if m["role"] == "assistant"), "")
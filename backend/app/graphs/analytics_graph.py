@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from langgraph.graph import StateGraph, END
+
+from app.graphs import query_planner
+from app.graphs.registry import graph_registry
+from app.graphs.states import AnalyticsChatState
+from app.models.analytics import AnalyticsQuery, AnalyticsResult, QueryPlan
+from app.models.taxonomy import Taxonomy
+from app.services import analytics, query_cache
+from app.services.event_store import get_event_store
+from app.services.tracing import instrument
+
+# Analytics question graph
+#
+# parse_question -> plan_query -> execute -> answer. Parameters come from the
+# question text, the plan from the plan cache or one LLM call
+# (app/graphs/query_planner.py), the numbers from the analytics engine behind
+# the result cache, and the reply is formatted locally: a repeated or
+# re-dated question makes no LLM call at all.
+
+# LLM
+# Planning calls go through the model router (node "plan_query"); benchmarks
+# and notebooks may assign a stand-in model here instead
+llm = None
+
+def vocabulary(taxonomy: Optional[Taxonomy], project_id: str) -> Tuple[List[str], List[str]]:
+    """Event and property names a plan may use: the approved taxonomy's, else what has been stored"""
+    if taxonomy is not None and taxonomy.approved and taxonomy.canonical_events:
+        events = [e.name for e in taxonomy.canonical_events]
+        properties = sorted({p for e in taxonomy.canonical_events for p in e.required_properties + e.optional_properties})
+        return events, properties
+    dictionaries = get_event_store().dictionaries(project_id)
+    return [v for v in dictionaries.events.values[1:]], [v for v in dictionaries.keys.values[1:]]
+
+# Node functions
+def parse_question_node(state: AnalyticsChatState) -> AnalyticsChatState:
+    """Split the question into parameters and intent"""
+    question = next((m["content"] for m in reversed(state["messages"]) if m["role"] == "user"), "")
+    today = datetime.now(timezone.utc).date()
+    state["question"] = question
+    state["parameters"], state["intent"] = query_planner.parse_question(question, today)
+    return state
+
+async def plan_query_node(state: AnalyticsChatState) -> AnalyticsChatState:
+    """Query plan for the intent (cached, or one LLM call)"""
+    try:
+        plan, source = await query_planner.plan_query(
+            llm, state["question"], state["intent"], state["events"], state["properties"]
+        )
+    except query_planner.PlanError as e:
+        state["error"] = str(e)
+        return state
+    state["plan"] = plan.model_dump()
+    state["plan_source"] = source
+    return state
+
+async def execute_node(state: AnalyticsChatState) -> AnalyticsChatState:
+    """Plan + parameters -> result (from the result cache when the data is unchanged)"""
+    query = AnalyticsQuery(**state["plan"], **state["parameters"])
+    cache = query_cache.get_query_cache()
+    run = cache.run if cache is not None else analytics.run_query
+    try:
+        result = await asyncio.to_thread(run, state["project_id"], query)
+    except analytics.AnalyticsError as e:
+        state["error"] = str(e)
+        return state
+    state["query"] = analytics.resolve_window(query).model_dump(mode="json")
+    state["result"] = result.model_dump(mode="json")
+    return state
+
+def _period(result: AnalyticsResult) -> str:
+    if result.start == result.end:
+        return f"on {result.start.isoformat()}"
+    return f"from {result.start.isoformat()} to {result.end.isoformat()}"
+
+def format_answer(plan: QueryPlan, result: AnalyticsResult) -> str:
+    period = _period(result)
+    if plan.kind in ("counts", "unique_users"):
+        unit = "events" if plan.kind == "counts" else "users"
+        if not result.totals:
+            return f"No matching events {period}."
+        parts = [f"{name}: {total:,} {unit}" for name, total in sorted(result.totals.items(), key=lambda i: -i[1])]
+        return f"{'; '.join(parts)} {period}."
+    if plan.kind in ("conversion", "funnel"):
+        first, last = result.steps[0], result.steps[-1]
+        if not first.users:
+            return f"No users did {first.event} {period}."
+        answer = (
+            f"{last.conversion:.1%} of users who did {first.event} went on to {last.event} {period} "
+            f"({last.users:,} of {first.users:,})."
+        )
+        if len(result.steps) > 2:
+            answer += " Steps: " + " -> ".join(f"{s.event} {s.users:,} ({s.step_conversion:.0%})" for s in result.steps)
+        return answer
+    if not result.values:
+        return f"No values of {plan.property} {period}."
+    values = ", ".join(f"{v['value']} ({v['count']:,})" for v in result.values)
+    return f"Top {plan.property} {period}: {values}."
+
+def answer_node(state: AnalyticsChatState) -> AnalyticsChatState:
+    """Reply from the result, or say what went wrong"""
+    if state.get("error"):
+        error = state["error"]
+        content = f"Sorry, I couldn't answer that: {error}" + ("" if error.endswith(("?", ".")) else ".")
+    else:
+        content = format_answer(QueryPlan(**state["plan"]), AnalyticsResult(**state["result"]))
+    state["messages"].append({"role": "assistant", "content": content})
+    return state
+
+# Routing function
+def route_after(state: AnalyticsChatState) -> str:
+    return "answer" if state.get("error") else "next"
+
+# Build graph
+def create_analytics_graph():
+    graph = StateGraph(AnalyticsChatState)
+
+    graph.add_node("parse_question", instrument("node.analytics.parse_question", parse_question_node))
+    graph.add_node("plan_query", instrument("node.analytics.plan_query", plan_query_node))
+    graph.add_node("execute", instrument("node.analytics.execute", execute_node))
+    graph.add_node("answer", instrument("node.analytics.answer", answer_node))
+
+    graph.set_entry_point("parse_question")
+    graph.add_edge("parse_question", "plan_query")
+    graph.add_conditional_edges("plan_query", route_after, {"next": "execute", "answer": "answer"})
+    graph.add_conditional_edges("execute", route_after, {"next": "answer", "answer": "answer"})
+    graph.add_edge("answer", END)
+
+    # One question per run: nothing to checkpoint
+    return graph.compile()
+
+# Compiled lazily on first use and shared across requests
+graph_registry.register("analytics", create_analytics_graph)
+
+async def ask(project_id: str, taxonomy: Optional[Taxonomy], question: str) -> AnalyticsChatState:
+    """Answer one analytics question"""
+    events, properties = vocabulary(taxonomy, project_id)
+    state: AnalyticsChatState = {
+        "messages": [{"role": "user", "content": question}],
+        "project_id": project_id,
+        "events": events,
+        "properties": properties,
+        "question": question,
+        "intent": "",
+        "parameters": {},
+        "plan": None,
+        "plan_source": None,
+        "query": None,
+        "result": None,
+        "error": None,
+    }
+    return await graph_registry.get("analytics").ainvoke(state)
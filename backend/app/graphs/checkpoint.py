@@ -0,0 +1,257 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.utils import ConfigurableFieldSpec
+from langgraph.checkpoint.base import BaseCheckpointSaver, Checkpoint, CheckpointAt
+
+# Per-node checkpoints
+#
+# Graphs compiled with the shared saver checkpoint at the end of every step
+# (i.e. after each node), keyed by thread_id = session id. A checkpoint only
+# lives while a turn is in flight: run_turn() deletes it once the turn
+# finishes, and the final state goes to the session store as before. If a
+# node fails (LLM error, timeout), the checkpoint survives and a retry of the
+# same turn resumes after the last completed node instead of rerunning the
+# LLM nodes before it.
+#
+# aput() only pickles into memory; a background task writes checkpoints to
+# SQLite in batches. A turn that finishes within one flush interval never
+# touches the disk.
+
+
+class BatchedCheckpointSaver(BaseCheckpointSaver):
+    """End-of-step checkpoints, buffered in memory and written behind to SQLite"""
+
+    at: CheckpointAt = CheckpointAt.END_OF_STEP
+
+    _path: Optional[str]
+    _flush_interval: float
+    _conn: Optional[sqlite3.Connection]
+    _lock: threading.Lock
+    _dirty: Dict[str, Optional[bytes]]
+    _flushing: Dict[str, Optional[bytes]]
+    _on_disk: set
+    _flush_task: Optional[asyncio.Task]
+    _flush_lock: asyncio.Lock
+    _stats: Dict[str, int]
+
+    def __init__(self, path: Optional[str] = "checkpoints.db", flush_interval: float = 0.25):
+        super().__init__()
+        self._path = path
+        self._flush_interval = flush_interval
+        self._conn = None
+        self._lock = threading.Lock()
+
+        # thread_id -> pickled checkpoint (None = delete) not yet on disk
+        self._dirty = {}
+        self._flushing = {}
+        self._on_disk = set()
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+
+        self._stats = {"puts": 0, "resumes": 0, "flushes": 0, "rows_written": 0}
+
+    class Config:
+        underscore_attrs_are_private = True
+
+    @property
+    def config_specs(self) -> List[ConfigurableFieldSpec]:
+        return [
+            ConfigurableFieldSpec(
+                id="thread_id",
+                annotation=str,
+                name="Thread ID",
+                description=None,
+                default="",
+                is_shared=True,
+            ),
+        ]
+
+    # Sync API (used by graph.invoke)
+
+    def get(self, config: RunnableConfig) -> Optional[Checkpoint]:
+        thread_id = _thread_id(config)
+        if not thread_id:
+            return None
+        encoded = self._buffered(thread_id)
+        if encoded is ...:
+            encoded = self._read(thread_id)
+        return pickle.loads(encoded) if encoded else None
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint) -> None:
+        thread_id = _thread_id(config)
+        if not thread_id:
+            # Ad-hoc runs (benchmarks, notebooks) are not checkpointed
+            return
+        self._stats["puts"] += 1
+        self._dirty[thread_id] = pickle.dumps(checkpoint)
+        if self._path is not None:
+            self._ensure_flusher()
+
+    # Async API (used by graph.ainvoke): no executor hop per step
+
+    async def aget(self, config: RunnableConfig) -> Optional[Checkpoint]:
+        thread_id = _thread_id(config)
+        if not thread_id:
+            return None
+        encoded = self._buffered(thread_id)
+        if encoded is ...:
+            encoded = await asyncio.to_thread(self._read, thread_id)
+        return pickle.loads(encoded) if encoded else None
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint) -> None:
+        self.put(config, checkpoint)
+
+    async def adelete(self, thread_id: str) -> None:
+        """Drop a thread's checkpoint once its turn has finished"""
+        if self._path is None:
+            self._dirty.pop(thread_id, None)
+        elif thread_id in self._on_disk or thread_id in self._flushing:
+            self._dirty[thread_id] = None
+        else:
+            self._dirty.pop(thread_id, None)
+
+    async def flush(self) -> None:
+        """Write buffered checkpoints and deletes in one transaction"""
+        if self._path is None:
+            return
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            self._flushing, self._dirty = self._dirty, {}
+            try:
+                await asyncio.to_thread(self._write_many, list(self._flushing.items()))
+            except Exception:
+                for thread_id, encoded in self._flushing.items():
+                    self._dirty.setdefault(thread_id, encoded)
+                raise
+            finally:
+                self._flushing = {}
+            self._stats["flushes"] += 1
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    def record_resume(self) -> None:
+        self._stats["resumes"] += 1
+
+    def stats(self) -> dict:
+        return {**self._stats, "buffered": len(self._dirty), "on_disk": len(self._on_disk)}
+
+    def _buffered(self, thread_id: str):
+        """Pickled checkpoint from memory, None if deleted, ... if not buffered"""
+        for buffer in (self._dirty, self._flushing):
+            if thread_id in buffer:
+                return buffer[thread_id]
+        return ...
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self._path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints (thread_id TEXT PRIMARY KEY, checkpoint BLOB NOT NULL)"
+            )
+            self._conn.commit()
+            self._on_disk = {row[0] for row in self._conn.execute("SELECT thread_id FROM checkpoints")}
+        return self._conn
+
+    def _read(self, thread_id: str) -> Optional[bytes]:
+        if self._path is None:
+            return None
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT checkpoint FROM checkpoints WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _write_many(self, rows: List[Tuple[str, Optional[bytes]]]) -> None:
+        with self._lock:
+            conn = self._connect()
+            upserts = [(tid, encoded) for tid, encoded in rows if encoded is not None]
+            deletes = [(tid,) for tid, encoded in rows if encoded is None]
+            conn.executemany("INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint) VALUES (?, ?)", upserts)
+            conn.executemany("DELETE FROM checkpoints WHERE thread_id = ?", deletes)
+            conn.commit()
+        self._on_disk.update(tid for tid, _ in upserts)
+        self._on_disk.difference_update(tid for tid, in deletes)
+        self._stats["rows_written"] += len(rows)
+
+    def _ensure_flusher(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Sync caller: write through
+            self._flushing, self._dirty = self._dirty, {}
+            try:
+                self._write_many(list(self._flushing.items()))
+            finally:
+                self._flushing = {}
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while self._dirty:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error:
+                continue
+
+
+def _thread_id(config: RunnableConfig) -> str:
+    return (config or {}).get("configurable", {}).get("thread_id") or ""
+
+
+_checkpointer: Optional[BatchedCheckpointSaver] = None
+
+
+def get_checkpointer() -> BatchedCheckpointSaver:
+    """Shared saver; CHECKPOINT_DB='' keeps checkpoints in memory only"""
+    global _checkpointer
+    if _checkpointer is None:
+        path = os.getenv("CHECKPOINT_DB", "checkpoints.db")
+        _checkpointer = BatchedCheckpointSaver(
+            path=path or None,
+            flush_interval=float(os.getenv("CHECKPOINT_FLUSH_INTERVAL_SECONDS", "0.25")),
+        )
+    return _checkpointer
+
+
+def _user_turns(messages) -> Tuple[int, str]:
+    user = [m for m in messages if m["role"] == "user"]
+    return len(user), user[-1]["content"] if user else ""
+
+
+async def run_turn(graph, thread_id: str, state: dict) -> dict:
+    """Run one conversation turn with per-node checkpoints.
+
+    If the previous attempt at this same turn (same user message) failed
+    part-way, resume it from its last checkpoint instead of starting over.
+    """
+    saver = get_checkpointer()
+    config = {"configurable": {"thread_id": thread_id}}
+
+    pending = await saver.aget(config)
+    # Each node's channel holds the whole state it passed on
+    pending_messages = next(
+        (v["messages"] for v in (pending or {}).get("channel_values", {}).values() if isinstance(v, dict) and "messages" in v),
+        None,
+    )
+    if pending_messages and _user_turns(pending_messages) == _user_turns(state["messages"]):
+        saver.record_resume()
+        result = await graph.ainvoke(None, config)
+    else:
+        result = await graph.ainvoke(state, config)
+
+    await saver.adelete(thread_id)
+    return result
@@ -1,28 +1,33 @@
-from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Optional
+
+from langgraph.graph import Graph, END
 from app.graphs.states import ConversationState
+from app.graphs.registry import graph_registry
+from app.graphs.nodes import GraphNode, compile_graph
+from app.graphs.checkpoint import get_checkpointer
+from app.graphs import extraction
 from app.models.session import Domain
+from app.services.model_router import get_router
+from app.services.tracing import instrument
 
 # LLM
-llm = ChatOpenAI(model="gpt-4-turbo-preview", temperature=0.7)
-
-# Output parsers
-class DomainClassification(BaseModel):
-    domain: Domain = Field(description="Classified domain")
-    reasoning: str = Field(description="Brief reasoning")
+# Each node's model comes from the model router (app/services/model_router.py);
+# benchmarks and notebooks may assign a stand-in model that every node uses
+llm = None
 
-class ExtractedActions(BaseModel):
-    actions: List[str] = Field(description="List of key actions mentioned")
+def get_llm(node: str):
+    """Chat model for `node`"""
+    return llm if llm is not None else get_router().model(node)
 
-class ExtractedSegments(BaseModel):
-    segments: List[str] = Field(description="List of user segments/types")
+def _last_user_message(state: ConversationState) -> str:
+    return next((m["content"] for m in reversed(state["messages"]) if m["role"] == "user"), "")
 
-class ExtractedGoals(BaseModel):
-    goals: List[str] = Field(description="List of business goals/metrics")
+def _fill_missing(state: ConversationState, result: extraction.Extraction) -> None:
+    """Keep details the user volunteered ahead of being asked"""
+    if result.actions and not state.get("key_actions"):
+        state["key_actions"] = result.actions
+    if result.goals and not state.get("business_goals"):
+        state["business_goals"] = result.goals
 
 # Node functions
 def greeting_node(state: ConversationState) -> ConversationState:
@@ -35,39 +40,25 @@ def greeting_node(state: ConversationState) -> ConversationState:
     state["current_step"] = "classify_domain"
     return state
 
-def classify_domain_node(state: ConversationState) -> ConversationState:
+async def classify_domain_node(state: ConversationState) -> ConversationState:
     """Classify the product domain"""
-    last_user_message = next((m["content"] for m in reversed(state["messages"]) if m["role"] == "user"), "")
-    
-    parser = PydanticOutputParser(pydantic_object=DomainClassification)
-    prompt = ChatPromptTemplate.from_template(
-        """Classify this product into a domain:
-        
-Product description: {description}
-
-Domains:
-- ecommerce: Online stores, marketplaces, retail
-- saas: B2B/B2C software products, platforms
-- content: Media, publishing, social networks
-- other: Everything else
-
-{format_instructions}"""
-    )
-    
-    chain = prompt | llm | parser
-    result = chain.invoke({
-        "description": last_user_message,
-        "format_instructions": parser.get_format_instructions()
-    })
+    last_user_message = _last_user_message(state)
+    result = await extraction.extract(llm, last_user_message, "domain", node="classify_domain", context=state.get("context_summary"))
     
     state["product_description"] = last_user_message
-    state["domain"] = result.domain
+    state["domain"] = result.domain or Domain.OTHER
+    _fill_missing(state, result)
     state["current_step"] = "ask_actions"
     
     return state
 
 def ask_actions_node(state: ConversationState) -> ConversationState:
     """Ask about key actions based on domain"""
+    if state.get("key_actions"):
+        # Already mentioned while describing the product
+        state["current_step"] = "ask_segments"
+        return state
+    
     domain = state.get("domain", Domain.OTHER)
     
     prompts = {
@@ -86,29 +77,12 @@ def ask_actions_node(state: ConversationState) -> ConversationState:
     
     return state
 
-def extract_actions_node(state: ConversationState) -> ConversationState:
+async def extract_actions_node(state: ConversationState) -> ConversationState:
     """Extract key actions from user response"""
-    last_user_message = next((m["content"] for m in reversed(state["messages"]) if m["role"] == "user"), "")
-    
-    parser = PydanticOutputParser(pydantic_object=ExtractedActions)
-    prompt = ChatPromptTemplate.from_template(
-        """Extract key actions/events from this response:
-
-User response: {response}
-
-Extract specific, actionable events. Convert to snake_case past tense where possible.
-Example: "add to cart" -> "added_to_cart"
-
-{format_instructions}"""
-    )
-    
-    chain = prompt | llm | parser
-    result = chain.invoke({
-        "response": last_user_message,
-        "format_instructions": parser.get_format_instructions()
-    })
+    result = await extraction.extract(llm, _last_user_message(state), "actions", node="extract_actions", context=state.get("context_summary"))
     
     state["key_actions"] = result.actions
+    _fill_missing(state, result)
     state["current_step"] = "ask_segments"
     
     return state
@@ -124,38 +98,24 @@ def ask_segments_node(state: ConversationState) -> ConversationState:
     
     return state
 
-def extract_segments_node(state: ConversationState) -> ConversationState:
+async def extract_segments_node(state: ConversationState) -> ConversationState:
     """Extract user segments"""
-    last_user_message = next((m["content"] for m in reversed(state["messages"]) if m["role"] == "user"), "")
-    
-    # Check if user said no/none
-    if any(word in last_user_message.lower() for word in ["no", "none", "same", "everyone"]):
-        state["user_segments"] = []
-        state["current_step"] = "ask_goals"
-        return state
-    
-    parser = PydanticOutputParser(pydantic_object=ExtractedSegments)
-    prompt = ChatPromptTemplate.from_template(
-        """Extract user segments/types from this response:
-
-User response: {response}
-
-{format_instructions}"""
-    )
-    
-    chain = prompt | llm | parser
-    result = chain.invoke({
-        "response": last_user_message,
-        "format_instructions": parser.get_format_instructions()
-    })
+    result = await extraction.extract(llm, _last_user_message(state), "segments", node="extract_segments", context=state.get("context_summary"))
     
     state["user_segments"] = result.segments
+    _fill_missing(state, result)
     state["current_step"] = "ask_goals"
     
     return state
 
 def ask_goals_node(state: ConversationState) -> ConversationState:
     """Ask about business goals"""
+    if state.get("business_goals"):
+        # Already mentioned earlier in the conversation
+        state["current_step"] = "complete"
+        state["ready_for_labeling"] = True
+        return state
+    
     message = {
         "role": "assistant",
         "content": "What metrics or goals are most important to you? For example: conversion rate, retention, revenue, engagement, etc."
@@ -165,24 +125,9 @@ def ask_goals_node(state: ConversationState) -> ConversationState:
     
     return state
 
-def extract_goals_node(state: ConversationState) -> ConversationState:
+async def extract_goals_node(state: ConversationState) -> ConversationState:
     """Extract business goals"""
-    last_user_message = next((m["content"] for m in reversed(state["messages"]) if m["role"] == "user"), "")
-    
-    parser = PydanticOutputParser(pydantic_object=ExtractedGoals)
-    prompt = ChatPromptTemplate.from_template(
-        """Extract business goals/metrics from this response:
-
-User response: {response}
-
-{format_instructions}"""
-    )
-    
-    chain = prompt | llm | parser
-    result = chain.invoke({
-        "response": last_user_message,
-        "format_instructions": parser.get_format_instructions()
-    })
+    result = await extraction.extract(llm, _last_user_message(state), "goals", node="extract_goals", context=state.get("context_summary"))
     
     state["business_goals"] = result.goals
     state["current_step"] = "complete"
@@ -202,41 +147,88 @@ def complete_node(state: ConversationState) -> ConversationState:
     return state
 
 # Routing function
+STEPS = [
+    "greeting",
+    "classify_domain",
+    "ask_actions",
+    "extract_actions",
+    "ask_segments",
+    "extract_segments",
+    "ask_goals",
+    "extract_goals",
+    "complete",
+]
+
+def route_entry(state: ConversationState) -> str:
+    """Resume the conversation at the saved step"""
+    step = state.get("current_step", "greeting")
+    return step if step in STEPS else "greeting"
+
 def route_conversation(state: ConversationState) -> str:
     """Route to next node based on current step"""
-    step = state.get("current_step", "greeting")
+    messages = state["messages"]
+    if messages and messages[-1]["role"] == "assistant":
+        # We just asked something - end the turn and wait for the user
+        return END
     
-    routes = {
-        "greeting": "classify_domain",
-        "classify_domain": "ask_actions",
-        "ask_actions": "extract_actions",
-        "extract_actions": "ask_segments",
-        "ask_segments": "extract_segments",
-        "extract_segments": "ask_goals",
-        "ask_goals": "extract_goals",
-        "extract_goals": "complete",
-        "complete": END
+    return route_entry(state)
+
+# Speculation (app/services/speculation.py)
+# Extraction step -> (step it moves on to, ready_for_labeling), when what
+# follows reads nothing the user's answer can change:
+# - ask_segments is a fixed question
+# - complete_node reads key_actions, which extract_goals doesn't write
+# - ask_goals reads business_goals and complete_node key_actions, which
+#   extract_segments only fills in when empty (_fill_missing)
+AFTER_ANSWER = {
+    "extract_actions": ("ask_segments", False),
+    "extract_goals": ("complete", True),
+    "extract_segments": ("ask_goals", False),
+}
+REPLY_NODES = {"ask_segments": ask_segments_node, "ask_goals": ask_goals_node, "complete": complete_node}
+
+def predict_reply(state: ConversationState) -> Optional[dict]:
+    """Reply, step and readiness the next turn will end with, whatever the user answers; None when the answer decides"""
+    step = state.get("current_step")
+    if step not in AFTER_ANSWER:
+        return None
+    if step == "extract_segments" and not (state.get("business_goals") and state.get("key_actions")):
+        return None
+
+    following, ready = AFTER_ANSWER[step]
+    predicted = {**state, "messages": [], "current_step": following, "ready_for_labeling": ready}
+    while not predicted["messages"]:
+        REPLY_NODES[predicted["current_step"]](predicted)
+    return {
+        "reply": predicted["messages"][-1]["content"],
+        "current_step": predicted["current_step"],
+        "ready_for_labeling": predicted.get("ready_for_labeling", False),
     }
-    
-    return routes.get(step, END)
 
 # Build graph
 def create_conversation_graph():
-    graph = StateGraph(ConversationState)
+    # Every node returns the whole state, so the graph passes it along as-is
+    # instead of merging it channel by channel like a StateGraph would
+    graph = Graph()
     
     # Add nodes
-    graph.add_node("greeting", greeting_node)
-    graph.add_node("classify_domain", classify_domain_node)
-    graph.add_node("ask_actions", ask_actions_node)
-    graph.add_node("extract_actions", extract_actions_node)
-    graph.add_node("ask_segments", ask_segments_node)
-    graph.add_node("extract_segments", extract_segments_node)
-    graph.add_node("ask_goals", ask_goals_node)
-    graph.add_node("extract_goals", extract_goals_node)
-    graph.add_node("complete", complete_node)
+    graph.add_node("greeting", GraphNode("greeting", instrument("node.conversation.greeting", greeting_node)))
+    graph.add_node("classify_domain", GraphNode("classify_domain", instrument("node.conversation.classify_domain", classify_domain_node)))
+    graph.add_node("ask_actions", GraphNode("ask_actions", instrument("node.conversation.ask_actions", ask_actions_node)))
+    graph.add_node("extract_actions", GraphNode("extract_actions", instrument("node.conversation.extract_actions", extract_actions_node)))
+    graph.add_node("ask_segments", GraphNode("ask_segments", instrument("node.conversation.ask_segments", ask_segments_node)))
+    graph.add_node("extract_segments", GraphNode("extract_segments", instrument("node.conversation.extract_segments", extract_segments_node)))
+    graph.add_node("ask_goals", GraphNode("ask_goals", instrument("node.conversation.ask_goals", ask_goals_node)))
+    graph.add_node("extract_goals", GraphNode("extract_goals", instrument("node.conversation.extract_goals", extract_goals_node)))
+    graph.add_node("complete", GraphNode("complete", instrument("node.conversation.complete", complete_node)))
+    graph.add_node("resume", GraphNode("resume", lambda state: state))
     
-    # Set entry point
-    graph.set_entry_point("greeting")
+    # Each turn starts where the previous one stopped
+    graph.set_entry_point("resume")
+    graph.add_conditional_edges(
+        "resume",
+        route_entry
+    )
     
     # Add conditional edges
     graph.add_conditional_edges(
@@ -276,7 +268,11 @@ def create_conversation_graph():
         route_conversation
     )
     
-    return graph.compile()
+    return compile_graph(graph, checkpointer=get_checkpointer())
+
+# Compiled lazily on first use and shared across requests
+graph_registry.register("conversation", create_conversation_graph)
 
-# Export compiled graph
-conversation_workflow = create_conversation_graph()
+def get_conversation_workflow():
+    """Shared compiled conversation graph"""
+    return graph_registry.get("conversation")
@@ -0,0 +1,254 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from langchain.output_parsers import PydanticOutputParser
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.exceptions import OutputParserException
+from pydantic import BaseModel, Field
+
+from app.models.session import Domain
+from app.services import metrics, tracing
+from app.services.llm_cache import get_llm_cache, model_name
+from app.services.llm_scheduler import get_scheduler
+from app.services.model_router import get_router
+
+# Combined extraction
+#
+# One structured-output call pulls domain, actions, segments and goals out of
+# a user message, whichever question it answered. Before that, a keyword
+# extractor runs locally; when it fully explains the message for the field
+# the current node needs, the LLM is skipped. Otherwise the model router
+# (app/services/model_router.py) asks the node's fast model and escalates to
+# the large one when the answer doesn't parse or doesn't answer the focus.
+
+
+class Extraction(BaseModel):
+    domain: Optional[Domain] = Field(default=None, description="Product domain, null if not mentioned")
+    actions: List[str] = Field(default_factory=list, description="User actions to track, snake_case past tense")
+    segments: List[str] = Field(default_factory=list, description="User segments/types, empty if everyone is the same")
+    goals: List[str] = Field(default_factory=list, description="Business goals/metrics")
+
+
+FIELDS = ("domain", "actions", "segments", "goals")
+
+# Built once; the prompt already carries the format instructions
+_parser = PydanticOutputParser(pydantic_object=Extraction)
+EXTRACTION_TEMPLATE = """Extract analytics setup details from what the user said.
+
+What the conversation has established so far: {context}
+
+User said: {message}
+(They were answering a question about: {focus})
+
+Fields:
+- domain: ecommerce (online stores, marketplaces, retail), saas (B2B/B2C software, platforms), content (media, publishing, social networks), other; null if not mentioned
+- actions: specific user actions/events to track in snake_case past tense, e.g. "add to cart" -> "added_to_cart"; [] if none
+- segments: user types/segments, e.g. free/paid, buyer/seller; [] if none or everyone is the same
+- goals: business goals/metrics, e.g. conversion_rate, retention, revenue; [] if none
+
+{format_instructions}"""
+_prompt = ChatPromptTemplate.from_template(EXTRACTION_TEMPLATE).partial(
+    format_instructions=_parser.get_format_instructions()
+)
+
+_rule_hits = metrics.counter("extraction_rule_hits_total", "Extractions answered by local rules")
+_llm_calls = metrics.counter("extraction_llm_calls_total", "Extractions that needed an LLM call")
+
+# Keyword tables (phrase -> value). Longer phrases are matched first.
+DOMAIN_KEYWORDS: Dict[str, Domain] = {
+    "ecommerce": Domain.ECOMMERCE, "e-commerce": Domain.ECOMMERCE, "online store": Domain.ECOMMERCE,
+    "store": Domain.ECOMMERCE, "shop": Domain.ECOMMERCE, "selling": Domain.ECOMMERCE, "sell": Domain.ECOMMERCE,
+    "retail": Domain.ECOMMERCE, "marketplace": Domain.ECOMMERCE, "products": Domain.ECOMMERCE,
+    "saas": Domain.SAAS, "software": Domain.SAAS, "platform": Domain.SAAS, "subscription": Domain.SAAS,
+    "b2b": Domain.SAAS, "tool": Domain.SAAS, "dashboard": Domain.SAAS, "crm": Domain.SAAS,
+    "blog": Domain.CONTENT, "media": Domain.CONTENT, "news": Domain.CONTENT, "publishing": Domain.CONTENT,
+    "magazine": Domain.CONTENT, "podcast": Domain.CONTENT, "video": Domain.CONTENT,
+    "social network": Domain.CONTENT, "community": Domain.CONTENT, "articles": Domain.CONTENT,
+}
+
+ACTION_KEYWORDS: Dict[str, str] = {
+    "product view": "product_viewed", "product views": "product_viewed", "view product": "product_viewed",
+    "add to cart": "added_to_cart", "add-to-cart": "added_to_cart", "added to cart": "added_to_cart",
+    "checkout": "checkout_started", "purchase": "order_completed", "purchases": "order_completed",
+    "order": "order_completed", "orders": "order_completed", "buy": "order_completed",
+    "sign up": "signed_up", "sign-up": "signed_up", "sign-ups": "signed_up", "signup": "signed_up",
+    "signups": "signed_up", "registration": "signed_up", "login": "logged_in", "log in": "logged_in",
+    "upgrade": "plan_upgraded", "upgrades": "plan_upgraded", "invite": "user_invited", "invites": "user_invited",
+    "search": "searched", "searches": "searched", "share": "content_shared", "shares": "content_shared",
+    "comment": "comment_posted", "comments": "comment_posted", "video play": "video_played",
+    "video plays": "video_played", "article view": "article_viewed", "article views": "article_viewed",
+    "subscribe": "subscribed", "download": "file_downloaded", "downloads": "file_downloaded",
+    "feature usage": "feature_used", "form submit": "form_submitted", "form submissions": "form_submitted",
+}
+
+SEGMENT_KEYWORDS: Dict[str, str] = {
+    "free": "free", "paid": "paid", "premium": "premium", "trial": "trial",
+    "buyer": "buyer", "buyers": "buyer", "seller": "seller", "sellers": "seller",
+    "admin": "admin", "admins": "admin", "member": "member", "members": "member",
+    "guest": "guest", "guests": "guest", "vendor": "vendor", "vendors": "vendor",
+    "creator": "creator", "creators": "creator", "viewer": "viewer", "viewers": "viewer",
+    "subscriber": "subscriber", "subscribers": "subscriber", "enterprise": "enterprise",
+}
+
+NO_SEGMENT_WORDS = {"no", "none", "nope", "same", "everyone", "all"}
+
+# Same vocabulary the setup graph's goal_understanding_node uses
+GOAL_KEYWORDS: Dict[str, str] = {
+    "conversion": "conversion_rate",
+    "purchase": "conversion_rate",
+    "signup": "signups",
+    "engagement": "engagement",
+    "retention": "retention",
+    "funnel": "funnel_analysis",
+    "revenue": "revenue",
+    "churn": "churn",
+    "activation": "activation",
+    "average order value": "average_order_value",
+    "lifetime value": "lifetime_value",
+}
+
+# Words that carry no information on their own ("I want to track X and Y")
+FILLER = {
+    "i", "we", "want", "to", "track", "the", "a", "an", "and", "or", "our", "my", "is", "are",
+    "mostly", "mainly", "also", "like", "things", "stuff", "rate", "rates", "etc", "e.g", "maybe",
+    "would", "care", "about", "most", "important", "for", "of", "in", "on", "with", "it", "that",
+    "users", "user", "people", "customers", "yes", "yeah", "sure", "ok", "okay", "please", "just",
+    "have", "has", "do", "think", "main", "key", "actions", "events", "metrics", "goals",
+}
+
+_SNAKE_CASE = re.compile(r"[a-z][a-z0-9]*(_[a-z0-9]+)*")
+_CLAUSE_SPLIT = re.compile(r"[,;/\n]|\band\b|\bor\b|\bplus\b", re.IGNORECASE)
+
+
+def _compile(table: Dict[str, object]) -> List[Tuple[re.Pattern, object]]:
+    phrases = sorted(table, key=len, reverse=True)
+    return [(re.compile(rf"\b{re.escape(p)}\b", re.IGNORECASE), table[p]) for p in phrases]
+
+
+_DOMAIN_PATTERNS = _compile(DOMAIN_KEYWORDS)
+_ACTION_PATTERNS = _compile(ACTION_KEYWORDS)
+_SEGMENT_PATTERNS = _compile(SEGMENT_KEYWORDS)
+_GOAL_PATTERNS = _compile(GOAL_KEYWORDS)
+
+
+def _match_clauses(text: str, patterns) -> Tuple[List[str], bool]:
+    """Values found in `text`, and whether every clause was accounted for"""
+    values: List[str] = []
+    complete = True
+    for clause in _CLAUSE_SPLIT.split(text):
+        found = False
+        rest = clause
+        for pattern, value in patterns:
+            if pattern.search(rest):
+                found = True
+                rest = pattern.sub(" ", rest)
+                if value not in values:
+                    values.append(value)
+        leftover = [w for w in re.findall(r"[a-z0-9'-]+", rest.lower()) if w not in FILLER]
+        if leftover and not found:
+            complete = False
+    return values, complete
+
+
+def extract_with_rules(text: str) -> Tuple[Extraction, Dict[str, bool]]:
+    """Keyword extraction plus a per-field 'confident' flag"""
+    domains = []
+    for pattern, domain in _DOMAIN_PATTERNS:
+        if pattern.search(text) and domain not in domains:
+            domains.append(domain)
+
+    actions, actions_complete = _match_clauses(text, _ACTION_PATTERNS)
+    goals, goals_complete = _match_clauses(text, _GOAL_PATTERNS)
+
+    words = set(re.findall(r"[a-z']+", text.lower()))
+    if words and words <= NO_SEGMENT_WORDS | FILLER | {"one", "type", "kind", "types", "different"} and words & NO_SEGMENT_WORDS:
+        segments, segments_confident = [], True
+    else:
+        segments, segments_complete = _match_clauses(text, _SEGMENT_PATTERNS)
+        segments_confident = bool(segments) and segments_complete
+
+    result = Extraction(
+        domain=domains[0] if len(domains) == 1 else None,
+        actions=actions,
+        segments=segments,
+        goals=goals,
+    )
+    confident = {
+        "domain": len(domains) == 1,
+        "actions": bool(actions) and actions_complete,
+        "segments": segments_confident,
+        "goals": bool(goals) and goals_complete,
+    }
+    return result, confident
+
+
+def answers(result: Extraction, focus: str) -> bool:
+    """Whether an LLM extraction answers the question about `focus`"""
+    if focus == "segments":
+        return True  # [] is a valid answer: everyone is the same
+    if focus == "domain":
+        return result.domain is not None
+    values = getattr(result, focus)
+    if focus == "actions":
+        return bool(values) and all(_SNAKE_CASE.fullmatch(v) for v in values)
+    return bool(values)
+
+
+def _parse(content: str) -> Extraction:
+    with tracing.span("extraction.parse"):
+        return _parser.parse(content)
+
+
+async def extract(llm, text: str, focus: str, node: Optional[str] = None, context: Optional[str] = None) -> Extraction:
+    """Extract everything in `text`; `focus` is the field the caller needs.
+
+    Returns the rule-based result without an LLM call when the rules are
+    confident about `focus`. Otherwise makes one structured call for all
+    fields (answered from the LLM cache when possible) and backfills
+    anything it missed from the rules. `context` is the summary of earlier
+    turns (context_summary in graph state). The call goes to `llm` when
+    given, else to the model router's route for `node`.
+    """
+    rules, confident = extract_with_rules(text)
+    if confident.get(focus):
+        _rule_hits.inc()
+        return rules
+
+    node = node or focus
+    context = context or "(nothing yet)"
+    cache = get_llm_cache()
+    model = model_name(llm) if llm is not None else get_router().model_name(node)
+    # Keyed on the message alone: the summary differs per session and would
+    # rule out hits across sessions (and dominate the semantic tier's
+    # similarity); the message is what the fields are extracted from
+    cache_args = (node, EXTRACTION_TEMPLATE + focus, model, text)
+    cached = cache.get(*cache_args) if cache is not None else None
+
+    if cached is not None:
+        result = Extraction.model_validate(cached)
+    else:
+        _llm_calls.inc()
+        with tracing.span("extraction.prompt"):
+            messages = _prompt.format_messages(message=text, focus=focus, context=context)
+        try:
+            if llm is None:
+                result = await get_router().complete(node, messages, _parse, lambda r: answers(r, focus))
+            else:
+                with tracing.span("llm", model=model_name(llm)) as current:
+                    response = await get_scheduler().ainvoke(llm, messages)
+                    tracing.record_llm(
+                        current,
+                        sum(len(m.content) for m in messages),
+                        response.content,
+                        getattr(response, "response_metadata", None),
+                    )
+                result = _parse(response.content)
+        except OutputParserException:
+            return rules
+        if cache is not None:
+            cache.put(*cache_args, result.model_dump(mode="json"))
+
+    for field in FIELDS:
+        if not getattr(result, field) and getattr(rules, field):
+            setattr(result, field, getattr(rules, field))
+    return result
@@ -0,0 +1,75 @@
+import asyncio
+from typing import Callable
+
+from langchain_core.load.serializable import to_json_not_implemented
+from langchain_core.runnables import RunnableLambda, RunnableSequence
+from langgraph.graph.graph import CompiledGraph
+
+# Lightweight graph nodes
+#
+# LangChain serializes every runnable it invokes for the run's callbacks,
+# whether or not any callback is listening: the compiled graph once per
+# invoke, each node's step sequence once per step. For function nodes and
+# conditional edges that means reading and parsing their source (repr,
+# nonlocals) every time, which cost the conversation graph ~100 ms of CPU
+# per turn. Graphs compiled with `compile_graph` serialize by name instead,
+# and their sync nodes run inline rather than on an executor thread - the
+# nodes are short, CPU-only steps.
+
+
+class GraphNode(RunnableLambda):
+    """Graph node that runs `func` on the event loop and reprs as its name"""
+
+    def __init__(self, name: str, func: Callable):
+        if not asyncio.iscoroutinefunction(func):
+            sync = func
+
+            async def func(state):
+                return sync(state)
+
+        super().__init__(func)
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"GraphNode({self.name})"
+
+    @property
+    def deps(self):
+        return []
+
+
+class NodeSteps(RunnableSequence):
+    """A node's read | run | write sequence, serialized by its node's name"""
+
+    def to_json(self):
+        return to_json_not_implemented(self)
+
+    def __repr__(self) -> str:
+        return f"NodeSteps({self.first!r})"
+
+
+class NamedGraph(CompiledGraph):
+    """Compiled graph, serialized by its node names"""
+
+    def to_json(self):
+        return to_json_not_implemented(self)
+
+    def __repr__(self) -> str:
+        return f"NamedGraph({', '.join(self.graph.nodes)})"
+
+
+def compile_graph(graph, **kwargs) -> NamedGraph:
+    """`graph.compile(**kwargs)`, serialized by name (see above)"""
+    built = graph.compile(**kwargs)
+    compiled = NamedGraph(**{name: getattr(built, name) for name in built.__fields__})
+    for key in graph.nodes:
+        node = compiled.nodes[key]
+        if isinstance(node.bound, RunnableSequence):
+            compiled.nodes[key] = node.copy(update={"bound": NodeSteps(*node.bound.steps)})
+    for key, branches in graph.branches.items():
+        edges = compiled.nodes[f"{key}:edges"]
+        # Only a node's sole way out is a bare lambda; leave anything else as built
+        if len(branches) == 1 and type(edges.bound) is RunnableLambda:
+            condition = GraphNode(f"{key}_condition", branches[0].runnable)
+            compiled.nodes[f"{key}:edges"] = edges.copy(update={"bound": condition})
+    return compiled
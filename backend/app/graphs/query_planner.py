@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import re
+from datetime import date, timedelta
+from typing import Any, List, Optional, Tuple
+
+from langchain.output_parsers import PydanticOutputParser
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.exceptions import OutputParserException
+
+from app.models.analytics import QueryPlan
+from app.services import metrics, tracing
+from app.services.llm_cache import CacheTier, model_name, normalize
+from app.services.llm_scheduler import get_scheduler
+from app.services.model_router import get_router
+
+# Question -> query plan
+#
+# A question is split into its parameters (day range, "top N"), parsed locally,
+# and its intent: the rest of the text, normalized. The LLM only maps an
+# intent onto a QueryPlan (kind, events, property, interval), and plans are
+# cached per intent and event vocabulary, so "conversion rate today" and
+# "conversion rate last week" share one plan and only the first costs a call.
+# A taxonomy change alters the vocabulary and so the cache key. The call goes
+# through the model router as the "plan_query" node (MODEL_ROUTES applies; a
+# plan that doesn't parse or names untracked events escalates when the route
+# has an escalation tier).
+
+_plan_hits = metrics.counter("analytics_plan_cache_hits_total", "Analytics questions planned from cache")
+_plan_llm_calls = metrics.counter("analytics_plan_llm_calls_total", "Analytics questions planned by the LLM")
+
+NODE = "plan_query"  # Model router node
+
+_parser = PydanticOutputParser(pydantic_object=QueryPlan)
+PLAN_TEMPLATE = """Turn an analytics question into a query plan.
+
+Question: {question}
+
+Tracked events: {events}
+Known properties: {properties}
+
+Kinds:
+- counts: how many times events happened (interval "hour" for an hourly breakdown)
+- unique_users: how many distinct users did an event
+- conversion: share of users who did the first event that also did the later ones, in any order
+- funnel: like conversion, but the events must happen in order
+- top_values: most common values of a property, for the given events (or all events if none)
+
+Use only tracked event names. Ignore dates and "top N" numbers; they are applied separately.
+
+{format_instructions}"""
+_prompt = ChatPromptTemplate.from_template(PLAN_TEMPLATE).partial(
+    format_instructions=_parser.get_format_instructions()
+)
+
+# Words that don't change what is asked
+STOPWORDS = {
+    "what", "whats", "s", "is", "are", "was", "were", "our", "my", "the", "a", "an", "me", "show", "tell",
+    "please", "for", "of", "in", "on", "over", "during", "from", "between", "and", "to", "been", "has", "have",
+}
+MAX_PROMPT_PROPERTIES = 50
+
+_DAY = r"(\d{4}-\d{2}-\d{2})"
+
+
+def _last_month(today: date) -> Tuple[date, date]:
+    end = today.replace(day=1) - timedelta(days=1)
+    return end.replace(day=1), end
+
+
+def _last_week(today: date) -> Tuple[date, date]:
+    monday = today - timedelta(days=today.weekday())
+    return monday - timedelta(weeks=1), monday - timedelta(days=1)
+
+
+# (pattern, (match, today) -> (start, end)); first match wins
+_RANGES = [
+    (rf"\b{_DAY}\s*(?:to|until|through|-|–)\s*{_DAY}\b",
+     lambda m, today: (date.fromisoformat(m[1]), date.fromisoformat(m[2]))),
+    (rf"\bsince\s+{_DAY}\b", lambda m, today: (date.fromisoformat(m[1]), today)),
+    (rf"\b{_DAY}\b", lambda m, today: (date.fromisoformat(m[1]),) * 2),
+    (r"\btoday\b", lambda m, today: (today, today)),
+    (r"\byesterday\b", lambda m, today: (today - timedelta(days=1),) * 2),
+    (r"\b(?:last|past|previous)\s+(\d+)\s+days?\b",
+     lambda m, today: (today - timedelta(days=int(m[1]) - 1), today)),
+    (r"\b(?:last|past|previous)\s+(\d+)\s+weeks?\b",
+     lambda m, today: (today - timedelta(days=7 * int(m[1]) - 1), today)),
+    (r"\bthis\s+week\b", lambda m, today: (today - timedelta(days=today.weekday()), today)),
+    (r"\blast\s+week\b", lambda m, today: _last_week(today)),
+    (r"\bthis\s+month\b", lambda m, today: (today.replace(day=1), today)),
+    (r"\blast\s+month\b", lambda m, today: _last_month(today)),
+]
+_RANGES = [(re.compile(pattern, re.IGNORECASE), resolve) for pattern, resolve in _RANGES]
+_TOP_N = re.compile(r"\btop\s+(\d+)\b", re.IGNORECASE)
+
+
+def parse_question(text: str, today: date) -> Tuple[dict, str]:
+    """(parameters, intent): start/end/limit found in `text`, and what's left, normalized"""
+    parameters: dict = {}
+    for pattern, resolve in _RANGES:
+        match = pattern.search(text)
+        if match:
+            try:
+                start, end = resolve(match, today)
+            except ValueError:  # 2024-13-45
+                continue
+            parameters["start"], parameters["end"] = start, end
+            text = text[:match.start()] + " " + text[match.end():]
+            break
+    match = _TOP_N.search(text)
+    if match:
+        parameters["limit"] = max(1, min(int(match[1]), 1000))
+        text = text[:match.start()] + " top " + text[match.end():]
+    words = [w for w in normalize(text).split() if w not in STOPWORDS]
+    return parameters, " ".join(words)
+
+
+def vocabulary_key(events: List[str], properties: List[str]) -> str:
+    raw = json.dumps([sorted(events), sorted(properties)])
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+class PlanCache:
+    """LRU of plans per (vocabulary, intent)"""
+
+    def __init__(self, max_entries: int = 2000):
+        self.tier = CacheTier(max_entries, max_bytes=max_entries * 1024, ttl_seconds=None)
+        self.llm_calls = 0
+
+    def get(self, vocabulary: str, intent: str) -> Optional[QueryPlan]:
+        value = self.tier.get((vocabulary, intent))
+        return QueryPlan.model_validate(value) if value is not None else None
+
+    def put(self, vocabulary: str, intent: str, plan: QueryPlan) -> None:
+        value = plan.model_dump()
+        self.tier.put((vocabulary, intent), value, len(json.dumps(value)) + len(intent))
+
+    def stats(self) -> dict:
+        return {**self.tier.stats(), "llm_calls": self.llm_calls}
+
+
+_cache: Optional[PlanCache] = None
+
+
+def get_plan_cache() -> PlanCache:
+    global _cache
+    if _cache is None:
+        _cache = PlanCache(int(os.getenv("ANALYTICS_PLAN_CACHE_MAX_ENTRIES", "2000")))
+    return _cache
+
+
+class PlanError(ValueError):
+    """The question can't be mapped onto a query"""
+
+
+def validate(plan: QueryPlan, events: List[str]) -> QueryPlan:
+    unknown = [name for name in plan.events if name not in events]
+    if unknown:
+        raise PlanError(f"Not tracked: {', '.join(unknown)}")
+    if plan.kind in ("conversion", "funnel") and len(plan.events) < 2:
+        raise PlanError(f"A {plan.kind} needs at least two events")
+    if plan.kind == "unique_users" and not plan.events:
+        raise PlanError("Which event should users be counted for?")
+    if plan.kind == "top_values" and not plan.property:
+        raise PlanError("Which property should values be counted for?")
+    return plan
+
+
+async def plan_query(
+    llm: Optional[Any], question: str, intent: str, events: List[str], properties: List[str]
+) -> Tuple[QueryPlan, str]:
+    """Plan for `intent` from cache, else from one LLM call (cached when valid); returns (plan, source)
+
+    The call goes to `llm` when given, else to the model router's route for
+    the plan_query node.
+    """
+    cache = get_plan_cache()
+    vocabulary = vocabulary_key(events, properties)
+    plan = cache.get(vocabulary, intent)
+    if plan is not None:
+        _plan_hits.inc()
+        return plan, "cache"
+
+    _plan_llm_calls.inc()
+    cache.llm_calls += 1
+    with tracing.span("query_planner.prompt"):
+        messages = _prompt.format_messages(
+            question=question,
+            events=", ".join(events) or "(none yet)",
+            properties=", ".join(properties[:MAX_PROMPT_PROPERTIES]) or "(none yet)",
+        )
+
+    def parse(content: str) -> QueryPlan:
+        return validate(_parser.parse(content), events)
+
+    try:
+        if llm is None:
+            plan = await get_router().complete(NODE, messages, parse)
+        else:
+            with tracing.span("llm", model=model_name(llm)) as current:
+                response = await get_scheduler().ainvoke(llm, messages)
+                tracing.record_llm(
+                    current,
+                    sum(len(m.content) for m in messages),
+                    response.content,
+                    getattr(response, "response_metadata", None),
+                )
+            plan = parse(response.content)
+    except OutputParserException:
+        raise PlanError("Couldn't turn that into a query")
+    cache.put(vocabulary, intent, plan)
+    return plan, "llm"
@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.services import tracing
+
+# Compiled graph registry
+#
+# Graphs are stateless once compiled (all per-session data lives in the state
+# passed to invoke), so a single compiled instance per variant can be shared
+# by every request in the process. Builders are registered by name and only
+# run on first use; `swap`/`reload` replace the compiled graph atomically so
+# in-flight turns keep the instance they already fetched.
+
+GraphBuilder = Callable[[], Any]
+
+
+class GraphStats:
+    """Build/usage counters for one graph variant"""
+
+    def __init__(self):
+        self.builds = 0
+        self.hits = 0
+        self.last_build_ms: Optional[float] = None
+        self.total_build_ms = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "builds": self.builds,
+            "hits": self.hits,
+            "last_build_ms": self.last_build_ms,
+            "total_build_ms": round(self.total_build_ms, 3),
+        }
+
+
+class GraphRegistry:
+    """Process-wide cache of compiled LangGraph graphs"""
+
+    def __init__(self):
+        self._builders: Dict[str, GraphBuilder] = {}
+        self._graphs: Dict[str, Any] = {}
+        self._stats: Dict[str, GraphStats] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, builder: GraphBuilder) -> None:
+        """Register a graph builder. Re-registering drops the compiled graph."""
+        with self._lock:
+            self._builders[name] = builder
+            self._graphs.pop(name, None)
+            self._stats.setdefault(name, GraphStats())
+
+    def get(self, name: str) -> Any:
+        """Return the compiled graph for `name`, building it on first use"""
+        graph = self._graphs.get(name)
+        if graph is not None:
+            self._stats[name].hits += 1
+            return graph
+
+        with self._lock:
+            # Another request may have built it while we waited for the lock
+            graph = self._graphs.get(name)
+            if graph is not None:
+                self._stats[name].hits += 1
+                return graph
+
+            if name not in self._builders:
+                raise KeyError(f"No graph registered under '{name}'")
+
+            graph = self._build(name, self._builders[name])
+            self._graphs[name] = graph
+            return graph
+
+    def swap(self, name: str, builder: GraphBuilder) -> Any:
+        """Build a new definition and replace the live graph in one step"""
+        self._stats.setdefault(name, GraphStats())
+        graph = self._build(name, builder)
+        with self._lock:
+            self._builders[name] = builder
+            self._graphs[name] = graph
+        return graph
+
+    def reload(self, name: str) -> Any:
+        """Rebuild `name` from its registered builder"""
+        if name not in self._builders:
+            raise KeyError(f"No graph registered under '{name}'")
+        return self.swap(name, self._builders[name])
+
+    def stats(self) -> dict:
+        """Build time and cache hit counters per graph variant"""
+        return {
+            name: {**stats.to_dict(), "compiled": name in self._graphs}
+            for name, stats in self._stats.items()
+        }
+
+    def _build(self, name: str, builder: GraphBuilder) -> Any:
+        start = time.perf_counter()
+        with tracing.span("graph.compile", graph=name):
+            graph = builder()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        stats = self._stats[name]
+        stats.builds += 1
+        stats.last_build_ms = round(elapsed_ms, 3)
+        stats.total_build_ms += elapsed_ms
+        return graph
+
+
+# Shared registry for the whole process
+graph_registry = GraphRegistry()
@@ -3,7 +3,8 @@ from app.models.session import Domain
 
 class ConversationState(TypedDict):
     """State for the conversation graph"""
-    messages: List[dict]  # [{"role": "user/assistant", "content": "..."}]
+    messages: List[dict]  # [{"role": "user/assistant", "content": "..."}], recent turns only
+    context_summary: Optional[str]  # Facts extracted so far (app/services/context_window.py)
     
     # Extracted information
     product_description: Optional[str]
@@ -15,3 +16,18 @@ class ConversationState(TypedDict):
     # Control flow
     current_step: str  # greeting, classify_domain, ask_actions, ask_segments, ask_goals, complete
     ready_for_labeling: bool
+
+class AnalyticsChatState(TypedDict):
+    """State for the analytics question graph (one question per run)"""
+    messages: List[dict]
+    project_id: str
+    events: List[str]  # Vocabulary the plan may use (approved taxonomy, else stored events)
+    properties: List[str]
+    question: str
+    intent: str  # Question without its parameters, normalized
+    parameters: dict  # start / end / limit parsed from the question
+    plan: Optional[dict]
+    plan_source: Optional[str]  # cache, llm
+    query: Optional[dict]
+    result: Optional[dict]
+    error: Optional[str]
@@ -0,0 +1,167 @@
+import json
+from functools import partial
+from typing import List
+
+from langchain.output_parsers import PydanticOutputParser
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.exceptions import OutputParserException
+from pydantic import BaseModel, Field
+
+from app.models.session import SetupSession
+from app.models.taxonomy import CanonicalEvent
+from app.services import metrics, storage, tracing
+from app.services.jobs import JobContext, JobError
+from app.services.llm_cache import get_llm_cache, model_name
+from app.services.llm_scheduler import background, get_scheduler
+from app.services.model_router import get_router
+from app.services.rule_engine import snake_case
+from app.services.taxonomy import generate_taxonomy, taxonomy_version
+
+# Taxonomy build job
+#
+# Runs as a background job (app/services/jobs.py). The rule-based preview
+# (app/services/taxonomy.py) gives the canonical events; then one LLM call per
+# event, run in parallel, picks its required and optional properties from what
+# the conversation collected and the elements labeled for it. Each event is a
+# job step, so a job resumed after a crash only asks about the events it hadn't
+# finished. The calls go through the model router's taxonomy_event route
+# (app/services/model_router.py) and run at background priority in the LLM
+# scheduler, so chat turns go first.
+
+MAX_PROPERTIES = 12
+MAX_PROMPT_ELEMENTS = 10
+NODE = "taxonomy_event"  # Model router node
+
+_llm_calls = metrics.counter("taxonomy_event_llm_calls_total", "Taxonomy event definitions asked of the LLM")
+
+
+class EventProperties(BaseModel):
+    required_properties: List[str] = Field(default_factory=list, description="snake_case properties every occurrence carries")
+    optional_properties: List[str] = Field(default_factory=list, description="snake_case properties worth capturing when present")
+
+
+_parser = PydanticOutputParser(pydantic_object=EventProperties)
+EVENT_TEMPLATE = """Define the properties of one analytics event.
+
+Product: {product}
+Domain: {domain}
+User segments: {segments}
+Business goals: {goals}
+
+Event: {event}
+Also seen as: {aliases}
+Elements labeled for it: {elements}
+
+List the properties this event should carry, in snake_case, split into
+required and optional. Prefer identifiers and values the goals depend on
+(ids, prices, plans) over presentation details.
+
+{format_instructions}"""
+_prompt = ChatPromptTemplate.from_template(EVENT_TEMPLATE).partial(
+    format_instructions=_parser.get_format_instructions()
+)
+
+# LLM
+# The model comes from the model router; benchmarks and notebooks may assign a
+# stand-in model that is used instead
+llm = None
+
+
+def _clean(names: List[str]) -> List[str]:
+    seen = []
+    for name in names:
+        name = snake_case(name)
+        if name and name not in seen:
+            seen.append(name)
+    return seen[:MAX_PROPERTIES]
+
+
+def session_context(session: SetupSession) -> dict:
+    """Prompt inputs shared by every event of the session"""
+    return {
+        "product": session.product_description or "(not described)",
+        "domain": session.domain.value if session.domain else "unknown",
+        "segments": ", ".join(session.user_segments) or "(none)",
+        "goals": ", ".join(session.business_goals) or "(none)",
+    }
+
+
+def _elements(session: SetupSession, event: CanonicalEvent) -> str:
+    labeled = [
+        f"{e.selector} on {e.page_type.value if e.page_type else 'a'} page {e.page_url}"
+        for e in session.labeled_elements
+        if snake_case(e.intent) == event.name
+    ]
+    return "; ".join(labeled[:MAX_PROMPT_ELEMENTS]) or "(none)"
+
+
+async def define_event(llm, context: dict, elements: str, event: CanonicalEvent) -> dict:
+    """`event` with LLM-chosen properties (as JSON); without properties if the answer doesn't parse
+
+    The call goes to `llm` when given, else to the model router's route for
+    the taxonomy_event node.
+    """
+    inputs = {**context, "event": event.name, "aliases": ", ".join(event.aliases) or "(none)", "elements": elements}
+    cache = get_llm_cache()
+    model = model_name(llm) if llm is not None else get_router().model_name(NODE)
+    cache_args = (NODE, EVENT_TEMPLATE, model, json.dumps(inputs, sort_keys=True))
+    cached = cache.get(*cache_args) if cache is not None else None
+    if cached is not None:
+        return cached
+
+    _llm_calls.inc()
+    messages = _prompt.format_messages(**inputs)
+    try:
+        if llm is None:
+            properties = await get_router().complete(NODE, messages, _parser.parse)
+        else:
+            with tracing.span("llm", model=model) as current:
+                response = await get_scheduler().ainvoke(llm, messages)
+                tracing.record_llm(
+                    current,
+                    sum(len(m.content) for m in messages),
+                    response.content,
+                    getattr(response, "response_metadata", None),
+                )
+            properties = _parser.parse(response.content)
+    except OutputParserException:
+        return event.model_dump(mode="json")
+
+    required = _clean(properties.required_properties)
+    optional = [name for name in _clean(properties.optional_properties) if name not in required]
+    result = event.model_copy(update={"required_properties": required, "optional_properties": optional})
+    result = result.model_dump(mode="json")
+    if cache is not None:
+        cache.put(*cache_args, result)
+    return result
+
+
+async def run_job(payload: dict, job: JobContext) -> dict:
+    """Job handler: payload {"session_id", "version"} -> {"taxonomy_id", "superseded", "taxonomy"}"""
+    session = await storage.get_session(payload["session_id"], message_limit=0, elements=True)
+    if session is None:
+        raise JobError("Session not found")
+
+    version = payload["version"]
+    preview = generate_taxonomy(session, version)
+    context = session_context(session)
+    job.plan(len(preview.canonical_events))
+    with background():
+        events = await job.map([
+            (f"event:{event.name}", partial(define_event, llm, context, _elements(session, event), event))
+            for event in preview.canonical_events
+        ])
+    taxonomy = preview.model_copy(update={"canonical_events": [CanonicalEvent.model_validate(e) for e in events]})
+
+    # Re-read: a newer version may have been generated, or this one approved, while the job ran
+    session = await storage.get_session(payload["session_id"], message_limit=0)
+    if session is None:
+        raise JobError("Session not found")
+    current = session.taxonomy
+    superseded = current is not None and (
+        taxonomy_version(current) > version or (taxonomy_version(current) == version and current.approved)
+    )
+    if not superseded:
+        session.taxonomy = taxonomy
+        await storage.update_session(session)
+    return {"taxonomy_id": taxonomy.id, "superseded": superseded, "taxonomy": taxonomy.model_dump(mode="json")}
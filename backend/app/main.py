@@ -1,15 +1,86 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import importlib
+import json
+import logging
 import os
+import sys
+import threading
+import time
 from dotenv import load_dotenv
 
-from app.conversation import create_conversation_graph, run_conversation
+from app.api import analytics, analytics_chat, elements, events, taxonomy, taxonomy_jobs
+from app.graphs.registry import graph_registry
+from app.services import ingestion, jobs, llm_scheduler, model_router, query_cache, speculation, storage, metrics
+from app.services.llm_cache import get_llm_cache
+from app.services.streaming import stream_events
 
 load_dotenv()
 
-app = FastAPI(title="BetterHeap Conversation API")
+logger = logging.getLogger(__name__)
+
+# Startup
+#
+# LangChain, LangGraph and the OpenAI client take seconds to import, so this
+# module doesn't import them: the conversation module is loaded on first use,
+# and (unless STARTUP_WARMUP=0) a background thread imports it, compiles the
+# graphs and builds the LLM clients right after startup. /health answers in
+# the meantime.
+
+_warmed_up = threading.Event()
+
+def _conversation():
+    """Conversation module (imports LangChain/LangGraph on first call)"""
+    from app import conversation
+    return conversation
+
+def _warm_up() -> None:
+    start = time.perf_counter()
+    try:
+        _conversation()
+        # Importing the graph modules registers their builders
+        importlib.import_module("app.graphs.conversation_graph")
+        importlib.import_module("app.graphs.analytics_graph")
+        graph_registry.get("setup")
+        graph_registry.get("conversation")
+        graph_registry.get("analytics")
+        model_router.get_router().warm_up()
+    except Exception:
+        logger.exception("Warm-up failed; components will load on first request")
+        return
+    metrics.histogram("startup_warmup_seconds", "Background import and graph compilation time").observe(
+        time.perf_counter() - start
+    )
+    _warmed_up.set()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if os.getenv("STARTUP_WARMUP", "1").lower() not in ("0", "false", "no"):
+        asyncio.get_running_loop().run_in_executor(None, _warm_up)
+    # Picks up jobs a previous process left unfinished
+    jobs.get_runner().start()
+    yield
+    await jobs.close()
+    # Store turns still finishing behind speculated replies
+    await speculation.close()
+    # Persist buffered session state before the worker exits
+    if "app.conversation" in sys.modules:
+        await _conversation().get_state_store().flush()
+    if "app.graphs.checkpoint" in sys.modules:
+        from app.graphs.checkpoint import get_checkpointer
+        await get_checkpointer().close()
+    await ingestion.close()
+    query_cache.close()
+    llm_scheduler.close()
+    model_router.close()
+    await storage.close()
+
+app = FastAPI(title="BetterHeap Conversation API", lifespan=lifespan)
 
 # CORS for Chrome extension
 app.add_middleware(
@@ -20,6 +91,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(elements.router, prefix="/api/v1")
+app.include_router(taxonomy.router, prefix="/api/v1")
+app.include_router(events.router, prefix="/api/v1")
+app.include_router(analytics.router, prefix="/api/v1")
+app.include_router(analytics_chat.router, prefix="/api/v1")
+app.include_router(taxonomy_jobs.router, prefix="/api/v1")
+
 # Request/Response models
 class CreateSessionRequest(BaseModel):
     user_id: str
@@ -75,7 +153,7 @@ async def chat_message(request: ChatMessageRequest):
         # For now, create fresh or use session storage
         
         # Run conversation graph
-        result = await run_conversation(request.session_id, request.message)
+        result = await _conversation().run_conversation(request.session_id, request.message)
         
         return ChatMessageResponse(
             reply=result["reply"],
@@ -84,6 +162,80 @@ async def chat_message(request: ChatMessageRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/v1/chat/stream")
+async def chat_stream(request: ChatMessageRequest):
+    """Same as /chat/message, streamed as server-sent events.
+
+    Emits `token` events as the LLM produces text, then one `done` event
+    with the full reply and next_action (or an `error` event).
+    """
+    ttft = metrics.histogram("chat_time_to_first_token_seconds", "Time from request to first streamed token")
+
+    async def events():
+        start = time.perf_counter()
+        streamed = False
+        try:
+            async for kind, payload in stream_events(lambda: _conversation().run_conversation(request.session_id, request.message)):
+                if kind == "token":
+                    if not streamed:
+                        ttft.observe(time.perf_counter() - start)
+                        streamed = True
+                    yield _sse("token", {"text": payload})
+                else:
+                    if not streamed:
+                        # Reply came from a non-LLM node: send it as one chunk
+                        ttft.observe(time.perf_counter() - start)
+                        yield _sse("token", {"text": payload["reply"]})
+                    yield _sse("done", ChatMessageResponse(**payload).model_dump())
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "warmed_up": _warmed_up.is_set()}
+
+@app.get("/api/v1/sessions/cache/stats")
+async def session_cache_stats():
+    """Session state cache hits, misses and evictions"""
+    return _conversation().get_state_store().stats()
+
+@app.get("/api/v1/sessions/speculation/stats")
+async def speculation_stats():
+    """Chat turns answered from a speculated reply (hit rate), invalidated or unpredictable"""
+    return speculation.get_speculator().stats()
+
+@app.get("/api/v1/llm/cache/stats")
+async def llm_cache_stats():
+    """LLM response cache hit rates per tier and per node"""
+    cache = get_llm_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@app.get("/api/v1/llm/scheduler/stats")
+async def llm_scheduler_stats():
+    """Queued and in-flight LLM calls, the current concurrency limit, 429s and coalesced calls"""
+    return llm_scheduler.get_scheduler().stats()
+
+@app.get("/api/v1/llm/routes/stats")
+async def model_route_stats():
+    """Routing policy in effect, and per-node calls, escalations, latency and estimated cost"""
+    return model_router.get_router().stats()
+
+@app.get("/api/v1/metrics")
+async def metrics_snapshot():
+    """Request-level metrics (e.g. chat time-to-first-token)"""
+    return metrics.snapshot()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (span timings, LLM tokens, caches, TTFT)"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/v1/graphs/stats")
+async def graph_stats():
+    """Compiled graph build times and cache hits"""
+    return graph_registry.stats()
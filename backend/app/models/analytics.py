@@ -0,0 +1,53 @@
+from datetime import date
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
+
+class AnalyticsQuery(BaseModel):
+    kind: Literal["counts", "unique_users", "conversion", "funnel", "top_values"]
+    events: List[str] = []  # Canonical event names; funnel steps in order
+    property: Optional[str] = None  # top_values: property to break down by
+    start: Optional[date] = None  # Inclusive UTC days; default the last 7 days
+    end: Optional[date] = None
+    interval: Literal["day", "hour"] = "day"  # counts / unique_users series
+    limit: int = Field(default=10, ge=1, le=1000)  # top_values
+
+class AnalyticsQueryRequest(BaseModel):
+    session_id: str
+    query: AnalyticsQuery
+
+class FunnelStep(BaseModel):
+    event: str
+    users: int
+    conversion: float  # From the first step
+    step_conversion: float  # From the previous step
+
+class AnalyticsResult(BaseModel):
+    kind: str
+    start: date
+    end: date
+    series: Dict[str, List[Dict[str, Any]]] = {}  # counts / unique_users: event -> [{"bucket", "value"}]
+    totals: Dict[str, int] = {}
+    steps: List[FunnelStep] = []  # conversion / funnel
+    values: List[Dict[str, Any]] = []  # top_values: [{"value", "count"}]
+    elapsed_ms: float = 0.0
+    cached: bool = False  # Served from the query cache (elapsed_ms is the original run's)
+
+class QueryPlan(BaseModel):
+    """Structure of a question's query; day range and top-N limit come from the question each time"""
+    kind: Literal["counts", "unique_users", "conversion", "funnel", "top_values"] = Field(
+        description="counts, unique_users, conversion, funnel or top_values"
+    )
+    events: List[str] = Field(default_factory=list, description="Tracked event names; funnel/conversion steps in order")
+    property: Optional[str] = Field(default=None, description="Property to break down by (top_values only)")
+    interval: Literal["day", "hour"] = Field(default="day", description="Bucket size for counts")
+
+class AnalyticsChatRequest(BaseModel):
+    session_id: str
+    message: str  # e.g. "What's our conversion rate today?"
+
+class AnalyticsChatResponse(BaseModel):
+    reply: str
+    plan: Optional[QueryPlan] = None
+    plan_source: Optional[Literal["cache", "llm"]] = None
+    query: Optional[AnalyticsQuery] = None
+    result: Optional[AnalyticsResult] = None
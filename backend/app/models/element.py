@@ -0,0 +1,69 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, List, Optional
+from enum import Enum
+
+class PageType(str, Enum):
+    PRODUCT_DETAIL = "product_detail"
+    PRODUCT_LISTING = "product_listing"
+    CART = "cart"
+    CHECKOUT = "checkout"
+    HOMEPAGE = "homepage"
+    OTHER = "other"
+
+class ElementScope(str, Enum):
+    SPECIFIC = "specific"  # Tied to one entity (this product)
+    GENERIC = "generic"  # Any instance (any product's button)
+    CONTEXTUAL = "contextual"  # Depends on user state (this user's cart)
+
+class LabeledElement(BaseModel):
+    """Element payload sent by the extension's content script"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: str
+    intent: str
+    selector: str
+    text_content: str = Field("", alias="textContent")
+    page_url: str = Field(alias="pageUrl")
+    page_title: Optional[str] = Field(None, alias="pageTitle")
+    # Outer HTML around the element (e.g. its closest container). The labeled
+    # element is the one carrying data-bh-labeled, or the root if none does.
+    html: Optional[str] = None
+
+class PropertySuggestion(BaseModel):
+    source: str  # e.g. "data-product-id", "h1 text", "data-total from parent"
+    value: Optional[str] = None
+
+class ElementAnalysis(BaseModel):
+    page_type: PageType
+    element_scope: ElementScope
+    suggested_properties: Dict[str, PropertySuggestion] = {}
+    detected_patterns: List[str] = []
+    clarification_questions: List[str] = []
+    confidence: float
+    source: str = "heuristic"  # "heuristic" or "llm"
+    duration_ms: float = 0.0
+
+class IndexedElement(BaseModel):
+    """A labeled element as kept in the session's similarity index"""
+    id: str
+    intent: str
+    selector: str
+    page_url: str
+    page_type: Optional[PageType] = None
+    signature: List[int]  # MinHash signature, see app/services/element_index.py
+
+class SimilarElement(BaseModel):
+    id: str
+    intent: str
+    selector: str
+    similarity: float  # Estimated Jaccard similarity, 0-1
+
+class AnalyzeElementRequest(BaseModel):
+    session_id: Optional[str] = None
+    element: LabeledElement
+
+class AnalyzeElementResponse(BaseModel):
+    analysis: ElementAnalysis
+    clarification_questions: List[str]
+    requires_user_input: bool
+    similar_elements: List[SimilarElement] = []
@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Any, Dict, Literal, Optional
+from datetime import datetime
+
+class Job(BaseModel):
+    """A background job, as reported by the progress endpoints"""
+    id: str
+    kind: str  # e.g. "taxonomy"
+    status: Literal["queued", "running", "done", "failed"]
+    done: int = 0  # Steps finished
+    total: int = 0  # Steps known so far (0 until the job has planned its work)
+    attempts: int = 0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
@@ -1,8 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
+from app.models.element import IndexedElement
+from app.models.taxonomy import Taxonomy
+
 class SessionStatus(str, Enum):
     ACTIVE = "active"
     READY_FOR_LABELING = "ready_for_labeling"
@@ -31,11 +34,27 @@ class SetupSession(BaseModel):
     user_segments: List[str] = []
     business_goals: List[str] = []
     
+    # Conversation graph step to resume at on the next message
+    current_step: Optional[str] = None
+    
+    # Elements labeled so far, with their MinHash signatures (stored as rows
+    # of their own; loaded with storage.get_session(..., elements=True))
+    labeled_elements: List[IndexedElement] = []
+    
+    # Latest generated taxonomy (applied to events once approved)
+    taxonomy: Optional[Taxonomy] = None
+    
     # Conversation
-    messages: List[Message] = []
+    messages: List[Message] = []  # Loaded window, oldest first
+    message_count: int = 0  # Total messages persisted for the session
     
     created_at: datetime
     updated_at: datetime
+    
+    # Persistence bookkeeping: header as last written, and how many entries
+    # of `messages` are already stored
+    _persisted_header: dict = PrivateAttr(default_factory=dict)
+    _persisted_messages: int = PrivateAttr(default=0)
 
 class CreateSessionRequest(BaseModel):
     project_id: Optional[str] = None
@@ -0,0 +1,49 @@
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+
+class CanonicalEvent(BaseModel):
+    name: str  # snake_case, e.g. "add_to_cart"
+    aliases: List[str] = []  # Raw event names mapped onto it ("addToCart", "Add to cart")
+    required_properties: List[str] = []
+    optional_properties: List[str] = []
+
+class PropertyRename(BaseModel):
+    source: str  # e.g. "productId"
+    target: str  # e.g. "product_id"
+
+class PiiRule(BaseModel):
+    name: str  # e.g. "email"
+    property_pattern: Optional[str] = None  # Regex on property names: matching properties are dropped
+    value_pattern: Optional[str] = None  # Regex on string values: matches are redacted
+
+class NoiseRule(BaseModel):
+    event_pattern: str  # Regex on the raw event name
+    property: Optional[str] = None  # Only when this property...
+    equals: Optional[str] = None  # ...has this value (compared as string)
+
+class Taxonomy(BaseModel):
+    id: str = "tax_v1"
+    canonical_events: List[CanonicalEvent] = []
+    normalization_rules: List[PropertyRename] = []
+    pii_rules: List[PiiRule] = []
+    noise_rules: List[NoiseRule] = []
+    snake_case_properties: bool = True  # Rename remaining properties productId -> product_id
+    drop_unknown_events: bool = False  # Drop events that match no canonical event
+    approved: bool = False
+
+class GenerateTaxonomyRequest(BaseModel):
+    session_id: str
+
+class GenerateTaxonomyResponse(BaseModel):
+    taxonomy_id: str
+    preview: Taxonomy
+
+class ApproveTaxonomyRequest(BaseModel):
+    session_id: str
+    taxonomy_id: str
+    approved: bool
+    taxonomy: Optional[Taxonomy] = None  # Edited version to approve instead of the preview
+
+class ApproveTaxonomyResponse(BaseModel):
+    status: Literal["approved", "rejected"]
+    taxonomy_id: str
@@ -0,0 +1,225 @@
+import json
+import time
+from datetime import date, datetime, timedelta, timezone
+from itertools import compress
+from operator import ge, itemgetter, not_
+from typing import Dict, List, Optional, Tuple
+
+from app.models.analytics import AnalyticsQuery, AnalyticsResult, FunnelStep
+from app.services.event_store import EventStore, Partition, get_event_store
+from app.services.rollups import OTHER, user_bitmap, user_codes
+
+# Analytics queries
+#
+# Counts, unique users, conversion and top-N breakdowns are answered from the
+# partition rollups (app/services/rollups.py) without touching raw rows;
+# distinct users across days and steps combine the per-day user bitmaps.
+# Funnels move users between those bitmaps day by day and compare the
+# rollup's per-user first time of each step for users who did two steps the
+# same day; only users whose first time doing a step that day is earlier than
+# they reached the previous one read the step's rows (the rollup's per-event
+# row index). A 4-step funnel over 2M events and 7 days takes ~0.5 s
+# (benchmarks/analytics.py), about half of it in those rows; results are
+# cached (app/services/query_cache.py) until events land in the days they read.
+
+DEFAULT_DAYS = 7
+
+
+class AnalyticsError(ValueError):
+    """Query can't be answered (bad parameters)"""
+
+
+def _window(query: AnalyticsQuery) -> Tuple[date, date]:
+    end = query.end or datetime.now(timezone.utc).date()
+    start = query.start or end - timedelta(days=DEFAULT_DAYS - 1)
+    if start > end:
+        raise AnalyticsError("start is after end")
+    return start, end
+
+
+def _rate(part: int, whole: int) -> float:
+    return round(part / whole, 4) if whole else 0.0
+
+
+def _event_codes(store: EventStore, project_id: str, names: List[str]) -> Dict[str, int]:
+    code = store.dictionaries(project_id).events.code
+    return {name: code(name) for name in names}
+
+
+def event_counts(store: EventStore, project_id: str, partitions: List[Partition], query: AnalyticsQuery) -> AnalyticsResult:
+    events = store.dictionaries(project_id).events
+    series: Dict[str, List[dict]] = {}
+    totals: Dict[str, int] = {}
+    for partition in partitions:
+        codes = [events.code(name) for name in query.events] if query.events else None
+        for code, hourly in store.rollup(project_id, partition).event_counts(codes).items():
+            name = events.decode(code)
+            if query.interval == "hour":
+                points = [
+                    {"bucket": f"{partition.day.isoformat()}T{hour:02d}:00:00Z", "value": count}
+                    for hour, count in enumerate(hourly) if count
+                ]
+            else:
+                points = [{"bucket": partition.day.isoformat(), "value": sum(hourly)}]
+            series.setdefault(name, []).extend(points)
+            totals[name] = totals.get(name, 0) + sum(hourly)
+    return AnalyticsResult(kind=query.kind, start=query.start, end=query.end, series=series, totals=totals)
+
+
+def unique_users(store: EventStore, project_id: str, partitions: List[Partition], query: AnalyticsQuery) -> AnalyticsResult:
+    if query.interval != "day":
+        raise AnalyticsError("unique_users is rolled up per day")
+    if not query.events:
+        raise AnalyticsError("unique_users needs at least one event")
+    series: Dict[str, List[dict]] = {}
+    totals: Dict[str, int] = {}
+    for name, code in _event_codes(store, project_id, query.events).items():
+        daily = [(p.day, store.rollup(project_id, p).users(code)) for p in partitions] if code else []
+        series[name] = [{"bucket": day.isoformat(), "value": users.bit_count()} for day, users in daily if users]
+        totals[name] = _union(users for _, users in daily).bit_count()
+    return AnalyticsResult(kind=query.kind, start=query.start, end=query.end, series=series, totals=totals)
+
+
+def _union(bitmaps) -> int:
+    union = 0
+    for bitmap in bitmaps:
+        union |= bitmap
+    return union
+
+
+def _steps(names: List[str], counts: List[int]) -> List[FunnelStep]:
+    return [
+        FunnelStep(
+            event=name,
+            users=count,
+            conversion=_rate(count, counts[0]),
+            step_conversion=_rate(count, counts[i - 1]) if i else 1.0 if count else 0.0,
+        )
+        for i, (name, count) in enumerate(zip(names, counts))
+    ]
+
+
+def conversion(store: EventStore, project_id: str, partitions: List[Partition], query: AnalyticsQuery) -> AnalyticsResult:
+    """Users who did every event up to each step, in any order"""
+    if len(query.events) < 2:
+        raise AnalyticsError("conversion needs at least two events")
+    converted: Optional[int] = None  # User bitmap
+    counts = []
+    for code in _event_codes(store, project_id, query.events).values():
+        users = _union(store.rollup(project_id, p).users(code) for p in partitions) if code else 0
+        converted = users if converted is None else converted & users
+        counts.append(converted.bit_count())
+    return AnalyticsResult(kind=query.kind, start=query.start, end=query.end, steps=_steps(query.events, counts))
+
+
+def _first_after(store: EventStore, project_id: str, partition: Partition, code: int, waiting: Dict[int, int]) -> Dict[int, int]:
+    """Each waiting user's earliest occurrence of an event in the partition at or after their time"""
+    rows = store.rollup(project_id, partition).rows_of(code, partition.rows)
+    if not rows:
+        return {}
+    # Users first, then the times of the waiting users' rows only
+    users = list(map(partition.column("user").__getitem__, rows))
+    keep = list(map(waiting.__contains__, users))
+    users = list(compress(users, keep))
+    ts = list(map(partition.column("ts").__getitem__, compress(rows, keep)))
+    after = list(map(ge, ts, map(waiting.__getitem__, users)))
+    # Newest first, so each user's earliest time is written last
+    pairs = sorted(zip(compress(ts, after), compress(users, after)), reverse=True)
+    return dict(zip(map(itemgetter(1), pairs), map(itemgetter(0), pairs)))
+
+
+def funnel(store: EventStore, project_id: str, partitions: List[Partition], query: AnalyticsQuery) -> AnalyticsResult:
+    """Users who did the events in order (each step at or after the previous one)"""
+    if len(query.events) < 2:
+        raise AnalyticsError("funnel needs at least two steps")
+    rollups = [store.rollup(project_id, p) for p in partitions]
+    # Per day, a bitmap of the users who reached the current step that day,
+    # at their first time doing it that day (`first`) unless `exact` says
+    # otherwise. Earliest matches leave the most room for later steps, so one
+    # greedy pass per step is exact: a user moves on to the first later day
+    # they did the next step, or the same day if their first time doing it is
+    # no earlier; only those who did it earlier that day need its step rows.
+    reached: Optional[List[int]] = None
+    first: List[Dict[int, int]] = []
+    exact: Dict[int, int] = {}
+    counts = []
+    for code in _event_codes(store, project_id, query.events).values():
+        users = [rollup.users(code) if code else 0 for rollup in rollups]
+        times = [rollup.first_times(code) if code else {} for rollup in rollups]
+        current = [0] * len(partitions)
+        found_at: Dict[int, int] = {}
+        if reached is None:
+            seen = 0
+            for i, bitmap in enumerate(users):
+                current[i] = bitmap & ~seen
+                seen |= bitmap
+        else:
+            for i, bitmap in enumerate(reached):
+                later = bitmap & ~users[i]
+                same = user_codes(bitmap & users[i])
+                if same:
+                    previous = list(map(exact.get, same, map(first[i].__getitem__, same)))
+                    after = list(map(ge, map(times[i].__getitem__, same), previous))
+                    current[i] |= user_bitmap(compress(same, after))
+                    before = list(map(not_, after))
+                    waiting = dict(zip(compress(same, before), compress(previous, before)))
+                    if waiting:
+                        found = _first_after(store, project_id, partitions[i], code, waiting)
+                        found_at.update(found)
+                        current[i] |= user_bitmap(found)
+                        later |= user_bitmap(waiting.keys() - found.keys())
+                for j in range(i + 1, len(partitions)):
+                    if not later:
+                        break
+                    hit = later & users[j]
+                    current[j] |= hit
+                    later ^= hit
+        reached, first, exact = current, times, found_at
+        counts.append(sum(bitmap.bit_count() for bitmap in current))
+    return AnalyticsResult(kind=query.kind, start=query.start, end=query.end, steps=_steps(query.events, counts))
+
+
+def top_values(store: EventStore, project_id: str, partitions: List[Partition], query: AnalyticsQuery) -> AnalyticsResult:
+    if not query.property:
+        raise AnalyticsError("top_values needs a property")
+    dictionaries = store.dictionaries(project_id)
+    key = dictionaries.keys.code(query.property)
+    codes = list(_event_codes(store, project_id, query.events).values()) if query.events else None
+    counts: Dict[int, int] = {}
+    if key:
+        for partition in partitions:
+            rollup = store.rollup(project_id, partition)
+            for code in codes if codes is not None else rollup.event_counts():
+                for value, count in rollup.values(code, key).items():
+                    counts[value] = counts.get(value, 0) + count
+    top = sorted(counts.items(), key=lambda item: -item[1])[:query.limit]
+    values = [
+        {"value": "(other)" if value == OTHER else json.loads(dictionaries.values.decode(value)), "count": count}
+        for value, count in top
+    ]
+    return AnalyticsResult(kind=query.kind, start=query.start, end=query.end, values=values)
+
+
+QUERIES = {
+    "counts": event_counts,
+    "unique_users": unique_users,
+    "conversion": conversion,
+    "funnel": funnel,
+    "top_values": top_values,
+}
+
+
+def resolve_window(query: AnalyticsQuery) -> AnalyticsQuery:
+    """Query with its default day range filled in"""
+    start, end = _window(query)
+    return query.model_copy(update={"start": start, "end": end})
+
+
+def run_query(project_id: str, query: AnalyticsQuery, store: Optional[EventStore] = None) -> AnalyticsResult:
+    """Answer a query over the project's stored events (blocking: run in a thread)"""
+    store = store or get_event_store()
+    started = time.perf_counter()
+    query = resolve_window(query)
+    result = QUERIES[query.kind](store, project_id, store.partitions(project_id, query.start, query.end), query)
+    result.elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+    return result
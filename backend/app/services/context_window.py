@@ -0,0 +1,102 @@
+import os
+from array import array
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from app.models.session import Message, SetupSession
+
+# Conversation context window
+#
+# A turn loads only the latest CONTEXT_LOAD_MESSAGES messages and keeps them
+# in a MessageLog: parallel arrays (role code, token estimate, timestamp) plus
+# one list of strings, instead of a dict or model per message. What goes into
+# graph state is the newest messages that fit CONTEXT_WINDOW_TOKENS, plus a
+# short summary of the facts extracted so far (the extraction prompt's
+# context, standing in for the older turns), so state size and prompt
+# tokens stay flat however long the session runs. Replies added by the graph
+# are the messages past the window it was given (no search through history).
+
+CONTEXT_WINDOW_TOKENS = int(os.getenv("CONTEXT_WINDOW_TOKENS", "1500"))
+CONTEXT_LOAD_MESSAGES = int(os.getenv("CONTEXT_LOAD_MESSAGES", "20"))
+
+ROLES = ("user", "assistant", "system")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), no tokenizer needed"""
+    return len(text) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+class MessageLog:
+    """Append-only messages as parallel arrays"""
+
+    __slots__ = ("_roles", "_contents", "_tokens", "_timestamps")
+
+    def __init__(self, messages: Optional[List[Message]] = None):
+        self._roles = array("B")
+        self._contents: List[str] = []
+        self._tokens = array("I")
+        self._timestamps = array("d")
+        for message in messages or ():
+            self.append(message.role, message.content, message.timestamp)
+
+    def append(self, role: str, content: str, timestamp: Optional[datetime] = None) -> None:
+        self._roles.append(_ROLE_CODES[role])
+        self._contents.append(content)
+        self._tokens.append(estimate_tokens(content))
+        self._timestamps.append((timestamp or datetime.now(timezone.utc)).timestamp())
+
+    def __len__(self) -> int:
+        return len(self._contents)
+
+    def role(self, index: int) -> str:
+        return ROLES[self._roles[index]]
+
+    def content(self, index: int) -> str:
+        return self._contents[index]
+
+    def message(self, index: int) -> Message:
+        timestamp = datetime.fromtimestamp(self._timestamps[index], timezone.utc)
+        return Message(role=self.role(index), content=self._contents[index], timestamp=timestamp)
+
+    def window(self, budget_tokens: int = CONTEXT_WINDOW_TOKENS) -> List[dict]:
+        """Newest messages within the token budget (always at least the last one), oldest first"""
+        end = len(self._contents)
+        if not end:
+            return []
+        start, used = end - 1, self._tokens[end - 1]
+        while start > 0 and used + self._tokens[start - 1] <= budget_tokens:
+            start -= 1
+            used += self._tokens[start]
+        return [{"role": ROLES[self._roles[i]], "content": self._contents[i]} for i in range(start, end)]
+
+    def tokens(self) -> int:
+        return sum(self._tokens)
+
+
+def recent(messages: List[dict], budget_tokens: int = CONTEXT_WINDOW_TOKENS) -> List[dict]:
+    """Window over plain {"role", "content"} messages"""
+    log = MessageLog()
+    for message in messages:
+        log.append(message["role"], message["content"])
+    return log.window(budget_tokens)
+
+
+def facts_summary(session: SetupSession) -> str:
+    """Rolling summary of what the conversation has established so far"""
+    facts = []
+    if session.domain:
+        facts.append(f"domain: {session.domain.value}")
+    if session.product_description:
+        facts.append(f"product: {session.product_description[:200]}")
+    if session.key_actions:
+        facts.append(f"actions: {', '.join(session.key_actions)}")
+    if session.user_segments:
+        facts.append(f"segments: {', '.join(session.user_segments)}")
+    if session.business_goals:
+        facts.append(f"goals: {', '.join(session.business_goals)}")
+    if session.taxonomy is not None:
+        facts.append(f"taxonomy: {session.taxonomy.id} ({'approved' if session.taxonomy.approved else 'draft'})")
+    return "; ".join(facts)
@@ -0,0 +1,208 @@
+import hashlib
+import operator
+import os
+import random
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.models.element import IndexedElement, LabeledElement, PageType, SimilarElement
+from app.services import storage
+
+# Duplicate / similar element detection
+#
+# Each labeled element is reduced to a set of features: selector tokens and
+# parent>child steps (positions and generated ids dropped), words of its text
+# and intent, and the page's URL pattern and type. A MinHash signature of that
+# set estimates Jaccard similarity between two elements, and LSH buckets over
+# the signature bands (BANDS x ROWS) find the candidates worth comparing, so a
+# check costs the same with 5 or 500 labels.
+#
+# Each labeled element is stored as its own row with its signature
+# (storage.add_element), so a label writes one row whatever the session's
+# size, and concurrent labelers don't overwrite each other. Indexes are kept
+# per session across requests (LRU, ELEMENT_INDEX_SESSIONS); each check
+# first reads only the rows written since the index last looked, which also
+# picks up labels made through other processes.
+
+NUM_PERM = 64
+BANDS, ROWS = 21, 3  # Candidate at ~50% similarity with ~94% probability
+SIMILARITY_THRESHOLD = float(os.getenv("ELEMENT_SIMILARITY_THRESHOLD", "0.5"))
+INDEX_SESSIONS = int(os.getenv("ELEMENT_INDEX_SESSIONS", "256"))
+
+_MERSENNE = (1 << 61) - 1
+_rng = random.Random(0x6268)  # Fixed: signatures are persisted
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+
+COMBINATOR_RE = re.compile(r"\s*[>+~]\s*|\s+")
+SELECTOR_PART_RE = re.compile(r"[#.]?[\w-]+|\[[^\]]*\]|::?[\w-]+(?:\([^)]*\))?")
+WORD_RE = re.compile(r"[a-z]+|\d+")
+
+
+def _generated(token: str) -> bool:
+    """Ids and classes that differ per instance (item-123, css-1x2y3z)"""
+    return any(c.isdigit() for c in token)
+
+
+def _selector_features(selector: str) -> List[str]:
+    features = []
+    previous = None
+    for step in COMBINATOR_RE.split(selector.strip().lower()):
+        if not step:
+            continue
+        parts = []
+        for part in SELECTOR_PART_RE.findall(step):
+            if part.startswith(":"):
+                part = part.split("(", 1)[0]  # :nth-child(3) -> :nth-child
+            elif part.startswith("["):
+                part = part.split("=", 1)[0].rstrip("]") + "]"
+            elif _generated(part):
+                part = part[0] + "*" if part[0] in "#." else part
+            parts.append(part)
+            features.append("s:" + part)
+        current = "".join(parts)
+        if previous is not None:
+            features.append(f"p:{previous}>{current}")
+        previous = current
+    return features
+
+
+def url_pattern(page_url: str) -> str:
+    """Host and path with per-entity segments replaced: /products/mug-12 -> /products/*"""
+    parsed = urlparse(page_url)
+    segments = []
+    for i, segment in enumerate(s for s in parsed.path.lower().split("/") if s):
+        if _generated(segment) or len(segment) > 24 or (i > 0 and "-" in segment):
+            segment = "*"
+        segments.append(segment)
+    return parsed.netloc.lower() + "/" + "/".join(segments)
+
+
+def features(element: LabeledElement, page_type: Optional[PageType] = None) -> set:
+    found = set(_selector_features(element.selector))
+    found.update("t:" + ("#" if w.isdigit() else w) for w in WORD_RE.findall(element.text_content.lower()))
+    found.update("i:" + w for w in WORD_RE.findall(element.intent.lower()) if not w.isdigit())
+    found.add("u:" + url_pattern(element.page_url))
+    if page_type is not None:
+        found.add("pt:" + page_type.value)
+    return found
+
+
+def signature(feature_set: set) -> List[int]:
+    """MinHash signature (NUM_PERM 32-bit values)"""
+    if not feature_set:
+        return [0] * NUM_PERM
+    hashes = [
+        int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), "little")
+        for f in feature_set
+    ]
+    return [
+        min((a * h + b) % _MERSENNE for h in hashes) & 0xFFFFFFFF
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(map(operator.eq, a, b)) / NUM_PERM
+
+
+class ElementIndex:
+    def __init__(self, elements: Optional[List[IndexedElement]] = None):
+        # Append-only; a re-labeled element leaves its old entry behind until
+        # the next compaction, skipped because _positions points elsewhere
+        self.elements: List[IndexedElement] = []
+        self._positions: Dict[str, int] = {}
+        self._buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(BANDS)]
+        self.last_row = 0  # Newest storage row indexed
+        for element in elements or ():
+            self.add(element)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _bands(self, sig: List[int]):
+        for band in range(BANDS):
+            yield band, tuple(sig[band * ROWS:(band + 1) * ROWS])
+
+    def similar(self, sig: List[int], threshold: float = SIMILARITY_THRESHOLD, exclude: Optional[str] = None) -> List[SimilarElement]:
+        """Labeled elements at or above `threshold`, most similar first"""
+        candidates = set()
+        for band, key in self._bands(sig):
+            candidates.update(self._buckets[band].get(key, ()))
+
+        matches = []
+        for position in candidates:
+            element = self.elements[position]
+            if element.id == exclude or self._positions.get(element.id) != position:
+                continue
+            score = similarity(sig, element.signature)
+            if score >= threshold:
+                matches.append(SimilarElement(
+                    id=element.id, intent=element.intent, selector=element.selector, similarity=round(score, 3)
+                ))
+        matches.sort(key=lambda m: m.similarity, reverse=True)
+        return matches
+
+    def add(self, element: IndexedElement) -> None:
+        """Index an element (re-labeling the same id replaces it)"""
+        if element.id in self._positions and len(self.elements) >= 2 * len(self._positions):
+            # Mostly replaced entries: rebuild from the live ones
+            live = [self.elements[position] for position in self._positions.values()]
+            self.elements, self._positions = [], {}
+            self._buckets = [{} for _ in range(BANDS)]
+            for existing in live:
+                self.add(existing)
+        position = len(self.elements)
+        self.elements.append(element)
+        self._positions[element.id] = position
+        for band, key in self._bands(element.signature):
+            self._buckets[band].setdefault(key, []).append(position)
+
+
+# Per-session indexes, least recently used first
+_indexes: "OrderedDict[str, ElementIndex]" = OrderedDict()
+
+
+async def get_index(session_id: str) -> ElementIndex:
+    """The session's element index, brought up to date with stored labels"""
+    index = _indexes.pop(session_id, None) or ElementIndex()
+    _indexes[session_id] = index
+    while len(_indexes) > INDEX_SESSIONS:
+        _indexes.popitem(last=False)
+
+    elements, last_row = await storage.get_elements_since(session_id, index.last_row)
+    for element in elements:
+        index.add(element)
+    index.last_row = max(index.last_row, last_row)
+    return index
+
+
+async def check_and_add(
+    session_id: str, element: LabeledElement, page_type: Optional[PageType] = None
+) -> List[SimilarElement]:
+    """Elements already labeled in the session that look like this one; then store and index it"""
+    sig = signature(features(element, page_type))
+    index = await get_index(session_id)
+    matches = index.similar(sig, exclude=element.id)
+    indexed = IndexedElement(
+        id=element.id,
+        intent=element.intent,
+        selector=element.selector,
+        page_url=element.page_url,
+        page_type=page_type,
+        signature=sig,
+    )
+    # Indexed before the write, so a concurrent check in this process sees it
+    index.add(indexed)
+    try:
+        await storage.add_element(session_id, indexed)
+    except Exception:
+        _indexes.pop(session_id, None)  # Rebuilt from storage next time
+        raise
+    return matches
+
+
+def clear() -> None:
+    _indexes.clear()
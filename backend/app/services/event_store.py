@@ -0,0 +1,379 @@
+import json
+import mmap
+import os
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.services.rollups import PartitionRollup
+
+# Columnar event store
+#
+# Local stand-in for the analytics database: clean events are stored per
+# project and UTC day, one file per column, so a query reads only the columns
+# and days it needs (memory-mapped, no parsing).
+#
+#   <root>/<project>/dict/{events,users,keys,values}.jsonl   dictionaries
+#   <root>/<project>/<YYYY-MM-DD>/ts.q                       int64 epoch ms
+#   <root>/<project>/<YYYY-MM-DD>/event.I                    event name codes
+#   <root>/<project>/<YYYY-MM-DD>/user.I                     distinct_id codes
+#   <root>/<project>/<YYYY-MM-DD>/props/<key code>.I         property value codes
+#
+# Event names, distinct ids, property keys and property values (JSON-encoded)
+# are dictionary-encoded per project into uint32 codes; 0 means missing.
+# Appends write every column of a partition sequentially, ts last: the ts
+# column's length is the committed row count, and longer columns left by an
+# interrupted append are truncated before the next one. Each append also
+# updates the partition's rollup (app/services/rollups.py) after the commit.
+
+COLUMN_TYPES = {"ts": "q", "event": "I", "user": "I"}
+MISSING = 0
+ROLLUP_CACHE_SIZE = 256  # Partition rollups kept in memory
+
+
+def _timestamp_ms(value) -> int:
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not value:
+        return int(datetime.now(timezone.utc).timestamp() * 1000)
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        # Unparseable client timestamp: file the event under its arrival time
+        return int(datetime.now(timezone.utc).timestamp() * 1000)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def day_bounds_ms(day: date) -> Tuple[int, int]:
+    start = int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+    return start, start + 86_400_000
+
+
+class Dictionary:
+    """Append-only value <-> code mapping persisted as JSON lines"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._values: Optional[List[Optional[str]]] = None
+        self._codes: Dict[str, int] = {}
+        self._new: List[str] = []
+
+    @property
+    def values(self) -> List[Optional[str]]:
+        """Values by code; loaded on first use (a scan may never need them)"""
+        if self._values is None:
+            values: List[Optional[str]] = [None]  # Code 0 is MISSING
+            if os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    values.extend(json.loads(line) for line in f if line.strip())
+            self._codes = {value: code for code, value in enumerate(values) if code}
+            self._values = values
+        return self._values
+
+    @property
+    def codes(self) -> Dict[str, int]:
+        self.values
+        return self._codes
+
+    def encode(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            values = self.values
+            code = self._codes.get(value)  # Loaded just now
+            if code is None:
+                code = self._codes[value] = len(values)
+                values.append(value)
+                self._new.append(value)
+        return code
+
+    def code(self, value: str) -> int:
+        """Existing code, or MISSING (never adds)"""
+        return self.codes.get(value, MISSING)
+
+    def decode(self, code: int) -> Optional[str]:
+        return self.values[code]
+
+    def flush(self) -> None:
+        if self._new:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(v) + "\n" for v in self._new))
+            self._new = []
+
+
+class ProjectDictionaries:
+    def __init__(self, root: str):
+        os.makedirs(root, exist_ok=True)
+        self.events = Dictionary(os.path.join(root, "events.jsonl"))
+        self.users = Dictionary(os.path.join(root, "users.jsonl"))
+        self.keys = Dictionary(os.path.join(root, "keys.jsonl"))
+        self.values = Dictionary(os.path.join(root, "values.jsonl"))
+
+    def flush(self) -> None:
+        for dictionary in (self.events, self.users, self.keys, self.values):
+            dictionary.flush()
+
+
+class Partition:
+    """One project-day; columns are memory-mapped on first access"""
+
+    def __init__(self, path: str, day: date, dictionaries: ProjectDictionaries):
+        self.path = path
+        self.day = day
+        self.dictionaries = dictionaries
+        self.rows = _file_rows(os.path.join(path, "ts.q"), "q")
+        self._columns: Dict[str, memoryview] = {}
+
+    def _map(self, filename: str, typecode: str) -> memoryview:
+        file_path = os.path.join(self.path, filename)
+        if self.rows == 0 or not os.path.exists(file_path):
+            return memoryview(array(typecode, bytes(self.rows * array(typecode).itemsize)))
+        with open(file_path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Rows appended after this partition was opened are not visible
+        return memoryview(mapped).cast("B")[:self.rows * array(typecode).itemsize].cast(typecode)
+
+    def column(self, name: str) -> memoryview:
+        """ts (epoch ms), event or user codes, one entry per row"""
+        if name not in self._columns:
+            self._columns[name] = self._map(f"{name}.{COLUMN_TYPES[name]}", COLUMN_TYPES[name])
+        return self._columns[name]
+
+    def property(self, key: str) -> memoryview:
+        """Value codes of a property (MISSING where absent)"""
+        name = "props/" + key
+        if name not in self._columns:
+            key_code = self.dictionaries.keys.code(key)
+            self._columns[name] = self._map(f"props/{key_code}.I", "I")
+        return self._columns[name]
+
+
+def code_counts(column: memoryview, cardinality: int) -> Dict[int, int]:
+    """Occurrences of each code in a column"""
+    values = column.tolist()
+    if cardinality <= 64:
+        # One C-level pass per code beats hashing every row
+        return {code: values.count(code) for code in range(cardinality)}
+    return Counter(values)
+
+
+def _file_rows(path: str, typecode: str) -> int:
+    try:
+        return os.path.getsize(path) // array(typecode).itemsize
+    except FileNotFoundError:
+        return 0
+
+
+def _read_rows(path: str, typecode: str, start: int, stop: int) -> array:
+    values = array(typecode)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            f.seek(start * values.itemsize)
+            values.frombytes(f.read((stop - start) * values.itemsize))
+    # Columns added after `start` (or never written) are MISSING
+    values.frombytes(bytes((stop - start - len(values)) * values.itemsize))
+    return values
+
+
+class EventStore:
+    def __init__(self, root: str = "event_store"):
+        self.root = root
+        self._dictionaries: Dict[str, ProjectDictionaries] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+        self._rollups: "OrderedDict[str, PartitionRollup]" = OrderedDict()
+        self.appended = 0
+
+    def _project_dir(self, project_id: str) -> str:
+        # Project ids come from session ids; keep them path-safe
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in project_id)
+        return os.path.join(self.root, safe)
+
+    def _lock(self, project_id: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(project_id, threading.Lock())
+
+    def dictionaries(self, project_id: str) -> ProjectDictionaries:
+        with self._guard:
+            if project_id not in self._dictionaries:
+                self._dictionaries[project_id] = ProjectDictionaries(
+                    os.path.join(self._project_dir(project_id), "dict")
+                )
+            return self._dictionaries[project_id]
+
+    # Writes
+
+    def append(self, project_id: str, events: Iterable[dict]) -> int:
+        """Append clean events ({"event", "distinct_id", "timestamp", "properties"})"""
+        dictionaries = self.dictionaries(project_id)
+        with self._lock(project_id):
+            by_day: Dict[date, list] = {}
+            for event in events:
+                ts = _timestamp_ms(event.get("timestamp"))
+                day = datetime.fromtimestamp(ts / 1000, timezone.utc).date()
+                by_day.setdefault(day, []).append((ts, event))
+
+            encoded = [(day, self._encode(rows, dictionaries)) for day, rows in by_day.items()]
+            # New codes are on disk before any column refers to them
+            dictionaries.flush()
+            for day, columns in encoded:
+                self._write_partition(os.path.join(self._project_dir(project_id), day.isoformat()), day, *columns)
+            count = sum(len(rows) for rows in by_day.values())
+            self.appended += count
+            return count
+
+    @staticmethod
+    def _encode(rows: list, dictionaries: ProjectDictionaries):
+        ts = array("q")
+        event_codes = array("I")
+        user_codes = array("I")
+        props: Dict[int, array] = {}
+        encode_value = dictionaries.values.encode
+        encode_key = dictionaries.keys.encode
+        value_codes: Dict[tuple, int] = {}  # (type, value) -> code, saves json.dumps on repeats
+        for i, (timestamp, event) in enumerate(rows):
+            ts.append(timestamp)
+            event_codes.append(dictionaries.events.encode(event["event"]))
+            distinct_id = event.get("distinct_id")
+            user_codes.append(dictionaries.users.encode(str(distinct_id)) if distinct_id is not None else MISSING)
+            for key, value in (event.get("properties") or {}).items():
+                column = props.get(key_code := encode_key(key))
+                if column is None:
+                    column = props[key_code] = array("I", bytes(4 * len(rows)))
+                try:
+                    code = value_codes.get((type(value), value))
+                except TypeError:  # dict / list
+                    code = encode_value(json.dumps(value, sort_keys=True))
+                else:
+                    if code is None:
+                        code = value_codes[(type(value), value)] = encode_value(json.dumps(value, sort_keys=True))
+                column[i] = code
+        return ts, event_codes, user_codes, props
+
+    def _write_partition(
+        self, path: str, day: date, ts: array, event_codes: array, user_codes: array, props: Dict[int, array]
+    ) -> None:
+        os.makedirs(os.path.join(path, "props"), exist_ok=True)
+        existing = _file_rows(os.path.join(path, "ts.q"), "q")
+        rollup = self._rollup(path, day, existing)
+
+        # Property columns present on disk but not in this batch get MISSING
+        for name in os.listdir(os.path.join(path, "props")):
+            key_code = int(name.split(".", 1)[0])
+            if key_code not in props:
+                props[key_code] = array("I", bytes(4 * len(ts)))
+
+        for key_code, column in props.items():
+            self._write_column(os.path.join(path, "props", f"{key_code}.I"), existing, column)
+        self._write_column(os.path.join(path, "event.I"), existing, event_codes)
+        self._write_column(os.path.join(path, "user.I"), existing, user_codes)
+        self._write_column(os.path.join(path, "ts.q"), existing, ts)  # Commit point
+        rollup.update(existing, ts, event_codes, user_codes, props)
+
+    @staticmethod
+    def _write_column(file_path: str, existing: int, values: array) -> None:
+        with open(file_path, "ab") as f:
+            size = existing * values.itemsize
+            current = f.tell()
+            if current > size:
+                f.truncate(size)  # Leftover of an interrupted append
+            elif current < size:
+                f.write(bytes(size - current))  # Column added after `existing` rows
+            values.tofile(f)
+
+    # Rollups
+
+    def _rollup(self, path: str, day: date, rows: int) -> PartitionRollup:
+        """Cached rollup of a partition, caught up to `rows` (call with the project lock held)"""
+        with self._guard:
+            rollup = self._rollups.pop(path, None)
+            if rollup is None:
+                rollup = PartitionRollup(path, day_bounds_ms(day)[0])
+            self._rollups[path] = rollup
+            while len(self._rollups) > ROLLUP_CACHE_SIZE:
+                self._rollups.popitem(last=False)
+        if rollup.rows < rows:
+            # Missing rollup, or an append interrupted between commit and rollup
+            start = rollup.rows
+            props_dir = os.path.join(path, "props")
+            props = {
+                int(name.split(".", 1)[0]): _read_rows(os.path.join(props_dir, name), "I", start, rows)
+                for name in os.listdir(props_dir)
+            } if os.path.isdir(props_dir) else {}
+            rollup.update(
+                start,
+                _read_rows(os.path.join(path, "ts.q"), "q", start, rows),
+                _read_rows(os.path.join(path, "event.I"), "I", start, rows),
+                _read_rows(os.path.join(path, "user.I"), "I", start, rows),
+                props,
+            )
+        return rollup
+
+    def rollup(self, project_id: str, partition: Partition) -> PartitionRollup:
+        """Aggregates covering at least the rows of `partition`"""
+        with self._lock(project_id):
+            return self._rollup(partition.path, partition.day, partition.rows)
+
+    # Reads
+
+    def partitions(self, project_id: str, start: Optional[date] = None, end: Optional[date] = None) -> List[Partition]:
+        """Partitions with start <= day <= end, oldest first"""
+        project_dir = self._project_dir(project_id)
+        if not os.path.isdir(project_dir):
+            return []
+        dictionaries = self.dictionaries(project_id)
+        found = []
+        for name in sorted(os.listdir(project_dir)):
+            try:
+                day = date.fromisoformat(name)
+            except ValueError:
+                continue  # dict/
+            if (start is None or day >= start) and (end is None or day <= end):
+                partition = Partition(os.path.join(project_dir, name), day, dictionaries)
+                if partition.rows:
+                    found.append(partition)
+        return found
+
+    def watermarks(self, project_id: str, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, int]:
+        """Committed rows per day with data in [start, end]; changes exactly when events land there"""
+        project_dir = self._project_dir(project_id)
+        if not os.path.isdir(project_dir):
+            return {}
+        marks = {}
+        for name in os.listdir(project_dir):
+            try:
+                day = date.fromisoformat(name)
+            except ValueError:
+                continue
+            if (start is None or day >= start) and (end is None or day <= end):
+                rows = _file_rows(os.path.join(project_dir, name, "ts.q"), "q")
+                if rows:
+                    marks[name] = rows
+        return marks
+
+    def count_by_event(self, project_id: str, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, int]:
+        """Events per name over a day range (reads only the event column)"""
+        partitions = self.partitions(project_id, start, end)
+        if not partitions:
+            return {}
+        counts: Counter = Counter()
+        for partition in partitions:
+            counts.update(code_counts(partition.column("event"), len(partition.dictionaries.events.values)))
+        decode = partitions[0].dictionaries.events.decode
+        return {decode(code): count for code, count in counts.most_common() if count}
+
+    def stats(self) -> dict:
+        return {"root": self.root, "appended": self.appended, "projects": len(self._dictionaries)}
+
+
+_store: Optional[EventStore] = None
+
+
+def get_event_store() -> EventStore:
+    global _store
+    if _store is None:
+        _store = EventStore(os.getenv("EVENT_STORE_PATH", "event_store"))
+    return _store
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Local stand-in for ChatOpenAI
+#
+# Used by the benchmarks and notebooks to exercise the graphs without network
+# access. Latency is simulated with asyncio.sleep on the async path so it
+# behaves like a real provider round-trip: it waits without blocking the loop.
+# With rate_limit set it also rejects calls over rate_limit per rate_window
+# seconds with a 429-style error, like a provider's rate limiter.
+
+# Canned structured answers, keyed on the field the format instructions ask for
+STRUCTURED_RESPONSES = {
+    '"domain"': {"domain": "ecommerce", "reasoning": "The user sells products online"},
+    '"actions"': {"actions": ["product_viewed", "added_to_cart", "checkout_started", "order_completed"]},
+    '"segments"': {"segments": ["buyer", "seller"]},
+    '"goals"': {"goals": ["conversion_rate", "revenue"]},
+    '"kind"': {"kind": "conversion", "events": ["product_viewed", "purchase_completed"]},
+    '"required_properties"': {"required_properties": ["product_id"], "optional_properties": ["price", "currency"]},
+}
+
+DEFAULT_REPLY = "Thanks! Could you tell me a bit more about what your users do on the site?"
+
+
+class FakeRateLimitError(Exception):
+    """What a provider raises for HTTP 429"""
+
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit reached, retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+def default_responder(messages: List[BaseMessage]) -> str:
+    """Answer structured prompts with JSON and everything else with a short reply"""
+    prompt = "\n".join(str(m.content) for m in messages)
+    answer = {}
+    for marker, payload in STRUCTURED_RESPONSES.items():
+        if marker in prompt:
+            answer.update(payload)
+    return json.dumps(answer) if answer else DEFAULT_REPLY
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model with configurable latency"""
+
+    latency: float = 0.0  # seconds per call
+    first_token_latency: Optional[float] = None  # when streaming; defaults to latency
+    responder: Callable[[List[BaseMessage]], str] = default_responder
+    calls: int = 0
+    rate_limit: int = 0  # calls per rate_window; 0: unlimited
+    rate_window: float = 60.0
+    rejected: int = 0
+    call_times: List[float] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self._check_rate_limit()
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self._check_rate_limit()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        self._check_rate_limit()
+        self.calls += 1
+        words = self.responder(messages).split(" ")
+        first = self.latency if self.first_token_latency is None else self.first_token_latency
+        rest = max(self.latency - first, 0.0) / max(len(words) - 1, 1)
+
+        for i, word in enumerate(words):
+            delay = first if i == 0 else rest
+            if delay:
+                await asyncio.sleep(delay)
+            text = word if i == 0 else " " + word
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+    def _check_rate_limit(self) -> None:
+        """Sliding-window limiter: reject calls over rate_limit in the last rate_window seconds"""
+        if not self.rate_limit:
+            return
+        now = time.monotonic()
+        while self.call_times and self.call_times[0] <= now - self.rate_window:
+            self.call_times.pop(0)
+        if len(self.call_times) >= self.rate_limit:
+            self.rejected += 1
+            raise FakeRateLimitError(self.call_times[0] + self.rate_window - now)
+        self.call_times.append(now)
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        self.calls += 1
+        content = self.responder(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
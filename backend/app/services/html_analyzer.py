@@ -0,0 +1,499 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import Counter
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.models.element import (
+    ElementAnalysis,
+    ElementScope,
+    LabeledElement,
+    PageType,
+    PropertySuggestion,
+)
+from app.services import metrics, tracing
+from app.services.llm_cache import CacheTier, get_llm_cache, model_name
+from app.services.llm_scheduler import background, get_scheduler
+
+# Labeled element analysis
+#
+# Page type, element scope and property suggestions for an element the user
+# labeled in the extension (see "HTML Context Analysis Strategy" in the
+# backend plan). The element's HTML snippet goes through a single pass of the
+# stdlib streaming parser, which collects data-* attributes, schema.org
+# itemprops, headings, prices, repeated containers and form fields; page type
+# and scope come from URL and HTML rules. Only when those rules don't agree
+# (confidence below ELEMENT_ANALYSIS_MIN_CONFIDENCE) is the LLM asked, with a
+# timeout that falls back to the heuristic answer. That call is queued at
+# background priority: under load chat turns go first and this one falls back.
+# Rule results are memoized on a digest of the inputs (the HTML only up to
+# what the parser reads), in an LRU with an entry cap and a byte budget, so
+# large snippets don't stay in memory as cache keys.
+
+MAX_HTML_CHARS = 64 * 1024  # Parse at most this much of a snippet
+LLM_HTML_CHARS = 2000  # Snippet length sent to the LLM
+MIN_CONFIDENCE = float(os.getenv("ELEMENT_ANALYSIS_MIN_CONFIDENCE", "0.5"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("ELEMENT_ANALYSIS_LLM_TIMEOUT_SECONDS", "4"))
+CACHE_MAX_ENTRIES = int(os.getenv("ELEMENT_ANALYSIS_CACHE_MAX_ENTRIES", "2048"))
+CACHE_MAX_BYTES = int(float(os.getenv("ELEMENT_ANALYSIS_CACHE_MAX_MB", "4")) * 1024 * 1024)
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+TARGET_MARKER = "data-bh-labeled"
+
+PRICE_RE = re.compile(
+    r"(?:[$€£¥]\s?\d[\d,]*(?:\.\d{1,2})?|\d[\d\s.,]*\d\s?(?:USD|EUR|GBP|PLN|zł))", re.IGNORECASE
+)
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "zł": "PLN"}
+
+# data-* attribute (without the prefix) -> property name
+DATA_PROPERTIES = {
+    "product-id": "product_id", "productid": "product_id", "product_id": "product_id",
+    "sku": "product_id", "item-id": "product_id", "variant-id": "variant_id",
+    "product-name": "product_name", "name": "product_name", "title": "product_name",
+    "price": "price", "product-price": "price", "currency": "currency",
+    "category": "category", "product-category": "category", "brand": "brand",
+    "total": "cart_value", "cart-total": "cart_value", "subtotal": "cart_value",
+    "item-count": "item_count", "items": "item_count", "quantity": "quantity", "qty": "quantity",
+    "plan": "plan", "plan-id": "plan_id", "position": "position", "index": "position",
+    "list": "list_name", "list-name": "list_name",
+}
+# data-* attributes that are framework or testing noise, never properties
+IGNORED_DATA_PREFIXES = ("bh-", "test", "testid", "cy", "qa", "v-", "reactid", "react", "turbo", "action", "controller")
+
+ITEMPROP_PROPERTIES = {
+    "sku": "product_id", "productid": "product_id", "name": "product_name",
+    "price": "price", "pricecurrency": "currency", "category": "category", "brand": "brand",
+}
+
+CHECKOUT_FIELD_RE = re.compile(r"cc-|card|cvc|cvv|expir|postal|zip|address|shipping|billing|payment", re.IGNORECASE)
+QUANTITY_FIELD_RE = re.compile(r"qty|quantity", re.IGNORECASE)
+PRODUCTISH_CLASS_RE = re.compile(r"product|item|card|tile|result", re.IGNORECASE)
+
+# URL path patterns -> (page type, weight)
+URL_RULES: List[Tuple[re.Pattern, PageType, float]] = [
+    (re.compile(r"/(products?|items?|p|dp)/[^/]+", re.IGNORECASE), PageType.PRODUCT_DETAIL, 0.6),
+    (re.compile(r"/(cart|basket|bag)(/|$)", re.IGNORECASE), PageType.CART, 0.7),
+    (re.compile(r"/(checkout|order|payment)s?(/|$)", re.IGNORECASE), PageType.CHECKOUT, 0.7),
+    (re.compile(r"/(search|category|categories|collections?|c|shop|catalog)(/|$)", re.IGNORECASE), PageType.PRODUCT_LISTING, 0.5),
+]
+
+_analyses = {
+    source: metrics.counter("element_analysis_total", "Labeled elements analyzed", {"source": source})
+    for source in ("heuristic", "llm", "llm_fallback")
+}
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "signature")
+
+    def __init__(self, tag: str, attrs: Dict[str, str]):
+        self.tag = tag
+        self.attrs = attrs
+        classes = attrs.get("class", "").split()
+        self.signature = f"{tag}.{classes[0]}" if classes else None
+
+
+class ContextParser(HTMLParser):
+    """Single pass over an element snippet, collecting tracking signals"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: List[_Node] = []
+        self.target: Optional[_Node] = None
+        self.ancestors: List[_Node] = []  # target's ancestors, nearest first
+        self.root: Optional[_Node] = None
+
+        self.signatures: Counter = Counter()
+        # (tag, text, enclosing elements) / (price, enclosing elements)
+        self.headings: List[Tuple[str, str, frozenset]] = []
+        self.prices: List[Tuple[str, frozenset]] = []
+        self.itemprops: Dict[str, str] = {}
+        self.checkout_fields = 0
+        self.quantity_field: Optional[str] = None
+        self.forms = 0
+
+        self._heading: Optional[Tuple[str, List[str], frozenset]] = None
+        self._itemprop: Optional[Tuple[str, List[str]]] = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k: v or "" for k, v in attrs}
+        node = _Node(tag, attrs)
+        if self.root is None:
+            self.root = node
+        if node.signature:
+            self.signatures[node.signature] += 1
+
+        if TARGET_MARKER in attrs and self.target is None:
+            self.target = node
+            self.ancestors = list(reversed(self.stack))
+
+        if tag in ("h1", "h2", "h3") and self._heading is None:
+            self._heading = (tag, [], self._enclosing())
+        if tag == "form":
+            self.forms += 1
+
+        prop = attrs.get("itemprop", "").lower()
+        if prop:
+            if "content" in attrs:
+                self.itemprops.setdefault(prop, attrs["content"])
+            elif tag not in VOID_TAGS:
+                self._itemprop = (prop, [])
+
+        if tag in ("input", "select", "textarea"):
+            field = " ".join(attrs.get(k, "") for k in ("name", "id", "autocomplete"))
+            if CHECKOUT_FIELD_RE.search(field):
+                self.checkout_fields += 1
+            if QUANTITY_FIELD_RE.search(field) and self.quantity_field is None:
+                self.quantity_field = attrs.get("name") or attrs.get("id")
+
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.stack and self.stack[-1].tag == tag:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        if self._heading is not None and tag == self._heading[0]:
+            text = " ".join("".join(self._heading[1]).split())
+            if text:
+                self.headings.append((tag, text, self._heading[2]))
+            self._heading = None
+        if self._itemprop is not None and self.stack and self.stack[-1].tag == tag:
+            prop, parts = self._itemprop
+            self.itemprops.setdefault(prop, " ".join("".join(parts).split()))
+            self._itemprop = None
+
+        # Tolerate unclosed tags: pop back to the matching element if open
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                break
+
+    def handle_data(self, data):
+        if self._heading is not None:
+            self._heading[1].append(data)
+        if self._itemprop is not None:
+            self._itemprop[1].append(data)
+        if any(c.isdigit() for c in data):
+            enclosing = None
+            for match in PRICE_RE.finditer(data):
+                enclosing = enclosing or self._enclosing()
+                self.prices.append((match.group().strip(), enclosing))
+
+    def _enclosing(self) -> frozenset:
+        return frozenset(id(node) for node in self.stack)
+
+    def nearest(self, items: list, scope_index: int = -1):
+        """Item sharing the closest enclosing element with the target"""
+        if not items:
+            return None
+        for node in [self.target] + self.ancestors:
+            if node is None:
+                continue
+            for item in items:
+                if id(node) in item[scope_index]:
+                    return item
+        return items[0]
+
+    def finish(self) -> None:
+        self.close()
+        if self.target is None:
+            # No marker: the snippet is the element itself
+            self.target = self.root
+            self.ancestors = []
+
+
+def _property_for_data_attr(name: str) -> Optional[str]:
+    key = name[len("data-"):].lower()
+    if key.startswith(IGNORED_DATA_PREFIXES):
+        return None
+    return DATA_PROPERTIES.get(key)
+
+
+def _currency(price: str) -> Optional[str]:
+    for symbol, code in CURRENCY_SYMBOLS.items():
+        if symbol in price:
+            return code
+    match = re.search(r"[A-Z]{3}", price)
+    return match.group() if match else None
+
+
+def _score_url(page_url: str) -> Dict[PageType, float]:
+    scores: Dict[PageType, float] = Counter()
+    parsed = urlparse(page_url)
+    path = parsed.path or "/"
+    for pattern, page_type, weight in URL_RULES:
+        if pattern.search(path):
+            scores[page_type] += weight
+    if re.search(r"(^|&)(q|query|search)=", parsed.query):
+        scores[PageType.PRODUCT_LISTING] += 0.4
+    if path in ("", "/") and not parsed.query:
+        scores[PageType.HOMEPAGE] += 0.5
+    return scores
+
+
+_cache = CacheTier(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, ttl_seconds=None)
+
+
+def _cache_key(element: LabeledElement, html: str) -> bytes:
+    digest = hashlib.sha256()
+    for part in (element.page_url, html, element.selector, element.text_content, element.intent):
+        encoded = (part or "").encode("utf-8", "surrogatepass")
+        digest.update(len(encoded).to_bytes(8, "little"))
+        digest.update(encoded)
+    return digest.digest()
+
+
+def analyze_heuristic(element: LabeledElement) -> ElementAnalysis:
+    """Rule-based analysis; memoized on a digest of the element's content"""
+    html = (element.html or "")[:MAX_HTML_CHARS]
+    key = _cache_key(element, html)
+    analysis = _cache.get(key)
+    if analysis is None:
+        analysis = _analyze(element.page_url, html, element.selector, element.text_content, element.intent)
+        _cache.put(key, analysis, len(key) + len(analysis.model_dump_json()))
+    return analysis.model_copy(deep=True)
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
+
+
+def _analyze(page_url: str, html: str, selector: str, text_content: str, intent: str) -> ElementAnalysis:
+    parser = ContextParser()
+    parser.feed(html)
+    parser.finish()
+
+    properties: Dict[str, PropertySuggestion] = {}
+    patterns: List[str] = []
+
+    # data-* on the element, then its ancestors (nearest first)
+    for depth, node in enumerate(([parser.target] if parser.target else []) + parser.ancestors):
+        for attr, value in node.attrs.items():
+            if not attr.startswith("data-"):
+                continue
+            prop = _property_for_data_attr(attr)
+            if prop and prop not in properties:
+                source = attr if depth == 0 else f"{attr} from parent"
+                properties[prop] = PropertySuggestion(source=source, value=value or None)
+
+    for itemprop, value in parser.itemprops.items():
+        prop = ITEMPROP_PROPERTIES.get(itemprop)
+        if prop and prop not in properties:
+            properties[prop] = PropertySuggestion(source=f"itemprop={itemprop}", value=value or None)
+
+    if parser.headings and "product_name" not in properties:
+        tag, text, _ = parser.nearest(parser.headings)
+        properties["product_name"] = PropertySuggestion(source=f"text from <{tag}>", value=text[:120])
+
+    if parser.prices:
+        patterns.append("price_displayed")
+        price, _ = parser.nearest(parser.prices)
+        if "price" not in properties:
+            properties["price"] = PropertySuggestion(source="nearby price text", value=price)
+        if "currency" not in properties:
+            currency = _currency(price)
+            if currency:
+                properties["currency"] = PropertySuggestion(source="price symbol", value=currency)
+
+    if parser.quantity_field and "quantity" not in properties:
+        properties["quantity"] = PropertySuggestion(source=f"value of input[name={parser.quantity_field}]")
+
+    # Repeated containers around the element (product cards in a list)
+    repeated = [
+        node for node in parser.ancestors
+        if node.signature and parser.signatures[node.signature] >= 2
+    ]
+    product_cards = sum(
+        count for signature, count in parser.signatures.items()
+        if count >= 3 and PRODUCTISH_CLASS_RE.search(signature)
+    )
+    if repeated:
+        patterns.append("inside_repeated_container")
+    if product_cards or len(parser.prices) >= 3:
+        patterns.append("multiple_products")
+    if parser.checkout_fields:
+        patterns.append("payment_or_shipping_form")
+    has_product_id = "product_id" in properties
+    if has_product_id:
+        patterns.append("product_id_present")
+
+    # Page type: URL rules plus HTML signals
+    scores = _score_url(page_url)
+    if "multiple_products" in patterns:
+        scores[PageType.PRODUCT_LISTING] += 0.4
+    elif has_product_id and ("price_displayed" in patterns or parser.headings):
+        scores[PageType.PRODUCT_DETAIL] += 0.4
+    if parser.checkout_fields >= 2:
+        scores[PageType.CHECKOUT] += 0.5
+    if "cart_value" in properties or "item_count" in properties:
+        scores[PageType.CART] += 0.3
+
+    ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+    if not ranked or ranked[0][1] <= 0:
+        page_type, confidence = PageType.OTHER, 0.2
+    else:
+        page_type, top = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+        confidence = min(1.0, top) * (top - second) / top
+
+    scope, questions = _scope(page_type, properties, bool(repeated), text_content or intent)
+    return ElementAnalysis(
+        page_type=page_type,
+        element_scope=scope,
+        suggested_properties=properties,
+        detected_patterns=patterns,
+        clarification_questions=questions + _property_questions(properties),
+        confidence=round(confidence, 3),
+    )
+
+
+def _scope(
+    page_type: PageType,
+    properties: Dict[str, PropertySuggestion],
+    in_repeated_container: bool,
+    label: str,
+) -> Tuple[ElementScope, List[str]]:
+    """Element scope and the clarification it needs (plan step 2)"""
+    label = label.strip() or "this"
+    if page_type == PageType.PRODUCT_DETAIL:
+        if "product_id" in properties:
+            name = properties.get("product_name")
+            product = f" for '{name.value}'" if name and name.value else ""
+            return ElementScope.SPECIFIC, [
+                f"This button is on the product page{product}. Do you want to track clicks on THIS "
+                f"product specifically, or ANY product's '{label}' button?"
+            ]
+        return ElementScope.GENERIC, []
+
+    if page_type == PageType.PRODUCT_LISTING:
+        if in_repeated_container:
+            return ElementScope.GENERIC, [
+                f"This button appears on multiple products in a list. Should we track all clicks "
+                f"on ANY '{label}' button?"
+            ]
+        return ElementScope.SPECIFIC, []
+
+    if page_type in (PageType.CART, PageType.CHECKOUT):
+        return ElementScope.CONTEXTUAL, [
+            "This is in the cart. Should we track this for all users or only specific user segments?"
+        ]
+
+    return ElementScope.GENERIC, []
+
+
+def _property_questions(properties: Dict[str, PropertySuggestion]) -> List[str]:
+    questions = []
+    product_id = properties.get("product_id")
+    if product_id and product_id.value:
+        questions.append(f"I see this product has ID '{product_id.value}'. Should I capture the product_id property?")
+    price = properties.get("price")
+    if price and price.value:
+        questions.append(f"I notice a price ({price.value}) nearby. Should I track the product price?")
+    category = properties.get("category")
+    if category and category.value:
+        questions.append(f"This product is in category '{category.value}'. Should I capture the category?")
+    cart_value = properties.get("cart_value")
+    if cart_value and cart_value.value:
+        questions.append(f"Should I track the cart value ({cart_value.value}) when this happens?")
+    item_count = properties.get("item_count")
+    if item_count and item_count.value:
+        questions.append(f"Should I track how many items ({item_count.value}) are in the cart?")
+    return questions
+
+
+# LLM escalation
+
+LLM_TEMPLATE = """A user is setting up analytics for their website. They labeled this element:
+
+Element: {element_html}
+Selector: {selector}
+Element text: {text}
+Page URL: {url}
+Page title: {title}
+User's intent name: {intent}
+
+Signals found by rules (may be incomplete): {signals}
+
+Analyze:
+1. What type of page is this? (product_detail, product_listing, cart, checkout, homepage, other)
+2. Is this element about a specific entity, generic, or contextual (depends on user state)?
+3. What properties should we capture? (look for data attributes, nearby text, IDs)
+4. Are there any ambiguities that need clarification?
+
+{format_instructions}"""
+
+
+async def _analyze_with_llm(element: LabeledElement, heuristic: ElementAnalysis, llm) -> ElementAnalysis:
+    from langchain.output_parsers import PydanticOutputParser
+    from langchain.prompts import ChatPromptTemplate
+
+    parser = PydanticOutputParser(pydantic_object=ElementAnalysis)
+    inputs = {
+        "element_html": (element.html or "")[:LLM_HTML_CHARS] or "(not provided)",
+        "selector": element.selector,
+        "text": element.text_content,
+        "url": element.page_url,
+        "title": element.page_title or "",
+        "intent": element.intent,
+        "signals": json.dumps(heuristic.model_dump(mode="json", include={"page_type", "detected_patterns", "suggested_properties"})),
+        "format_instructions": parser.get_format_instructions(),
+    }
+
+    cache = get_llm_cache()
+    cache_args = ("analyze_element", LLM_TEMPLATE, model_name(llm), json.dumps(inputs, sort_keys=True))
+    cached = cache.get(*cache_args) if cache is not None else None
+    if cached is not None:
+        return ElementAnalysis.model_validate(cached)
+
+    messages = ChatPromptTemplate.from_template(LLM_TEMPLATE).format_messages(**inputs)
+    with tracing.span("llm", model=model_name(llm)) as current:
+        response = await get_scheduler().ainvoke(llm, messages)
+        tracing.record_llm(
+            current,
+            sum(len(m.content) for m in messages),
+            response.content,
+            getattr(response, "response_metadata", None),
+        )
+    result = parser.parse(response.content)
+    result.source = "llm"
+    if cache is not None:
+        cache.put(*cache_args, result.model_dump(mode="json"))
+    return result
+
+
+async def analyze_element(element: LabeledElement, llm_factory: Optional[Callable[[], Any]] = None) -> ElementAnalysis:
+    """Analyze a labeled element, asking the LLM only when the rules are unsure"""
+    start = time.perf_counter()
+    with tracing.span("element.analyze") as current:
+        analysis = analyze_heuristic(element)
+        source = "heuristic"
+
+        if analysis.confidence < MIN_CONFIDENCE and llm_factory is not None:
+            try:
+                with background():
+                    escalated = await asyncio.wait_for(
+                        _analyze_with_llm(element, analysis, llm_factory()), timeout=LLM_TIMEOUT_SECONDS
+                    )
+            except Exception:
+                # Timeout, provider or parse error: keep the rule-based answer
+                source = "llm_fallback"
+            else:
+                # Keep deterministic finds the LLM didn't mention
+                for name, suggestion in analysis.suggested_properties.items():
+                    escalated.suggested_properties.setdefault(name, suggestion)
+                escalated.detected_patterns = sorted(set(escalated.detected_patterns) | set(analysis.detected_patterns))
+                analysis, source = escalated, "llm"
+
+        current.set(source=source, page_type=analysis.page_type.value)
+
+    _analyses[source].inc()
+    analysis.duration_ms = round((time.perf_counter() - start) * 1000, 3)
+    return analysis
@@ -0,0 +1,380 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.services import metrics
+from app.services.event_store import EventStore, get_event_store
+from app.services.rule_engine import BatchResult, RuleEngine
+
+logger = logging.getLogger(__name__)
+
+# Event ingestion
+#
+# POST /api/v1/events/batch takes NDJSON (optionally gzip-compressed) and is
+# read as a stream: the body is decompressed and split into lines chunk by
+# chunk, and every INGEST_CHUNK_EVENTS lines are parsed and run through the
+# session's compiled taxonomy (app/services/rule_engine.py) on a worker
+# thread, so the event loop keeps serving other requests. That work holds
+# the GIL, so INGEST_WORKERS (default 1) threads share it; more only contend
+# with each other and the loop. Clean events go
+# to a bounded queue drained by one writer task into the sink (SQLite table,
+# NDJSON file or the columnar event store, standing in for the event stream).
+# Memory per request is one chunk, and the queue holds at most
+# INGEST_QUEUE_MAX_BATCHES chunks. Gzip bodies are inflated at most
+# DECOMPRESS_CHUNK_BYTES at a time, and a body that inflates past
+# INGEST_MAX_BODY_MB is rejected with 413 (events before that point were
+# already queued), so a small compressed body can't expand without bound.
+#
+# Backpressure: a request arriving while the queue is full gets 429 with
+# Retry-After straight away; a request that can't enqueue a chunk within
+# INGEST_ENQUEUE_TIMEOUT_SECONDS gets 429 with the line to resume from (the
+# lines before it were accepted).
+
+CHUNK_EVENTS = int(os.getenv("INGEST_CHUNK_EVENTS", "1000"))
+WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+QUEUE_MAX_BATCHES = int(os.getenv("INGEST_QUEUE_MAX_BATCHES", "64"))
+ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("INGEST_ENQUEUE_TIMEOUT_SECONDS", "2"))
+RETRY_AFTER_SECONDS = int(os.getenv("INGEST_RETRY_AFTER_SECONDS", "1"))
+MAX_BODY_BYTES = int(float(os.getenv("INGEST_MAX_BODY_MB", "100")) * 1024 * 1024)
+MAX_LINE_BYTES = 1024 * 1024
+DECOMPRESS_CHUNK_BYTES = 256 * 1024
+MAX_REPORTED_ERRORS = 100
+SINK_RETRIES = 3
+
+_decode = json.JSONDecoder().decode
+
+_events = {
+    outcome: metrics.counter("ingest_events_total", "Events received by the batch endpoint", {"outcome": outcome})
+    for outcome in ("accepted", "dropped", "invalid", "written", "lost")
+}
+_rejections = metrics.counter("ingest_backpressure_total", "Batch requests rejected with 429")
+
+
+class IngestError(Exception):
+    """Request can't be processed (bad body)"""
+
+
+class BodyTooLarge(IngestError):
+    """Body (after decompression) is over MAX_BODY_BYTES"""
+
+
+class QueueFull(Exception):
+    """Backpressure: nothing was enqueued from `resume_from_line` on"""
+
+    def __init__(self, resume_from_line: int):
+        super().__init__(f"Ingestion queue full; resume from line {resume_from_line}")
+        self.resume_from_line = resume_from_line
+
+
+# Streaming NDJSON parse
+
+async def _inflate(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Decompressed pieces of a gzip body, each at most DECOMPRESS_CHUNK_BYTES"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        async for chunk in chunks:
+            while chunk:
+                yield decompressor.decompress(chunk, DECOMPRESS_CHUNK_BYTES)
+                chunk = decompressor.unconsumed_tail
+        yield decompressor.flush()
+    except zlib.error as e:
+        raise IngestError(f"Invalid gzip body: {e}")
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], gzip: bool = False, max_bytes: int = MAX_BODY_BYTES
+) -> AsyncIterator[bytes]:
+    """Lines of a (possibly gzip-compressed) body, without holding the whole body"""
+    pending = b""
+    size = 0
+    async for chunk in _inflate(chunks) if gzip else chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise BodyTooLarge(f"Body larger than {max_bytes} bytes (decompressed)")
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        if len(pending) > MAX_LINE_BYTES:
+            raise IngestError(f"Line longer than {MAX_LINE_BYTES} bytes")
+        for line in lines:
+            yield line
+    for line in pending.split(b"\n"):
+        yield line
+
+
+# Sinks
+
+class EventSink:
+    """Destination for clean events"""
+
+    def write(self, rows: List[Tuple[str, dict]]) -> None:
+        """Persist (project_id, event) rows; runs in a worker thread"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteEventSink(EventSink):
+    def __init__(self, path: str = "events.db"):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                project_id TEXT NOT NULL,
+                event TEXT NOT NULL,
+                distinct_id TEXT,
+                timestamp TEXT NOT NULL,
+                properties TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS events_project_time ON events (project_id, timestamp);
+            """
+        )
+        self._lock = threading.Lock()
+
+    def write(self, rows: List[Tuple[str, dict]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO events (project_id, event, distinct_id, timestamp, properties) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (project_id, e["event"], e.get("distinct_id"), e["timestamp"], json.dumps(e["properties"]))
+                    for project_id, e in rows
+                ],
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class FileEventSink(EventSink):
+    """Appends NDJSON lines ({"project_id", **event})"""
+
+    def __init__(self, path: str = "events.ndjson"):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, rows: List[Tuple[str, dict]]) -> None:
+        data = "".join(json.dumps({"project_id": project_id, **e}) + "\n" for project_id, e in rows)
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ColumnarEventSink(EventSink):
+    """Partitioned column files (app/services/event_store.py)"""
+
+    def __init__(self, store: EventStore):
+        self.store = store
+
+    def write(self, rows: List[Tuple[str, dict]]) -> None:
+        by_project: Dict[str, List[dict]] = {}
+        for project_id, event in rows:
+            by_project.setdefault(project_id, []).append(event)
+        for project_id, events in by_project.items():
+            self.store.append(project_id, events)
+
+
+def create_sink() -> EventSink:
+    """Sink selected by EVENT_SINK (sqlite, file, columnar)"""
+    kind = os.getenv("EVENT_SINK", "sqlite")
+    if kind == "columnar":
+        return ColumnarEventSink(get_event_store())
+    if kind == "sqlite":
+        return SQLiteEventSink(os.getenv("EVENT_SINK_PATH", "events.db"))
+    if kind == "file":
+        return FileEventSink(os.getenv("EVENT_SINK_PATH", "events.ndjson"))
+    raise ValueError(f"Unknown EVENT_SINK '{kind}'")
+
+
+# Queue and writer
+
+class Ingestor:
+    def __init__(self, sink: EventSink, max_batches: int = QUEUE_MAX_BATCHES):
+        self.sink = sink
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_batches)
+        self._writer: Optional[asyncio.Task] = None
+        self.writes = 0
+
+    def full(self) -> bool:
+        return self.queue.full()
+
+    async def submit(self, project_id: str, events: List[dict], timeout: float = ENQUEUE_TIMEOUT_SECONDS) -> None:
+        """Enqueue clean events, waiting up to `timeout` for room"""
+        self._ensure_writer()
+        await asyncio.wait_for(self.queue.put((project_id, events)), timeout)
+
+    def _ensure_writer(self) -> None:
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    async def _write_loop(self) -> None:
+        while True:
+            batches = [await self.queue.get()]
+            # Whatever else is queued goes out in the same transaction
+            while not self.queue.empty() and len(batches) < 16:
+                batches.append(self.queue.get_nowait())
+            rows = [(project_id, e) for project_id, events in batches for e in events]
+            try:
+                await self._write(rows)
+            finally:
+                for _ in batches:
+                    self.queue.task_done()
+
+    async def _write(self, rows: List[Tuple[str, dict]]) -> None:
+        for attempt in range(SINK_RETRIES):
+            try:
+                await asyncio.to_thread(self.sink.write, rows)
+            except Exception:
+                logger.exception("Event sink write failed (attempt %d)", attempt + 1)
+                await asyncio.sleep(0.5 * 2 ** attempt)
+                continue
+            self.writes += 1
+            _events["written"].inc(len(rows))
+            return
+        _events["lost"].inc(len(rows))
+
+    async def close(self) -> None:
+        """Write out what is queued, then stop"""
+        if self._writer is not None and not self._writer.done():
+            await self.queue.join()
+            self._writer.cancel()
+        self._writer = None
+        self.sink.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued_batches": self.queue.qsize(),
+            "max_batches": self.queue.maxsize,
+            "writes": self.writes,
+            "events": {outcome: c.value for outcome, c in _events.items()},
+            "rejected_requests": _rejections.value,
+        }
+
+
+_ingestor: Optional[Ingestor] = None
+_workers: Optional[ThreadPoolExecutor] = None
+
+
+def get_ingestor() -> Ingestor:
+    global _ingestor
+    if _ingestor is None:
+        _ingestor = Ingestor(create_sink())
+    return _ingestor
+
+
+def get_workers() -> ThreadPoolExecutor:
+    """Threads that parse and clean request chunks"""
+    global _workers
+    if _workers is None:
+        _workers = ThreadPoolExecutor(WORKERS, thread_name_prefix="ingest")
+    return _workers
+
+
+async def close() -> None:
+    global _ingestor, _workers
+    if _ingestor is not None:
+        await _ingestor.close()
+        _ingestor = None
+    if _workers is not None:
+        _workers.shutdown(wait=False)
+        _workers = None
+
+
+# Request handling
+
+def process_lines(
+    engine: RuleEngine, lines: List[bytes], numbers: List[int]
+) -> Tuple[BatchResult, List[int], List[Tuple[int, str]]]:
+    """Parse NDJSON lines and clean them with `engine` (CPU-bound; runs in a worker thread)
+
+    Returns the engine's result, the line number of each event it was given
+    and (line number, error) for lines that aren't JSON objects.
+    """
+    events, kept, errors = [], [], []
+    for number, line in zip(numbers, lines):
+        try:
+            event = _decode(line.decode())
+        except ValueError as e:
+            errors.append((number, f"invalid JSON: {e}"))
+            continue
+        if not isinstance(event, dict):
+            errors.append((number, "event must be a JSON object"))
+            continue
+        events.append(event)
+        kept.append(number)
+    return engine.process(events), kept, errors
+
+
+async def ingest(engine: RuleEngine, project_id: str, chunks: AsyncIterator[bytes], gzip: bool = False) -> dict:
+    """Parse, clean and enqueue one NDJSON body; returns per-outcome counts"""
+    ingestor = get_ingestor()
+    if ingestor.full():
+        _rejections.inc()
+        raise QueueFull(1)
+
+    summary = {"lines": 0, "accepted": 0, "dropped": {}, "invalid": 0, "redacted": 0, "collisions": 0, "errors": []}
+    batch: List[bytes] = []
+    line_numbers: List[int] = []
+    line_number = 0
+
+    def invalid(number: int, error: str) -> None:
+        summary["invalid"] += 1
+        _events["invalid"].inc()
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": number, "error": error})
+
+    async def flush() -> None:
+        result, event_lines, errors = await asyncio.get_running_loop().run_in_executor(
+            get_workers(), process_lines, engine, batch, line_numbers
+        )
+        received = datetime.now(timezone.utc).isoformat()
+        for event in result.events:
+            if not event.get("timestamp"):
+                event["timestamp"] = received
+        for number, error in errors:
+            invalid(number, error)
+        for index, error in result.invalid:
+            invalid(event_lines[index], error)
+        if result.events:
+            try:
+                await ingestor.submit(project_id, result.events)
+            except asyncio.TimeoutError:
+                _rejections.inc()
+                raise QueueFull(line_numbers[0])
+        for reason, count in result.dropped.items():
+            # Rejected events are already reported as invalid
+            if reason not in ("missing_required", "invalid_properties", "missing_event_name"):
+                summary["dropped"][reason] = summary["dropped"].get(reason, 0) + count
+                _events["dropped"].inc(count)
+        summary["accepted"] += len(result.events)
+        summary["redacted"] += result.redacted
+        summary["collisions"] += result.collisions
+        _events["accepted"].inc(len(result.events))
+        batch.clear()
+        line_numbers.clear()
+
+    async for line in iter_lines(chunks, gzip):
+        line_number += 1
+        if not line.strip():
+            continue
+        batch.append(line)
+        line_numbers.append(line_number)
+        if len(batch) >= CHUNK_EVENTS:
+            await flush()
+    if batch:
+        await flush()
+
+    summary["lines"] = line_number
+    return summary
@@ -0,0 +1,337 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.models.job import Job
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Background jobs
+#
+# Work too slow for a request handler (several LLM passes) runs as a job: the
+# request inserts a row into a local SQLite queue and returns its id, and a
+# pool of JOB_WORKERS worker tasks runs queued jobs, reporting progress on the
+# row. A job is split into named steps (JobContext.step / .map); independent
+# steps run up to JOB_FANOUT at a time, and each step's result is stored as it
+# finishes. A failed attempt is retried with backoff (up to JOB_MAX_ATTEMPTS),
+# and jobs left queued or running by a crash or restart are picked up again on
+# startup; either way, steps already stored are reused instead of rerun.
+#
+# Submitting work that is already queued or running (same kind and key)
+# returns the existing job.
+#
+# JOBS_DB='' keeps the queue in memory (tests, benchmarks).
+
+WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+FANOUT = int(os.getenv("JOB_FANOUT", "4"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+RETRY_DELAY_SECONDS = float(os.getenv("JOB_RETRY_DELAY_SECONDS", "2"))
+
+_jobs = {
+    outcome: metrics.counter("jobs_total", "Background jobs finished", {"outcome": outcome})
+    for outcome in ("done", "failed", "retried")
+}
+_steps = {
+    source: metrics.counter("job_steps_total", "Background job steps", {"source": source})
+    for source in ("run", "resumed")
+}
+
+ACTIVE = ("queued", "running")
+JOB_COLUMNS = "id, kind, status, done, total, attempts, result, error, created, updated"
+
+
+class JobError(Exception):
+    """Fails a job without retrying it (e.g. its input no longer exists)"""
+
+
+def _to_job(row: tuple) -> Job:
+    id, kind, status, done, total, attempts, result, error, created, updated = row
+    return Job(
+        id=id,
+        kind=kind,
+        status=status,
+        done=done,
+        total=total,
+        attempts=attempts,
+        result=json.loads(result) if result else None,
+        error=error,
+        created_at=datetime.fromtimestamp(created, timezone.utc),
+        updated_at=datetime.fromtimestamp(updated, timezone.utc),
+    )
+
+
+class JobStore:
+    """Jobs and their finished steps in one SQLite file"""
+
+    def __init__(self, path: str = ":memory:"):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, kind TEXT NOT NULL, key TEXT NOT NULL, status TEXT NOT NULL,
+                payload TEXT NOT NULL, done INTEGER NOT NULL DEFAULT 0, total INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT,
+                created REAL NOT NULL, updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_key ON jobs (kind, key, status);
+            CREATE TABLE IF NOT EXISTS job_steps (
+                job_id TEXT NOT NULL, step TEXT NOT NULL, result TEXT NOT NULL, PRIMARY KEY (job_id, step)
+            );
+            """
+        )
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def create(self, kind: str, key: str, payload: dict) -> Tuple[str, bool]:
+        """(job id, created): the queued or running job for (kind, key), else a new one"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND key = ? AND status IN (?, ?) ORDER BY created DESC LIMIT 1",
+                (kind, key, *ACTIVE),
+            ).fetchone()
+            if row is not None:
+                return row[0], False
+            job_id = f"job_{uuid.uuid4().hex[:12]}"
+            now = time.time()
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, key, status, payload, created, updated) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, key, json.dumps(payload), now, now),
+            )
+            return job_id, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _to_job(row) if row is not None else None
+
+    def pending(self) -> List[str]:
+        """Queued and running jobs, oldest first"""
+        rows = self._execute("SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created", ACTIVE).fetchall()
+        return [row[0] for row in rows]
+
+    def start(self, job_id: str) -> Tuple[str, dict, int]:
+        """Mark running; returns (kind, payload, attempt number)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+            kind, payload, attempts = self._conn.execute(
+                "SELECT kind, payload, attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return kind, json.loads(payload), attempts
+
+    def progress(self, job_id: str, done: int, total: int) -> None:
+        self._execute("UPDATE jobs SET done = ?, total = ?, updated = ? WHERE id = ?", (done, total, time.time(), job_id))
+
+    def steps(self, job_id: str) -> Dict[str, Any]:
+        rows = self._execute("SELECT step, result FROM job_steps WHERE job_id = ?", (job_id,)).fetchall()
+        return {step: json.loads(result) for step, result in rows}
+
+    def save_step(self, job_id: str, step: str, value: Any) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO job_steps (job_id, step, result) VALUES (?, ?, ?)", (job_id, step, json.dumps(value))
+        )
+
+    def finish(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+            if status == "done":
+                # Steps only serve a resume
+                self._conn.execute("DELETE FROM job_steps WHERE job_id = ?", (job_id,))
+
+    def requeue(self, job_id: str, error: str) -> None:
+        self._execute("UPDATE jobs SET status = 'queued', error = ?, updated = ? WHERE id = ?", (error, time.time(), job_id))
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class JobContext:
+    """What a job handler gets: stored steps and progress reporting"""
+
+    def __init__(self, store: JobStore, job_id: str, fanout: int = FANOUT):
+        self.store = store
+        self.job_id = job_id
+        self._steps = store.steps(job_id)
+        self._semaphore = asyncio.Semaphore(fanout)
+        self.done = len(self._steps)
+        self.total = 0
+
+    def plan(self, total: int) -> None:
+        """Announce how many steps the job has"""
+        self.total = total
+        self.store.progress(self.job_id, self.done, total)
+
+    async def step(self, name: str, run: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of `run()` (JSON-serializable), or the one stored by an earlier attempt"""
+        if name in self._steps:
+            _steps["resumed"].inc()
+            return self._steps[name]
+        async with self._semaphore:
+            value = await run()
+        self.store.save_step(self.job_id, name, value)
+        self._steps[name] = value
+        self.done += 1
+        self.store.progress(self.job_id, self.done, max(self.total, self.done))
+        _steps["run"].inc()
+        return value
+
+    async def map(self, steps: List[Tuple[str, Callable[[], Awaitable[Any]]]]) -> List[Any]:
+        """Run independent steps in parallel (up to the fan-out); results in order.
+
+        Every step gets to finish (and be stored) before a failure is raised,
+        so the retry only reruns the steps that failed.
+        """
+        results = await asyncio.gather(*(self.step(name, run) for name, run in steps), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+
+Handler = Callable[[dict, JobContext], Awaitable[dict]]
+
+
+class JobRunner:
+    def __init__(self, store: JobStore, workers: int = WORKERS, fanout: int = FANOUT):
+        self.store = store
+        self.workers = workers
+        self.fanout = fanout
+        self.handlers: Dict[str, Handler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.resumed = 0
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self.handlers[kind] = handler
+
+    def start(self) -> None:
+        """Start the workers and queue every job a previous process left unfinished"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and all(not t.done() for t in self._tasks):
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+        pending = self.store.pending()
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+        self.resumed += len(pending)
+        if pending:
+            logger.info("Resuming %d unfinished job(s)", len(pending))
+
+    async def submit(self, kind: str, key: str, payload: dict) -> Job:
+        """Queue a job (or return the one already queued or running for `key`)"""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler for job kind '{kind}'")
+        self.start()
+        job_id, created = self.store.create(kind, key, payload)
+        if created:
+            self._queue.put_nowait(job_id)
+        return self.store.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Job %s: runner error", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        kind, payload, attempt = self.store.start(job_id)
+        handler = self.handlers.get(kind)
+        if handler is None:
+            self.store.finish(job_id, "failed", error=f"No handler for job kind '{kind}'")
+            return
+        context = JobContext(self.store, job_id, self.fanout)
+        try:
+            result = await handler(payload, context)
+        except JobError as e:
+            self.store.finish(job_id, "failed", error=str(e))
+            _jobs["failed"].inc()
+        except Exception as e:
+            logger.exception("Job %s (%s) failed, attempt %d", job_id, kind, attempt)
+            if attempt >= MAX_ATTEMPTS:
+                self.store.finish(job_id, "failed", error=str(e) or type(e).__name__)
+                _jobs["failed"].inc()
+                return
+            self.store.requeue(job_id, str(e) or type(e).__name__)
+            _jobs["retried"].inc()
+            delay = RETRY_DELAY_SECONDS * 2 ** (attempt - 1)
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job_id)
+        else:
+            self.store.finish(job_id, "done", result=result)
+            _jobs["done"].inc()
+
+    async def close(self) -> None:
+        """Stop the workers; jobs they were running stay queued in the store and resume on next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    def stats(self) -> dict:
+        return {
+            "jobs": self.store.counts(),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "workers": self.workers,
+            "fanout": self.fanout,
+            "resumed": self.resumed,
+            "steps": {source: c.value for source, c in _steps.items()},
+        }
+
+
+_runner: Optional[JobRunner] = None
+_handlers: Dict[str, Handler] = {}
+
+
+def register(kind: str, handler: Handler) -> None:
+    """Handler for a job kind, for the shared runner"""
+    _handlers[kind] = handler
+    if _runner is not None:
+        _runner.register(kind, handler)
+
+
+def get_runner() -> JobRunner:
+    global _runner
+    if _runner is None:
+        _runner = JobRunner(JobStore(os.getenv("JOBS_DB", "jobs.db") or ":memory:"))
+        for kind, handler in _handlers.items():
+            _runner.register(kind, handler)
+    return _runner
+
+
+async def close() -> None:
+    global _runner
+    if _runner is not None:
+        await _runner.close()
+        _runner.store.close()
+        _runner = None
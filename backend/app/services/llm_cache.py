@@ -0,0 +1,257 @@
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.services import metrics
+
+# LLM response cache
+#
+# Keyed on (node, prompt template, model) plus the normalized user input, so a
+# prompt change or model swap never serves an old answer. Two tiers:
+# - exact: normalized text match
+# - semantic (optional): cosine similarity over a local hashed n-gram
+#   embedding, for near-identical phrasings ("an online store selling
+#   handmade goods" / "online store that sells handmade goods")
+# Both tiers are LRU with a TTL, an entry cap and an approximate byte budget.
+# Values must be JSON-serializable.
+
+EMBEDDING_DIMS = 1024
+
+_exact_hits = metrics.counter("llm_cache_exact_hits_total", "LLM calls answered by the exact cache tier")
+_semantic_hits = metrics.counter("llm_cache_semantic_hits_total", "LLM calls answered by the semantic cache tier")
+_misses = metrics.counter("llm_cache_misses_total", "LLM cache misses")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def template_id(template: str) -> str:
+    return hashlib.sha1(template.encode()).hexdigest()[:12]
+
+
+def embed(text: str) -> Dict[int, float]:
+    """Sparse L2-normalized vector of hashed words and character trigrams"""
+    features: Dict[int, float] = {}
+    for word in text.split():
+        index = zlib.crc32(b"w:" + word.encode()) % EMBEDDING_DIMS
+        features[index] = features.get(index, 0.0) + 2.0
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            index = zlib.crc32(b"c:" + padded[i:i + 3].encode()) % EMBEDDING_DIMS
+            features[index] = features.get(index, 0.0) + 1.0
+
+    norm = math.sqrt(sum(v * v for v in features.values()))
+    if not norm:
+        return {}
+    return {i: v / norm for i, v in features.items()}
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(i, 0.0) for i, v in a.items())
+
+
+class CacheTier:
+    """LRU entries with a TTL (from when they were stored) and size limits"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: Optional[float]):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # key -> (value, size, stored_at)
+        self._entries: "OrderedDict[Any, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or self._expired(key, entry):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, size: int) -> None:
+        self.remove(key)
+        self._entries[key] = (value, size, time.monotonic())
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self.evictions += 1
+            self.remove(next(iter(self._entries)))
+
+    def remove(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+            self._on_remove(key)
+
+    def items(self):
+        return list(self._entries.items())
+
+    def _expired(self, key, entry) -> bool:
+        if self.ttl_seconds is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+            self.expirations += 1
+            self.remove(key)
+            return True
+        return False
+
+    def _on_remove(self, key) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SemanticTier(CacheTier):
+    """Nearest-neighbour lookup within a namespace, above a similarity threshold"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: Optional[float], threshold: float):
+        super().__init__(max_entries, max_bytes, ttl_seconds)
+        self.threshold = threshold
+        self._vectors: Dict[Tuple[str, str], Dict[int, float]] = {}
+        self._by_namespace: Dict[str, set] = {}
+
+    def search(self, namespace: str, text: str) -> Optional[Any]:
+        vector = embed(text)
+        best_key, best_score = None, self.threshold
+        for key in self._by_namespace.get(namespace, ()):
+            score = cosine(vector, self._vectors[key])
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            self.misses += 1
+            return None
+        return self.get(best_key)
+
+    def add(self, namespace: str, text: str, value, size: int) -> None:
+        key = (namespace, text)
+        self._vectors[key] = embed(text)
+        self._by_namespace.setdefault(namespace, set()).add(key)
+        self.put(key, value, size)
+
+    def _on_remove(self, key) -> None:
+        self._vectors.pop(key, None)
+        keys = self._by_namespace.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_namespace[key[0]]
+
+
+class LLMCache:
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl_seconds: Optional[float] = 86400,
+        semantic: bool = False,
+        similarity: float = 0.92,
+    ):
+        self.exact = CacheTier(max_entries, max_bytes, ttl_seconds)
+        self.semantic = SemanticTier(max_entries, max_bytes, ttl_seconds, similarity) if semantic else None
+        self._per_node: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def namespace(node: str, template: str, model: str) -> str:
+        return f"{node}:{template_id(template)}:{model}"
+
+    def get(self, node: str, template: str, model: str, text: str) -> Optional[Any]:
+        namespace = self.namespace(node, template, model)
+        normalized = normalize(text)
+        counts = self._per_node.setdefault(node, {"hits": 0, "misses": 0})
+
+        value = self.exact.get((namespace, normalized))
+        if value is not None:
+            _exact_hits.inc()
+        elif self.semantic is not None:
+            value = self.semantic.search(namespace, normalized)
+            if value is not None:
+                _semantic_hits.inc()
+
+        if value is None:
+            _misses.inc()
+            counts["misses"] += 1
+            return None
+
+        counts["hits"] += 1
+        return value
+
+    def put(self, node: str, template: str, model: str, text: str, value: Any) -> None:
+        namespace = self.namespace(node, template, model)
+        normalized = normalize(text)
+        size = len(json.dumps(value, default=str)) + len(namespace) + len(normalized)
+
+        self.exact.put((namespace, normalized), value, size)
+        if self.semantic is not None:
+            self.semantic.add(namespace, normalized, value, size)
+
+    def clear(self) -> None:
+        for tier in (self.exact, self.semantic):
+            if tier is not None:
+                for key, _ in tier.items():
+                    tier.remove(key)
+
+    def stats(self) -> dict:
+        nodes = {}
+        for node, counts in sorted(self._per_node.items()):
+            lookups = counts["hits"] + counts["misses"]
+            nodes[node] = {**counts, "hit_rate": round(counts["hits"] / lookups, 4) if lookups else None}
+
+        return {
+            "exact": self.exact.stats(),
+            "semantic": self.semantic.stats() if self.semantic is not None else None,
+            "nodes": nodes,
+        }
+
+
+_cache: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Process-wide cache built from environment settings; None when disabled"""
+    global _cache
+    if _cache is None:
+        max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+        if max_entries <= 0:
+            return None
+        _cache = LLMCache(
+            max_entries=max_entries,
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "16")) * 1024 * 1024),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400")),
+            semantic=os.getenv("LLM_CACHE_SEMANTIC", "0").lower() in ("1", "true", "yes"),
+            similarity=float(os.getenv("LLM_CACHE_SIMILARITY", "0.92")),
+        )
+    return _cache
+
+
+def model_name(llm) -> str:
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
@@ -0,0 +1,404 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.services import metrics
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+# LLM request scheduler
+#
+# Every provider call goes through one scheduler per process instead of each
+# node calling its client directly:
+# - Priorities: a call waits in a heap ordered by (priority, arrival), so an
+#   interactive chat turn is dispatched ahead of queued background work
+#   (element analysis, jobs). The priority comes from a context variable:
+#   interactive unless the caller runs under background().
+# - Limits: at most LLM_MAX_CONCURRENCY calls in flight, and token buckets
+#   for LLM_REQUESTS_PER_MINUTE and LLM_TOKENS_PER_MINUTE (estimated from the
+#   prompt, corrected with the provider's usage when it reports it).
+# - 429s: a rate-limited call is retried after Retry-After (or an exponential
+#   backoff), dispatch pauses for everyone meanwhile, and the concurrency
+#   limit halves; it grows back by one per window of successful calls.
+# - Coalescing: identical prompts to the same client already in flight share
+#   one provider call. Streamed calls are never coalesced.
+
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))  # 0: no limit
+TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "150000"))  # 0: no limit
+BURST_SECONDS = float(os.getenv("LLM_BURST_SECONDS", "10"))  # Bucket size, in seconds of rate
+MAX_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "5"))
+BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "1"))
+MAX_BACKOFF_SECONDS = 60.0
+COMPLETION_TOKENS = 256  # Expected completion size, for the token estimate
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITIES = {"interactive": INTERACTIVE, "background": BACKGROUND}
+_NAMES = {level: name for name, level in PRIORITIES.items()}
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+_dispatched = {
+    level: metrics.counter("llm_scheduler_requests_total", "LLM calls dispatched", {"priority": name})
+    for name, level in PRIORITIES.items()
+}
+_queue_seconds = {
+    level: metrics.histogram("llm_scheduler_queue_seconds", "Time LLM calls waited for a slot", labels={"priority": name})
+    for name, level in PRIORITIES.items()
+}
+_rate_limited = metrics.counter("llm_scheduler_rate_limited_total", "LLM calls rejected with 429 by the provider")
+_coalesced = metrics.counter("llm_scheduler_coalesced_total", "LLM calls served by an identical in-flight call")
+
+
+@contextmanager
+def background():
+    """Run the enclosed LLM calls at background priority"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(messages: List["BaseMessage"]) -> int:
+    """Prompt tokens (~4 characters each) plus the expected completion"""
+    return sum(len(str(m.content)) for m in messages) // 4 + COMPLETION_TOKENS
+
+
+def rate_limit_delay(exc: BaseException) -> Optional[float]:
+    """Seconds the provider asks us to wait if `exc` is a 429 (0 when it doesn't say), else None"""
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429 and type(exc).__name__ != "RateLimitError":
+        return None
+    retry_after = getattr(exc, "retry_after", None)
+    if retry_after is None:
+        headers = getattr(response, "headers", None) or {}
+        retry_after = headers.get("retry-after")
+    try:
+        return max(float(retry_after), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _used_tokens(response) -> Optional[int]:
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+class TokenBucket:
+    """`per_minute` units refilled continuously, up to BURST_SECONDS worth"""
+
+    __slots__ = ("rate", "capacity", "level", "updated")
+
+    def __init__(self, per_minute: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = per_minute / 60
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` (capped at the bucket size) is available"""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        # May go negative (an underestimate corrected afterwards): later calls wait it off
+        self.level -= amount
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "queued_at", "granted")
+
+    def __init__(self, priority: int, tokens: int):
+        self.priority = priority
+        self.tokens = tokens
+        self.queued_at = time.monotonic()
+        self.granted: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class _Shared:
+    """One provider call and the callers waiting on it"""
+
+    __slots__ = ("task", "waiter", "callers")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiter: Optional[_Waiter] = None
+        self.callers = 0
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENCY,
+        requests_per_minute: float = REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = TOKENS_PER_MINUTE,
+        max_retries: int = MAX_RETRIES,
+        backoff_seconds: float = BACKOFF_SECONDS,
+        burst_seconds: float = BURST_SECONDS,
+    ):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency  # Current (adaptive) concurrency limit
+        self.requests = TokenBucket(requests_per_minute, burst_seconds) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds) if tokens_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._backoff = backoff_seconds
+        self._paused_until = 0.0
+        self._successes = 0
+        self._in_flight = 0
+        self._heap: List[Tuple[int, int, _Waiter]] = []
+        self._seq = itertools.count()
+        self._inflight_calls: Dict[tuple, _Shared] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.coalesced = 0
+
+    # Dispatch
+
+    def _ensure_dispatcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (tests, benchmarks): start over
+            self._loop, self._heap, self._in_flight = loop, [], 0
+            self._inflight_calls.clear()
+            self._wake = asyncio.Event()
+            self._dispatcher = None
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch_loop())
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            delay = self._dispatch()
+            self._wake.clear()
+            if delay is None:
+                await self._wake.wait()
+                continue
+            try:
+                # Woken early by a release or a new (maybe higher priority) arrival
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self) -> Optional[float]:
+        """Grant slots while allowed; returns seconds until the next try (None: wait for a wake-up)"""
+        while self._heap:
+            waiter = self._heap[0][2]
+            if waiter.granted.done():  # Cancelled, or a duplicate entry after a priority upgrade
+                heapq.heappop(self._heap)
+                continue
+            if self._in_flight >= self.limit:
+                return None
+            now = time.monotonic()
+            delay = max(
+                self._paused_until - now,
+                self.requests.delay(1, now) if self.requests else 0.0,
+                self.tokens.delay(waiter.tokens, now) if self.tokens else 0.0,
+            )
+            if delay > 0:
+                return delay
+            heapq.heappop(self._heap)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(waiter.tokens)
+            self._in_flight += 1
+            _dispatched[waiter.priority].inc()
+            _queue_seconds[waiter.priority].observe(now - waiter.queued_at)
+            waiter.granted.set_result(None)
+        return None
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        heapq.heappush(self._heap, (waiter.priority, next(self._seq), waiter))
+        self._wake.set()
+
+    async def _acquire(self, waiter: _Waiter) -> None:
+        self._ensure_dispatcher()
+        self._enqueue(waiter)
+        try:
+            await waiter.granted
+        except asyncio.CancelledError:
+            if waiter.granted.done() and not waiter.granted.cancelled():
+                self._release()  # Granted just as the caller gave up
+            else:
+                waiter.granted.cancel()
+            raise
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._wake.set()
+
+    # Rate limits
+
+    def _on_success(self, tokens: int, used: Optional[int]) -> None:
+        if used is not None and self.tokens:
+            self.tokens.take(used - tokens)
+        self._backoff = self.backoff_seconds
+        self._successes += 1
+        if self.limit < self.max_concurrency and self._successes >= self.limit:
+            self.limit += 1
+            self._successes = 0
+
+    def _on_rate_limited(self, retry_after: float) -> float:
+        self.rate_limited += 1
+        _rate_limited.inc()
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+        delay = retry_after or self._backoff * random.uniform(0.8, 1.2)
+        self._backoff = min(self._backoff * 2, MAX_BACKOFF_SECONDS)
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    async def _call(self, waiter: _Waiter, run) -> Any:
+        """Run `run()` in a slot, retrying 429s at the same priority"""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                waiter = _Waiter(waiter.priority, waiter.tokens)
+            await self._acquire(waiter)
+            self.calls += 1
+            try:
+                result = await run()
+            except Exception as exc:
+                retry_after = rate_limit_delay(exc)
+                if retry_after is None or attempt == self.max_retries:
+                    raise
+                delay = self._on_rate_limited(retry_after)
+                self.retries += 1
+                logger.info("LLM call rate limited; retrying in %.1fs", delay)
+                continue
+            finally:
+                self._release()
+            self._on_success(waiter.tokens, _used_tokens(result))
+            return result
+
+    # Public API
+
+    async def ainvoke(self, llm, messages: List["BaseMessage"], priority: Optional[int] = None):
+        """`llm.ainvoke(messages)` through the queue; joins an identical call already in flight"""
+        priority = _priority.get() if priority is None else priority
+        key = (id(llm), tuple((m.type, str(m.content)) for m in messages))
+        self._ensure_dispatcher()
+        shared = self._inflight_calls.get(key)
+        if shared is None:
+            shared = self._inflight_calls[key] = _Shared()
+            shared.waiter = _Waiter(priority, estimate_tokens(messages))
+
+            async def run():
+                return await llm.ainvoke(messages)
+
+            shared.task = asyncio.ensure_future(self._call(shared.waiter, run))
+            shared.task.add_done_callback(lambda _: self._forget(key, shared))
+        else:
+            self.coalesced += 1
+            _coalesced.inc()
+            waiter = shared.waiter
+            if priority < waiter.priority and not waiter.granted.done():
+                # An interactive caller joined a queued background call: move it up
+                waiter.priority = priority
+                self._enqueue(waiter)
+
+        shared.callers += 1
+        try:
+            return await asyncio.shield(shared.task)
+        except asyncio.CancelledError:
+            if shared.callers == 1 and not shared.task.done():
+                shared.task.cancel()  # Nobody is waiting for it any more
+            raise
+        finally:
+            shared.callers -= 1
+
+    def _forget(self, key: tuple, shared: _Shared) -> None:
+        if self._inflight_calls.get(key) is shared:
+            del self._inflight_calls[key]
+
+    async def astream(self, llm, messages: List["BaseMessage"], priority: Optional[int] = None) -> AsyncIterator:
+        """`llm.astream(messages)` in a slot; a 429 before the first chunk is retried"""
+        priority = _priority.get() if priority is None else priority
+        waiter = _Waiter(priority, estimate_tokens(messages))
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                waiter = _Waiter(priority, waiter.tokens)
+            await self._acquire(waiter)
+            self.calls += 1
+            started = False
+            try:
+                async for chunk in llm.astream(messages):
+                    started = True
+                    yield chunk
+            except Exception as exc:
+                retry_after = rate_limit_delay(exc)
+                if started or retry_after is None or attempt == self.max_retries:
+                    raise
+                delay = self._on_rate_limited(retry_after)
+                self.retries += 1
+                logger.info("LLM stream rate limited; retrying in %.1fs", delay)
+                continue
+            finally:
+                self._release()
+            self._on_success(waiter.tokens, None)
+            return
+
+    def stats(self) -> dict:
+        queued = {name: 0 for name in PRIORITIES}
+        for _, _, waiter in self._heap:
+            if not waiter.granted.done():
+                queued[_NAMES[waiter.priority]] += 1
+        return {
+            "queued": queued,
+            "in_flight": self._in_flight,
+            "concurrency_limit": self.limit,
+            "max_concurrency": self.max_concurrency,
+            "paused_seconds": round(max(self._paused_until - time.monotonic(), 0.0), 3),
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "coalesced": self.coalesced,
+            "queue_p95_ms": {
+                name: round((_queue_seconds[level].quantile(0.95) or 0.0) * 1000, 2)
+                for name, level in PRIORITIES.items()
+            },
+        }
+
+    def close(self) -> None:
+        if self._dispatcher is not None and not self._dispatcher.done():
+            self._dispatcher.cancel()
+        self._dispatcher = None
+        self._loop = None
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def close() -> None:
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.close()
+        _scheduler = None
@@ -0,0 +1,152 @@
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence
+
+# In-process metrics
+#
+# Counters and fixed-bucket histograms, cheap enough to update on every
+# request. Values are read back through snapshot() (JSON) or
+# render_prometheus() (text exposition format).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_str(labels: Optional[Dict[str, str]], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in sorted((labels or {}).items())]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def snapshot(self) -> dict:
+        return {"type": "counter", "value": self.value}
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        labels: Optional[Dict[str, str]] = None,
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.buckets: List[float] = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "histogram",
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+# Keyed by name plus rendered labels, e.g. 'span_duration_seconds{span="llm"}'
+_metrics: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def counter(name: str, description: str = "", labels: Optional[Dict[str, str]] = None) -> Counter:
+    """Get or create a counter"""
+    key = name + _label_str(labels)
+    with _lock:
+        metric = _metrics.get(key)
+        if metric is None:
+            metric = _metrics[key] = Counter(name, description, labels)
+        return metric
+
+
+def histogram(
+    name: str,
+    description: str = "",
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+    labels: Optional[Dict[str, str]] = None,
+) -> Histogram:
+    """Get or create a histogram"""
+    key = name + _label_str(labels)
+    with _lock:
+        metric = _metrics.get(key)
+        if metric is None:
+            metric = _metrics[key] = Histogram(name, description, buckets, labels)
+        return metric
+
+
+def snapshot() -> dict:
+    return {key: metric.snapshot() for key, metric in sorted(_metrics.items())}
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        metrics = sorted(_metrics.values(), key=lambda m: (m.name, _label_str(m.labels)))
+
+    lines: List[str] = []
+    seen = set()
+    for metric in metrics:
+        if metric.name not in seen:
+            seen.add(metric.name)
+            kind = "counter" if isinstance(metric, Counter) else "histogram"
+            if metric.description:
+                lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+
+        if isinstance(metric, Counter):
+            lines.append(f"{metric.name}{_label_str(metric.labels)} {metric.value}")
+            continue
+
+        with metric._lock:
+            counts, total, count = list(metric.counts), metric.sum, metric.count
+        cumulative = 0
+        for bound, n in zip(metric.buckets, counts):
+            cumulative += n
+            le = _label_str(metric.labels, f'le="{bound}"')
+            lines.append(f"{metric.name}_bucket{le} {cumulative}")
+        le = _label_str(metric.labels, 'le="+Inf"')
+        lines.append(f"{metric.name}_bucket{le} {count}")
+        lines.append(f"{metric.name}_sum{_label_str(metric.labels)} {total}")
+        lines.append(f"{metric.name}_count{_label_str(metric.labels)} {count}")
+
+    return "\n".join(lines) + "\n"
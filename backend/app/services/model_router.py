@@ -0,0 +1,373 @@
+import json
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from app.services import metrics, tracing
+from app.services.llm_scheduler import get_scheduler
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+# Model routing per graph node
+#
+# Nodes ask the router for a model by node name instead of building their own
+# client. The policy gives every node a quality tier ("fast" or "large"), an
+# optional tier to escalate to, and a latency budget:
+# - Structured nodes (extraction, classification) call complete(): the fast
+#   model answers first; if its answer doesn't parse (validation failure) or
+#   the caller's confidence check rejects it, the call is repeated on the
+#   escalation tier. Escalation is skipped when the escalation model's recent
+#   latency no longer fits in what is left of the node's budget; the fast
+#   answer is kept (or the parse error raised, for the caller's fallback).
+# - Free-text nodes (replies) call model() and report the call with record().
+# Every call is counted per node and model: latency, tokens (provider usage,
+# else estimated from characters) and cost from the tier's per-1k prices.
+#
+# The defaults below are overridden, per key, by MODEL_ROUTES (inline JSON)
+# and MODEL_ROUTES_FILE (a JSON file, re-read when it changes; checked at most
+# once a second), so routes can be retuned without a deploy. Overrides that
+# don't validate are logged and ignored. Clients come from a registry keyed on
+# (model, temperature); benchmarks pass one that builds fake models.
+
+ROUTES = os.getenv("MODEL_ROUTES", "")
+ROUTES_FILE = os.getenv("MODEL_ROUTES_FILE", "")
+
+DEFAULT_POLICY = {
+    "tiers": {
+        "fast": {"model": "gpt-3.5-turbo", "input_per_1k": 0.0005, "output_per_1k": 0.0015},
+        "large": {"model": "gpt-4-turbo-preview", "input_per_1k": 0.01, "output_per_1k": 0.03},
+    },
+    "default": {"tier": "large", "escalate_to": None, "latency_budget_ms": 8000, "temperature": 0.7},
+    "nodes": {
+        # Setup conversation: structured extraction, checked and escalated
+        "classify_domain": {"tier": "fast", "escalate_to": "large", "latency_budget_ms": 4000, "temperature": 0},
+        "extract_actions": {"tier": "fast", "escalate_to": "large", "latency_budget_ms": 4000, "temperature": 0},
+        "extract_segments": {"tier": "fast", "escalate_to": "large", "latency_budget_ms": 4000, "temperature": 0},
+        "extract_goals": {"tier": "fast", "escalate_to": "large", "latency_budget_ms": 4000, "temperature": 0},
+        # Replies the user reads
+        "product_discovery": {"tier": "large"},
+        "goal_understanding": {"tier": "large"},
+        "analyze_element": {"tier": "large", "latency_budget_ms": 10000},
+        # Analytics questions: one plan per intent, then cached
+        "plan_query": {"tier": "large", "latency_budget_ms": 8000, "temperature": 0},
+        # Taxonomy build jobs: one call per event, in the background
+        "taxonomy_event": {"tier": "large", "latency_budget_ms": 15000, "temperature": 0},
+    },
+}
+
+EWMA_WEIGHT = 0.2  # Weight of the newest call in a model's expected latency
+CHARS_PER_TOKEN = 4  # Token estimate when the provider reports no usage
+RELOAD_INTERVAL_SECONDS = 1.0  # How often route() checks the routes file
+
+T = TypeVar("T")
+
+
+class Route:
+    __slots__ = ("tier", "escalate_to", "latency_budget_ms", "temperature")
+
+    def __init__(self, tier: str, escalate_to: Optional[str], latency_budget_ms: float, temperature: float):
+        self.tier = tier
+        self.escalate_to = escalate_to if escalate_to != tier else None
+        self.latency_budget_ms = latency_budget_ms
+        self.temperature = temperature
+
+    def tiers(self) -> List[str]:
+        return [self.tier, self.escalate_to] if self.escalate_to else [self.tier]
+
+
+def merge(policy: dict, overrides: dict) -> dict:
+    """`policy` with `overrides` applied per tier and per node (fields not given are kept)"""
+    merged = {
+        "tiers": {name: dict(spec) for name, spec in policy["tiers"].items()},
+        "default": dict(policy["default"]),
+        "nodes": {name: dict(spec) for name, spec in policy["nodes"].items()},
+    }
+    for name, spec in (overrides.get("tiers") or {}).items():
+        merged["tiers"].setdefault(name, {}).update(spec)
+    merged["default"].update(overrides.get("default") or {})
+    for name, spec in (overrides.get("nodes") or {}).items():
+        merged["nodes"].setdefault(name, {}).update(spec)
+    return merged
+
+
+def build_routes(policy: dict) -> Dict[str, Route]:
+    """Route per node (plus "" for the default); ValueError if the policy is inconsistent"""
+    tiers = policy["tiers"]
+    for name, spec in tiers.items():
+        if not spec.get("model"):
+            raise ValueError(f"Tier {name!r} has no model")
+
+    routes = {}
+    for node, spec in [("", {}), *policy["nodes"].items()]:
+        spec = {**policy["default"], **spec}
+        route = Route(spec["tier"], spec.get("escalate_to"), float(spec["latency_budget_ms"]), float(spec["temperature"]))
+        for tier in route.tiers():
+            if tier not in tiers:
+                raise ValueError(f"Node {node or 'default'!r} routes to unknown tier {tier!r}")
+        if route.latency_budget_ms <= 0:
+            raise ValueError(f"Node {node or 'default'!r} needs a positive latency budget")
+        routes[node] = route
+    return routes
+
+
+def _openai(model: str, temperature: float):
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=model, temperature=temperature, api_key=os.getenv("OPENAI_API_KEY"))
+
+
+class ModelRegistry:
+    """Chat model clients by (model, temperature), built on first use"""
+
+    def __init__(self, factory: Callable[[str, float], Any] = _openai):
+        self._factory = factory
+        self._models: Dict[Tuple[str, float], Any] = {}
+
+    def get(self, model: str, temperature: float):
+        key = (model, temperature)
+        client = self._models.get(key)
+        if client is None:
+            client = self._models[key] = self._factory(model, temperature)
+        return client
+
+
+class NodeStats:
+    __slots__ = ("calls", "escalations", "budget_skips", "over_budget", "latency", "models")
+
+    def __init__(self):
+        self.calls = 0
+        self.escalations = {"invalid": 0, "low_confidence": 0}
+        self.budget_skips = 0
+        self.over_budget = 0
+        self.latency = metrics.Histogram("node_latency")  # Router-local, for stats()
+        self.models: Dict[str, Dict[str, float]] = {}
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        policy: Optional[dict] = None,
+        registry: Optional[ModelRegistry] = None,
+        overrides: str = ROUTES,
+        routes_file: str = ROUTES_FILE,
+        reload_interval: float = RELOAD_INTERVAL_SECONDS,
+    ):
+        self.registry = registry or ModelRegistry()
+        policy = policy or DEFAULT_POLICY
+        try:
+            self._base = merge(policy, json.loads(overrides) if overrides else {})
+            self._routes = build_routes(self._base)
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            logger.error("Ignoring MODEL_ROUTES: %s", exc)
+            self._base = merge(policy, {})
+            self._routes = build_routes(self._base)
+        self._file = routes_file
+        self._file_mtime: Optional[float] = None
+        self._reload_interval = reload_interval
+        self._next_check = 0.0
+        self.policy = self._base
+        self._prices: Dict[str, Tuple[float, float]] = {}
+        self._index_prices()
+        self._expected: Dict[str, float] = {}  # model -> EWMA call seconds
+        self._nodes: Dict[str, NodeStats] = {}
+        self.reload()
+
+    # Policy
+
+    def reload(self) -> bool:
+        """Re-read the routes file if it changed; a bad file is logged and the current policy kept"""
+        if not self._file:
+            return False
+        try:
+            mtime = os.stat(self._file).st_mtime
+        except OSError:
+            return False
+        if mtime == self._file_mtime:
+            return False
+        self._file_mtime = mtime
+        try:
+            with open(self._file) as f:
+                policy = merge(self._base, json.load(f))
+            routes = build_routes(policy)
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.error("Ignoring model routes file %s: %s", self._file, exc)
+            return False
+        self.policy, self._routes = policy, routes
+        self._index_prices()
+        logger.info("Loaded model routes from %s", self._file)
+        return True
+
+    def _index_prices(self) -> None:
+        self._prices = {
+            spec["model"]: (float(spec.get("input_per_1k", 0)), float(spec.get("output_per_1k", 0)))
+            for spec in self.policy["tiers"].values()
+        }
+
+    def route(self, node: str) -> Route:
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self._reload_interval
+            self.reload()
+        return self._routes.get(node) or self._routes[""]
+
+    def model_name(self, node: str, tier: Optional[str] = None) -> str:
+        return self.policy["tiers"][tier or self.route(node).tier]["model"]
+
+    def model(self, node: str, tier: Optional[str] = None):
+        """Client for `node`'s tier (its primary tier unless given)"""
+        route = self.route(node)
+        return self.registry.get(self.model_name(node, tier), route.temperature)
+
+    def warm_up(self) -> None:
+        """Build every client the policy routes to"""
+        for node in self.policy["nodes"]:
+            for tier in self.route(node).tiers():
+                self.model(node, tier)
+
+    # Calls
+
+    async def complete(
+        self,
+        node: str,
+        messages: List["BaseMessage"],
+        parse: Callable[[str], T],
+        confident: Optional[Callable[[T], bool]] = None,
+    ) -> T:
+        """Parsed answer for `node`, escalating on a parse error (ValueError) or an unconfident answer"""
+        route = self.route(node)
+        stats = self._stats(node)
+        stats.calls += 1
+        tiers = route.tiers()
+        prompt_chars = sum(len(m.content) for m in messages if isinstance(m.content, str))
+        start = time.perf_counter()
+        try:
+            for i, tier in enumerate(tiers):
+                model = self.model_name(node, tier)
+                llm = self.registry.get(model, route.temperature)
+                call_start = time.perf_counter()
+                with tracing.span("llm", model=model, node=node, tier=tier) as current:
+                    response = await get_scheduler().ainvoke(llm, messages)
+                    metadata = getattr(response, "response_metadata", None)
+                    tracing.record_llm(current, prompt_chars, response.content, metadata)
+                self.record(node, model, time.perf_counter() - call_start, prompt_chars, response.content, metadata)
+
+                escalate = tiers[i + 1] if i + 1 < len(tiers) else None
+                try:
+                    result = parse(response.content)
+                except ValueError:
+                    if escalate is None or not self._fits(route, start, escalate, stats):
+                        raise
+                    self._escalated(node, stats, "invalid")
+                    continue
+                if escalate is None or confident is None or confident(result):
+                    return result
+                if not self._fits(route, start, escalate, stats):
+                    return result
+                self._escalated(node, stats, "low_confidence")
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.latency.observe(elapsed)
+            metrics.histogram("llm_route_seconds", "Routed node LLM time, escalations included", labels={"node": node}).observe(elapsed)
+            if elapsed * 1000 > route.latency_budget_ms:
+                stats.over_budget += 1
+
+    def record(
+        self,
+        node: str,
+        model: str,
+        seconds: float,
+        prompt_chars: int,
+        content: Any,
+        response_metadata: Optional[dict] = None,
+    ) -> None:
+        """Count one provider call made for `node`"""
+        usage = (response_metadata or {}).get("token_usage") or {}
+        completion_chars = len(content) if isinstance(content, str) else 0
+        prompt_tokens = usage.get("prompt_tokens") or -(-prompt_chars // CHARS_PER_TOKEN)
+        completion_tokens = usage.get("completion_tokens") or -(-completion_chars // CHARS_PER_TOKEN)
+        input_price, output_price = self._prices.get(model, (0.0, 0.0))
+        cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+
+        previous = self._expected.get(model)
+        self._expected[model] = seconds if previous is None else previous + EWMA_WEIGHT * (seconds - previous)
+
+        stats = self._stats(node)
+        per_model = stats.models.setdefault(model, {"calls": 0, "seconds": 0.0, "tokens": 0, "cost_usd": 0.0})
+        per_model["calls"] += 1
+        per_model["seconds"] += seconds
+        per_model["tokens"] += prompt_tokens + completion_tokens
+        per_model["cost_usd"] += cost
+        labels = {"node": node, "model": model}
+        metrics.counter("llm_route_calls_total", "Provider calls per node and model", labels).inc()
+        metrics.counter("llm_route_cost_usd_total", "Estimated provider cost per node and model", labels).inc(cost)
+
+    def _fits(self, route: Route, start: float, tier: str, stats: NodeStats) -> bool:
+        """Whether a call on `tier` is expected to finish within the node's budget"""
+        expected = self._expected.get(self.policy["tiers"][tier]["model"])
+        if expected is None or (time.perf_counter() - start + expected) * 1000 <= route.latency_budget_ms:
+            return True
+        stats.budget_skips += 1
+        return False
+
+    def _escalated(self, node: str, stats: NodeStats, reason: str) -> None:
+        stats.escalations[reason] += 1
+        metrics.counter("llm_route_escalations_total", "Node calls repeated on a larger model", {"node": node, "reason": reason}).inc()
+
+    def _stats(self, node: str) -> NodeStats:
+        stats = self._nodes.get(node)
+        if stats is None:
+            stats = self._nodes[node] = NodeStats()
+        return stats
+
+    def stats(self) -> dict:
+        def ms(seconds: Optional[float]) -> Optional[float]:
+            return None if seconds is None else round(seconds * 1000, 1)
+
+        nodes = {}
+        for node, stats in sorted(self._nodes.items()):
+            route = self.route(node)
+            nodes[node] = {
+                "tier": route.tier,
+                "escalate_to": route.escalate_to,
+                "latency_budget_ms": route.latency_budget_ms,
+                "calls": stats.calls,
+                "escalations": dict(stats.escalations),
+                "budget_skips": stats.budget_skips,
+                "over_budget": stats.over_budget,
+                "p50_ms": ms(stats.latency.quantile(0.5)),
+                "p95_ms": ms(stats.latency.quantile(0.95)),
+                "cost_usd": round(sum(m["cost_usd"] for m in stats.models.values()), 6),
+                "models": {
+                    model: {
+                        "calls": m["calls"],
+                        "avg_ms": ms(m["seconds"] / m["calls"]),
+                        "tokens": m["tokens"],
+                        "cost_usd": round(m["cost_usd"], 6),
+                    }
+                    for model, m in stats.models.items()
+                },
+            }
+        return {
+            "routes_file": self._file or None,
+            "policy": self.policy,
+            "expected_ms": {model: ms(seconds) for model, seconds in self._expected.items()},
+            "nodes": nodes,
+        }
+
+
+_router: Optional[ModelRouter] = None
+
+
+def get_router() -> ModelRouter:
+    global _router
+    if _router is None:
+        _router = ModelRouter()
+    return _router
+
+
+def close() -> None:
+    global _router
+    _router = None
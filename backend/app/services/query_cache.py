@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from app.models.analytics import AnalyticsQuery, AnalyticsResult
+from app.services import metrics
+from app.services.analytics import resolve_window, run_query
+from app.services.event_store import EventStore, get_event_store
+from app.services.llm_cache import CacheTier
+
+# Analytics query cache
+#
+# Results are keyed on project plus the normalized query (default day range
+# filled in, fields the kind ignores dropped) and tagged with the watermarks
+# of the days they read: committed rows per day (EventStore.watermarks). A hit
+# is served only while those are unchanged, so an entry goes stale exactly
+# when events land in its range, and results for untouched ranges live until
+# LRU eviction (no TTL). Watermarks are read before the query runs, so a
+# result racing an append is tagged older and recomputed next time.
+#
+# Tiers: an in-process LRU with an entry cap and byte budget, and optionally
+# a shared key-value tier for several workers (QUERY_CACHE_SHARED_URL):
+# redis://... (needs the redis package) or sqlite:///path, a local stand-in
+# with the same get/set/delete calls.
+
+_hits = {
+    tier: metrics.counter("analytics_cache_hits_total", "Analytics queries served from cache", {"tier": tier})
+    for tier in ("local", "shared")
+}
+_misses = metrics.counter("analytics_cache_misses_total", "Analytics queries computed")
+_stale = metrics.counter("analytics_cache_stale_total", "Cached analytics results invalidated by new events")
+
+# Fields each kind reads besides kind/start/end
+_FIELDS = {
+    "counts": ("events", "interval"),
+    "unique_users": ("events",),
+    "conversion": ("events",),
+    "funnel": ("events",),
+    "top_values": ("events", "property", "limit"),
+}
+_ORDERED = ("conversion", "funnel")  # Event order is part of the question
+
+
+def cache_key(project_id: str, query: AnalyticsQuery) -> str:
+    """Stable key of a window-resolved query"""
+    fields = {"kind": query.kind, "start": query.start.isoformat(), "end": query.end.isoformat()}
+    for name in _FIELDS[query.kind]:
+        fields[name] = getattr(query, name)
+    if query.kind not in _ORDERED:
+        fields["events"] = sorted(set(query.events))
+    raw = json.dumps([project_id, fields], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class SQLiteKV:
+    """Local stand-in for a shared Redis: get/set/delete of bytes in one SQLite file"""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)")
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[0]
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        expires = time.time() + ex if ex else None
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)", (key, value, expires))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def connect_shared(url: str):
+    if url.startswith("sqlite:///"):
+        return SQLiteKV(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://")):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("QUERY_CACHE_SHARED_URL is a redis:// URL but the redis package is not installed")
+        return redis.Redis.from_url(url)
+    raise ValueError(f"Unsupported QUERY_CACHE_SHARED_URL '{url}'")
+
+
+class QueryCache:
+    def __init__(
+        self,
+        store: EventStore,
+        max_entries: int = 2000,
+        max_bytes: int = 32 * 1024 * 1024,
+        shared=None,
+        shared_ttl_seconds: int = 86400,
+    ):
+        self.store = store
+        self.local = CacheTier(max_entries, max_bytes, ttl_seconds=None)
+        self.shared = shared
+        self.shared_ttl_seconds = shared_ttl_seconds  # Only to let abandoned keys expire
+        self._lock = threading.Lock()
+        self.hits = {"local": 0, "shared": 0}
+        self.misses = 0
+        self.stale = 0
+
+    def run(self, project_id: str, query: AnalyticsQuery) -> AnalyticsResult:
+        """Cached result if its days are unchanged, else run and cache (blocking)"""
+        query = resolve_window(query)
+        key = cache_key(project_id, query)
+        watermarks = self.store.watermarks(project_id, query.start, query.end)
+
+        with self._lock:
+            entry = self.local.get(key)
+        if entry is not None:
+            if entry[0] == watermarks:
+                return self._hit("local", entry[1])
+            self._invalidate(key, shared=False)  # The shared copy may be newer
+
+        if self.shared is not None:
+            raw = self.shared.get("aq:" + key)
+            if raw is not None:
+                shared = json.loads(raw)
+                if shared["watermarks"] == watermarks:
+                    self._put_local(key, watermarks, shared["result"])
+                    return self._hit("shared", shared["result"])
+                self._invalidate(key, shared=True)
+
+        self.misses += 1
+        _misses.inc()
+        result = run_query(project_id, query, self.store)
+        payload = result.model_dump_json()
+        self._put_local(key, watermarks, payload)
+        if self.shared is not None:
+            value = json.dumps({"watermarks": watermarks, "result": payload})
+            self.shared.set("aq:" + key, value.encode(), ex=self.shared_ttl_seconds)
+        return result
+
+    def _hit(self, tier: str, payload: str) -> AnalyticsResult:
+        self.hits[tier] += 1
+        _hits[tier].inc()
+        return AnalyticsResult.model_validate_json(payload).model_copy(update={"cached": True})
+
+    def _put_local(self, key: str, watermarks: Dict[str, int], payload: str) -> None:
+        size = len(payload) + 24 * len(watermarks) + len(key)
+        with self._lock:
+            self.local.put(key, (watermarks, payload), size)
+
+    def _invalidate(self, key: str, shared: bool) -> None:
+        self.stale += 1
+        _stale.inc()
+        if shared:
+            self.shared.delete("aq:" + key)
+        else:
+            with self._lock:
+                self.local.remove(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size, evictions = len(self.local), self.local.stats()["bytes"], self.local.evictions
+        lookups = sum(self.hits.values()) + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_rate": round(sum(self.hits.values()) / lookups, 4) if lookups else None,
+            "invalidated": self.stale,
+            "evictions": evictions,
+            "shared_tier": self.shared is not None,
+        }
+
+    def close(self) -> None:
+        if self.shared is not None:
+            self.shared.close()
+
+
+_cache: Optional[QueryCache] = None
+
+
+def get_query_cache() -> Optional[QueryCache]:
+    """Process-wide cache built from environment settings; None when disabled"""
+    global _cache
+    if _cache is None:
+        max_entries = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "2000"))
+        if max_entries <= 0:
+            return None
+        shared_url = os.getenv("QUERY_CACHE_SHARED_URL")
+        _cache = QueryCache(
+            get_event_store(),
+            max_entries=max_entries,
+            max_bytes=int(float(os.getenv("QUERY_CACHE_MAX_MB", "32")) * 1024 * 1024),
+            shared=connect_shared(shared_url) if shared_url else None,
+        )
+    return _cache
+
+
+def close() -> None:
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
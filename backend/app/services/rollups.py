@@ -0,0 +1,231 @@
+import bisect
+import json
+import os
+import threading
+from array import array
+from collections import Counter
+from itertools import compress
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Partition rollups
+#
+# Aggregates for one project-day of the event store, updated from the encoded
+# columns of every append so dashboard queries never rescan raw rows:
+#
+#   rollup.json       {"rows", "hourly": {event: [24 counts]},
+#                      "users": {event: distinct users},
+#                      "first": {event: pairs in first/<event>.q},
+#                      "breakdown": {event: {key: {value: count}}}}
+#   first/<event>.q   (user code, ts) pairs: when each user first did the
+#                     event that day (append-only; a user appears again only
+#                     when an out-of-order append brings an earlier time, so
+#                     their last pair is the earliest), what funnels match
+#   index/<event>.I   row numbers per event (append-only), for the funnel
+#                     steps first times can't settle
+#
+# (event, key and value are dictionary codes.) In memory, each event's users
+# are also kept as a bitmap (an int with bit <user code> set), so distinct
+# users over several days and conversion are ORs and ANDs of a few KB each
+# plus a bit count, instead of set unions over every user.
+#
+# rollup.json is written last and
+# "rows" is the number of partition rows it covers: first/index files that ran
+# ahead of it after an interrupted update are trimmed on load, and a rollup
+# behind its partition is caught up from the columns.
+
+HOUR_MS = 3_600_000
+BREAKDOWN_MAX_VALUES = 256  # Distinct values kept per (event, key) per day
+OTHER = -1  # Breakdown bucket for values beyond BREAKDOWN_MAX_VALUES
+
+
+def _read_codes(path: str, limit: int, typecode: str = "I") -> array:
+    codes = array(typecode)
+    if limit and os.path.exists(path):
+        with open(path, "rb") as f:
+            codes.frombytes(f.read(limit * codes.itemsize))
+    return codes
+
+
+def user_bitmap(codes: Iterable[int], bitmap: int = 0) -> int:
+    """`bitmap` with the bit of every code set"""
+    codes = list(codes)
+    if not codes:
+        return bitmap
+    bits = bytearray((max(codes) >> 3) + 1)
+    for code in codes:
+        bits[code >> 3] |= 1 << (code & 7)
+    return bitmap | int.from_bytes(bits, "little")
+
+
+_BIT_FLAGS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def user_codes(bitmap: int) -> List[int]:
+    """Codes of the bits set in `bitmap`, ascending"""
+    flags = bin(bitmap)[:1:-1].encode().translate(_BIT_FLAGS)  # Byte n: bit n
+    return list(compress(range(len(flags)), flags))
+
+
+def _append_codes(path: str, keep: int, codes: array) -> None:
+    with open(path, "ab") as f:
+        if f.tell() > keep * codes.itemsize:
+            f.truncate(keep * codes.itemsize)
+        codes.tofile(f)
+
+
+class PartitionRollup:
+    def __init__(self, path: str, day_start_ms: int):
+        self.path = path
+        self.day_start_ms = day_start_ms
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.hourly: Dict[int, List[int]] = {}
+        self.user_counts: Dict[int, int] = {}
+        self.first_pairs: Dict[int, int] = {}  # event -> pairs in first/<event>.q
+        self.breakdown: Dict[int, Dict[int, Dict[int, int]]] = {}
+        self._first: Dict[int, Dict[int, int]] = {}  # event -> {user: first ts}, loaded on first use
+        self._bitmaps: Dict[int, int] = {}  # event -> user bitmap, built on first read
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(os.path.join(self.path, "rollup.json")) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        self.rows = data["rows"]
+        self.hourly = {int(e): counts for e, counts in data["hourly"].items()}
+        self.user_counts = {int(e): n for e, n in data["users"].items()}
+        self.first_pairs = {int(e): n for e, n in data["first"].items()}
+        self.breakdown = {
+            int(e): {int(k): {int(v): n for v, n in values.items()} for k, values in keys.items()}
+            for e, keys in data["breakdown"].items()
+        }
+
+    def _save(self) -> None:
+        data = {
+            "rows": self.rows, "hourly": self.hourly, "users": self.user_counts,
+            "first": self.first_pairs, "breakdown": self.breakdown,
+        }
+        tmp = os.path.join(self.path, "rollup.json.tmp")
+        with open(tmp, "w") as f:
+            f.write(json.dumps(data, separators=(",", ":")))  # dumps uses the C encoder, dump doesn't
+        os.replace(tmp, os.path.join(self.path, "rollup.json"))
+
+    def _first_of(self, event: int) -> Dict[int, int]:
+        first = self._first.get(event)
+        if first is None:
+            path = os.path.join(self.path, "first", f"{event}.q")
+            pairs = _read_codes(path, 2 * self.first_pairs.get(event, 0), "q")
+            first = self._first[event] = dict(zip(pairs[::2], pairs[1::2]))  # Later pairs win
+        return first
+
+    # Updates
+
+    def update(self, first_row: int, ts: array, events: array, users: array, props: Dict[int, array]) -> None:
+        """Fold rows first_row.. (already committed to the partition) into the rollup"""
+        with self.lock:
+            if first_row != self.rows:
+                raise ValueError(f"Rollup covers {self.rows} rows, update starts at {first_row}")
+            os.makedirs(os.path.join(self.path, "first"), exist_ok=True)
+            os.makedirs(os.path.join(self.path, "index"), exist_ok=True)
+
+            start = self.day_start_ms
+            hours = [(t - start) // HOUR_MS for t in ts]
+            for (event, hour), count in Counter(zip(events, hours)).items():
+                hourly = self.hourly.get(event)
+                if hourly is None:
+                    hourly = self.hourly[event] = [0] * 24
+                hourly[hour] += count
+
+            index: Dict[int, array] = {}
+            for row, event in enumerate(events, first_row):
+                rows = index.get(event)
+                if rows is None:
+                    rows = index[event] = array("I")
+                rows.append(row)
+
+            # Newest first, so each (event, user)'s earliest time in the batch is written last
+            batch_ts, batch_events, batch_users = zip(*sorted(zip(ts, events, users), reverse=True))
+            new_first: Dict[int, array] = {}
+            new_users: Dict[int, array] = {}
+            for (event, user), t in dict(zip(zip(batch_events, batch_users), batch_ts)).items():
+                if user:
+                    first = self._first_of(event)
+                    previous = first.get(user)
+                    if previous is None or t < previous:
+                        first[user] = t
+                        new_first.setdefault(event, array("q")).extend((user, t))
+                        if previous is None:
+                            new_users.setdefault(event, array("I")).append(user)
+            for event, added in new_users.items():
+                if event in self._bitmaps:
+                    self._bitmaps[event] = user_bitmap(added, self._bitmaps[event])
+
+            for key, column in props.items():
+                tables: Dict[int, Dict[int, int]] = {}
+                for (event, value), count in Counter(zip(events, column)).items():
+                    if not value:
+                        continue
+                    values = tables.get(event)
+                    if values is None:
+                        values = tables[event] = self.breakdown.setdefault(event, {}).setdefault(key, {})
+                    if value in values:
+                        values[value] += count
+                    elif len(values) < BREAKDOWN_MAX_VALUES:
+                        values[value] = count
+                    else:
+                        values[OTHER] = values.get(OTHER, 0) + count
+
+            for event, rows in index.items():
+                previous = sum(self.hourly[event]) - len(rows)
+                _append_codes(os.path.join(self.path, "index", f"{event}.I"), previous, rows)
+            for event, pairs in new_first.items():
+                _append_codes(os.path.join(self.path, "first", f"{event}.q"), 2 * self.first_pairs.get(event, 0), pairs)
+                self.first_pairs[event] = self.first_pairs.get(event, 0) + len(pairs) // 2
+            for event, added in new_users.items():
+                self.user_counts[event] = self.user_counts.get(event, 0) + len(added)
+
+            self.rows += len(events)
+            self._save()
+
+    # Reads
+
+    def event_counts(self, events: Optional[Iterable[int]] = None) -> Dict[int, List[int]]:
+        """Hourly counts per event code"""
+        with self.lock:
+            if events is None:
+                return {e: list(h) for e, h in self.hourly.items()}
+            return {e: list(self.hourly[e]) for e in events if e in self.hourly}
+
+    def users(self, event: int) -> int:
+        """Bitmap of the event's distinct users (bit n: user code n)"""
+        with self.lock:
+            bitmap = self._bitmaps.get(event)
+            if bitmap is None:
+                bitmap = self._bitmaps[event] = user_bitmap(self._first_of(event))
+            return bitmap
+
+    def first_times(self, event: int) -> Dict[int, int]:
+        """When each user (code) first did the event that day (live: appends only add users or lower times)"""
+        with self.lock:
+            return self._first_of(event)
+
+    def values(self, event: int, key: int) -> Dict[int, int]:
+        with self.lock:
+            return dict(self.breakdown.get(event, {}).get(key, {}))
+
+    def rows_of(self, event: int, limit: int) -> array:
+        """Row numbers of an event below `limit` (a partition snapshot's row count)"""
+        with self.lock:
+            rows = _read_codes(os.path.join(self.path, "index", f"{event}.I"), sum(self.hourly.get(event, ())))
+        return rows[:bisect.bisect_left(rows, limit)]
+
+
+def day_totals(rollups: Iterable[PartitionRollup], events: Iterable[int]) -> List[Tuple[int, int]]:
+    """(event code, total) over several partitions"""
+    totals: Counter = Counter()
+    for rollup in rollups:
+        for event, hourly in rollup.event_counts(events).items():
+            totals[event] += sum(hourly)
+    return list(totals.items())
@@ -0,0 +1,309 @@
+import hashlib
+import re
+from typing import Dict, List, Optional, Tuple
+
+from app.models.taxonomy import Taxonomy
+
+# Filter & transform engine
+#
+# Applies an approved taxonomy to raw tracking events
+# ({"event", "distinct_id", "timestamp", "properties"}): event names are
+# mapped onto canonical events, properties renamed (explicit rules, then
+# snake_case), PII properties dropped and PII values redacted, noise events
+# suppressed, and events missing required properties rejected.
+#
+# PII rules reach every field, not only top-level properties: nested objects
+# and lists (in properties, or fields like "context") lose PII keys and have
+# PII values redacted at any depth, and PII inside an identity field
+# (distinct_id) becomes a stable pseudonym, so users stay distinct. When two
+# property keys map to the same output name (productId and product_id) the
+# first one wins and the collision is counted.
+#
+# The taxonomy is compiled once into: a lookup from normalized name to
+# canonical event, one combined regex per rule kind, and per-input plans.
+# An event name is resolved (canonical name, noise, required properties) once
+# and the decision reused for every event with that name; likewise a property
+# key is resolved once to its output name (or None when it is PII). Processing
+# a batch is then one dict build per event, with no per-rule loop.
+
+# Batches of one engine may be processed on several threads at once: a full
+# plan cache is replaced, not cleared, so a batch keeps the cache it started with
+MAX_PLANS = 10_000  # Cached name/key plans before the caches are reset
+MAX_DEPTH = 32  # Nesting levels scrubbed before an event is rejected
+IDENTITY_FIELDS = ("distinct_id",)  # PII in these is pseudonymized, not masked
+
+# What happens to an event's fields other than properties (see _plan_field)
+_DROP, _COPY, _IDENTITY, _SCRUB = range(4)
+
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def snake_case(name: str) -> str:
+    """productId / Add to Cart / add-to-cart -> product_id / add_to_cart; keeps a leading $"""
+    prefix = "$" if name.startswith("$") else ""
+    name = _CAMEL_RE.sub("_", name.strip().lstrip("$")).lower()
+    return prefix + _NON_WORD_RE.sub("_", name).strip("_")
+
+
+def _combine(patterns: List[str]) -> Optional[re.Pattern]:
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{p})" for p in patterns))
+
+
+class EventPlan:
+    __slots__ = ("name", "reason", "conditions", "required")
+
+    def __init__(self, name: Optional[str], reason: Optional[str] = None, conditions=(), required=()):
+        self.name = name  # Output event name; None when the event is dropped
+        self.reason = reason  # Why it is dropped
+        self.conditions = conditions  # ((property, value), ...) that make it noise
+        self.required = required  # Required properties (output names)
+
+
+class TooDeep(Exception):
+    """A value nested more than MAX_DEPTH levels"""
+
+
+class BatchResult:
+    __slots__ = ("events", "dropped", "invalid", "redacted", "collisions")
+
+    def __init__(self):
+        self.events: List[dict] = []
+        self.dropped: Dict[str, int] = {}  # reason -> count
+        self.invalid: List[Tuple[int, str]] = []  # (index in the batch, error) of rejected events
+        self.redacted = 0  # PII values redacted
+        self.collisions = 0  # Property keys dropped because an earlier key had the same output name
+
+    def drop(self, reason: str) -> None:
+        self.dropped[reason] = self.dropped.get(reason, 0) + 1
+
+    def to_dict(self) -> dict:
+        return {
+            "accepted": len(self.events),
+            "dropped": dict(self.dropped),
+            "invalid": [{"index": i, "error": error} for i, error in self.invalid],
+            "redacted": self.redacted,
+            "collisions": self.collisions,
+        }
+
+
+class RuleEngine:
+    """A taxonomy compiled for batch processing"""
+
+    def __init__(self, taxonomy: Taxonomy):
+        self.taxonomy_id = taxonomy.id
+        self.drop_unknown = taxonomy.drop_unknown_events
+        self.snake_case_properties = taxonomy.snake_case_properties
+
+        self._renames = {r.source: r.target for r in taxonomy.normalization_rules}
+        self._canonical = {}
+        for event in taxonomy.canonical_events:
+            required = tuple(self._property_name(p) for p in event.required_properties)
+            for name in (event.name, *event.aliases):
+                self._canonical[snake_case(name)] = (event.name, required)
+
+        self._noise = _combine([r.event_pattern for r in taxonomy.noise_rules if r.property is None])
+        self._conditional_noise = [
+            (re.compile(r.event_pattern), r.property, r.equals)
+            for r in taxonomy.noise_rules if r.property is not None
+        ]
+
+        self._pii_properties = _combine([r.property_pattern for r in taxonomy.pii_rules if r.property_pattern])
+        value_rules = [r for r in taxonomy.pii_rules if r.value_pattern]
+        self._pii_values = None
+        if value_rules:
+            self._pii_values = re.compile("|".join(f"(?P<pii{i}>{r.value_pattern})" for i, r in enumerate(value_rules)))
+            self._pii_labels = {f"pii{i}": f"[redacted:{r.name}]" for i, r in enumerate(value_rules)}
+
+        self._event_plans: Dict[Optional[str], EventPlan] = {}
+        self._key_plans: Dict[str, Optional[str]] = {}
+        self._pii_keys: Dict[str, bool] = {}  # Nested keys: is it PII
+        self._field_plans: Dict[str, int] = {}  # Event fields: _DROP, _COPY, ...
+
+    # Compilation of per-name / per-shape plans
+
+    def _property_name(self, key: str) -> str:
+        key = self._renames.get(key, key)
+        return snake_case(key) if self.snake_case_properties else key
+
+    def _plan_event(self, name: Optional[str]) -> EventPlan:
+        if not name:
+            return EventPlan(None, "missing_event_name")
+        if self._noise is not None and self._noise.search(name):
+            return EventPlan(None, "noise")
+
+        conditions = tuple((prop, equals) for pattern, prop, equals in self._conditional_noise if pattern.search(name))
+        key = snake_case(name)
+        if key in self._canonical:
+            canonical, required = self._canonical[key]
+            return EventPlan(canonical, conditions=conditions, required=required)
+        if self.drop_unknown:
+            return EventPlan(None, "unknown_event")
+        return EventPlan(key or name, conditions=conditions)
+
+    def _plan_key(self, key) -> Optional[str]:
+        if not isinstance(key, str) or (self._pii_properties is not None and self._pii_properties.search(key)):
+            return None
+        return self._property_name(key)
+
+    def _plan_field(self, key) -> int:
+        if key == "properties" or self._is_pii_key(key):
+            return _DROP
+        if key in IDENTITY_FIELDS:
+            return _IDENTITY
+        if key in ("event", "timestamp") or self._pii_properties is None and self._pii_values is None:
+            return _COPY
+        return _SCRUB
+
+    def _redact(self, match: re.Match) -> str:
+        return self._pii_labels[match.lastgroup]
+
+    def _pseudonymize(self, match: re.Match) -> str:
+        digest = hashlib.sha256(match.group().encode()).hexdigest()[:12]
+        return f"{self._pii_labels[match.lastgroup][:-1]}:{digest}]"
+
+    def _is_pii_key(self, key) -> bool:
+        pii = self._pii_keys.get(key)
+        if pii is None:
+            if len(self._pii_keys) > MAX_PLANS:
+                self._pii_keys = {}
+            pii = self._pii_keys[key] = (
+                isinstance(key, str) and self._pii_properties is not None and bool(self._pii_properties.search(key))
+            )
+        return pii
+
+    def _scrub(self, value, result: BatchResult, depth: int = 0):
+        """Copy of a nested value without PII keys and with PII values redacted"""
+        kind = type(value)
+        if kind is str:
+            if self._pii_values is not None and self._pii_values.search(value):
+                value, count = self._pii_values.subn(self._redact, value)
+                result.redacted += count
+            return value
+        if kind is not dict and kind is not list:
+            return value
+        if depth >= MAX_DEPTH:
+            raise TooDeep()
+        if kind is list:
+            return [self._scrub(item, result, depth + 1) for item in value]
+        return {k: self._scrub(v, result, depth + 1) for k, v in value.items() if not self._is_pii_key(k)}
+
+    def _scrub_fields(self, event: dict, result: BatchResult) -> dict:
+        """The event's fields other than properties, scrubbed like properties"""
+        plans = self._field_plans
+        if not event.keys() <= plans.keys():
+            if len(plans) > MAX_PLANS:
+                plans = self._field_plans = {}
+            for key in event.keys() - plans.keys():
+                plans[key] = self._plan_field(key)
+
+        fields = {}
+        for key, value in event.items():
+            plan = plans[key]
+            if plan == _COPY:
+                fields[key] = value
+            elif plan == _SCRUB:
+                fields[key] = self._scrub(value, result, 1)
+            elif plan == _IDENTITY:
+                if type(value) is str and self._pii_values is not None and self._pii_values.search(value):
+                    value, count = self._pii_values.subn(self._pseudonymize, value)
+                    result.redacted += count
+                fields[key] = value
+        return fields
+
+    def _merge_properties(self, properties: dict, keys: Dict[str, Optional[str]], result: BatchResult) -> dict:
+        """Renamed properties when two keys map to one name: the first wins"""
+        cleaned = {}
+        for key, value in properties.items():
+            target = keys[key]
+            if target is None:
+                continue
+            if target in cleaned:
+                result.collisions += 1
+            else:
+                cleaned[target] = value
+        return cleaned
+
+    # Batch processing
+
+    def process(self, events: List[dict]) -> BatchResult:
+        result = BatchResult()
+        plans = self._event_plans
+        keys = self._key_plans
+        if len(plans) > MAX_PLANS:
+            plans = self._event_plans = {}
+        if len(keys) > MAX_PLANS:
+            keys = self._key_plans = {}
+
+        # Distinct names in the batch are resolved once
+        names = [e.get("event") if isinstance(e.get("event"), str) else None for e in events]
+        for name in set(names):
+            if name not in plans:
+                plans[name] = self._plan_event(name)
+
+        pii_values = self._pii_values
+        output = result.events
+        for index, event in enumerate(events):
+            plan = plans[names[index]]
+            if plan.name is None:
+                result.drop(plan.reason)
+                continue
+
+            properties = event.get("properties") or {}
+            if type(properties) is not dict:
+                result.drop("invalid_properties")
+                result.invalid.append((index, "properties must be an object"))
+                continue
+            if plan.conditions and any(str(properties.get(p)) == v for p, v in plan.conditions):
+                result.drop("noise")
+                continue
+
+            if not properties.keys() <= keys.keys():
+                for key in properties.keys() - keys.keys():
+                    keys[key] = self._plan_key(key)
+            cleaned = {target: value for key, value in properties.items() if (target := keys[key])}
+            if len(cleaned) < len(properties) and len(cleaned) < sum(1 for key in properties if keys[key]):
+                cleaned = self._merge_properties(properties, keys, result)
+
+            try:
+                for key, value in cleaned.items():
+                    kind = type(value)
+                    if kind is str:
+                        if pii_values is not None and pii_values.search(value):
+                            cleaned[key], count = pii_values.subn(self._redact, value)
+                            result.redacted += count
+                    elif kind is dict or kind is list:
+                        cleaned[key] = self._scrub(value, result, 1)
+                fields = self._scrub_fields(event, result)
+            except TooDeep:
+                result.drop("invalid_properties")
+                result.invalid.append((index, f"values nested more than {MAX_DEPTH} levels"))
+                continue
+
+            if plan.required:
+                missing = [p for p in plan.required if p not in cleaned]
+                if missing:
+                    result.drop("missing_required")
+                    result.invalid.append((index, f"{plan.name}: missing {', '.join(missing)}"))
+                    continue
+
+            fields["event"] = plan.name
+            fields["properties"] = cleaned
+            output.append(fields)
+        return result
+
+
+_engines: Dict[str, RuleEngine] = {}
+
+
+def get_engine(taxonomy: Taxonomy) -> RuleEngine:
+    """Compiled engine for a taxonomy, reused while its rules don't change"""
+    key = hashlib.sha256(taxonomy.model_dump_json(exclude={"approved"}).encode()).hexdigest()
+    engine = _engines.get(key)
+    if engine is None:
+        if len(_engines) >= 256:
+            _engines.clear()
+        engine = _engines[key] = RuleEngine(taxonomy)
+    return engine
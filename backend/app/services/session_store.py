@@ -0,0 +1,314 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Session state storage
+#
+# Two tiers behind one interface:
+# - MemoryTier: per-process LRU with TTL and an approximate byte budget.
+#   Active sessions are always served from here.
+# - SQLiteTier: persistent copy, written behind in batches by a background
+#   task and read only to rehydrate a session that was evicted or that this
+#   process has never seen (restart, another worker).
+#
+# Workers share the SQLite file but not their memory tiers, so a session
+# should stick to one worker while it is active.
+
+
+class SessionStateStore:
+    """Interface for conversation state storage"""
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def put(self, session_id: str, state: dict) -> None:
+        raise NotImplementedError
+
+    async def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    async def flush(self) -> None:
+        """Persist any buffered writes"""
+
+    def stats(self) -> dict:
+        return {}
+
+
+def _encode(state: dict) -> str:
+    return json.dumps(state, default=str)
+
+
+class MemoryTier(SessionStateStore):
+    """In-process LRU cache with TTL and memory limits"""
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: Optional[float] = 1800,
+    ):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # session_id -> (state, approx size in bytes, last access)
+        self._entries: "OrderedDict[str, Tuple[dict, int, float]]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        return self.get_nowait(session_id)
+
+    async def put(self, session_id: str, state: dict) -> None:
+        self.put_nowait(session_id, state)
+
+    async def delete(self, session_id: str) -> None:
+        self._remove(session_id)
+
+    def get_nowait(self, session_id: str) -> Optional[dict]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        state, size, last_access = entry
+        if self.ttl_seconds is not None and time.monotonic() - last_access > self.ttl_seconds:
+            self.expirations += 1
+            self.misses += 1
+            self._remove(session_id)
+            return None
+
+        self.hits += 1
+        self._entries[session_id] = (state, size, time.monotonic())
+        self._entries.move_to_end(session_id)
+        return state
+
+    def put_nowait(self, session_id: str, state: dict, size: Optional[int] = None) -> None:
+        if size is None:
+            size = len(_encode(state))
+
+        self._remove(session_id)
+        self._entries[session_id] = (state, size, time.monotonic())
+        self._bytes += size
+        self._enforce_limits()
+
+    def expire_idle(self) -> int:
+        """Evict sessions idle for longer than the TTL"""
+        if self.ttl_seconds is None:
+            return 0
+
+        cutoff = time.monotonic() - self.ttl_seconds
+        idle = [sid for sid, (_, _, last_access) in self._entries.items() if last_access < cutoff]
+        for session_id in idle:
+            self.expirations += 1
+            self._remove(session_id)
+        return len(idle)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _enforce_limits(self) -> None:
+        while self._entries and (len(self._entries) > self.max_sessions or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self.evictions += 1
+            self._remove(oldest)
+
+    def _remove(self, session_id: str) -> Optional[Tuple[dict, int, float]]:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        return entry
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteTier(SessionStateStore):
+    """Persistent session state in a local SQLite file"""
+
+    def __init__(self, path: str = "session_state.db"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS session_state (
+                session_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+        self.reads = 0
+        self.writes = 0
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.read, session_id)
+
+    async def put(self, session_id: str, state: dict) -> None:
+        await asyncio.to_thread(self.write_many, [(session_id, _encode(state))])
+
+    async def delete(self, session_id: str) -> None:
+        await asyncio.to_thread(self._delete, session_id)
+
+    def read(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            self.reads += 1
+            row = self._conn.execute(
+                "SELECT state FROM session_state WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write_many(self, rows: List[Tuple[str, str]]) -> None:
+        """Upsert (session_id, encoded state) rows in one transaction"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                """INSERT INTO session_state (session_id, state, updated_at) VALUES (?, ?, ?)
+                   ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at""",
+                [(sid, encoded, now) for sid, encoded in rows],
+            )
+            self._conn.commit()
+            self.writes += len(rows)
+
+    def _delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        return {"reads": self.reads, "writes": self.writes}
+
+
+class TieredSessionStore(SessionStateStore):
+    """Memory tier in front of a write-behind persistent tier"""
+
+    def __init__(self, memory: MemoryTier, persistent: SQLiteTier, flush_interval: float = 1.0):
+        self.memory = memory
+        self.persistent = persistent
+        self.flush_interval = flush_interval
+
+        # Encoded snapshots of sessions changed since the last flush. Evicted
+        # but unflushed sessions are served from here, not the database.
+        self._dirty: Dict[str, str] = {}
+        self._flushing: Dict[str, str] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+        self.rehydrations = 0
+        self.flushes = 0
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        state = self.memory.get_nowait(session_id)
+        if state is not None:
+            return state
+
+        encoded = self._dirty.get(session_id) or self._flushing.get(session_id)
+        if encoded is not None:
+            state = json.loads(encoded)
+        else:
+            state = await self.persistent.get(session_id)
+            if state is None:
+                return None
+            self.rehydrations += 1
+
+        self.memory.put_nowait(session_id, state)
+        return state
+
+    async def put(self, session_id: str, state: dict) -> None:
+        encoded = _encode(state)
+        self.memory.put_nowait(session_id, state, size=len(encoded))
+        self._dirty[session_id] = encoded
+        self._ensure_flusher()
+
+    async def delete(self, session_id: str) -> None:
+        self._dirty.pop(session_id, None)
+        await self.memory.delete(session_id)
+        await self.persistent.delete(session_id)
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            self._flushing, self._dirty = self._dirty, {}
+            try:
+                await asyncio.to_thread(self.persistent.write_many, list(self._flushing.items()))
+            except Exception:
+                # Keep the snapshots for the next attempt unless a newer one arrived
+                for session_id, encoded in self._flushing.items():
+                    self._dirty.setdefault(session_id, encoded)
+                raise
+            finally:
+                self._flushing = {}
+            self.flushes += 1
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    def _ensure_flusher(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.memory.expire_idle()
+            try:
+                await self.flush()
+            except sqlite3.Error:
+                # Retried on the next tick; the snapshots are still buffered
+                continue
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "persistent": self.persistent.stats(),
+            "dirty": len(self._dirty),
+            "rehydrations": self.rehydrations,
+            "flushes": self.flushes,
+        }
+
+
+def create_session_store() -> SessionStateStore:
+    """Build the session store from environment settings"""
+    memory = MemoryTier(
+        max_sessions=int(os.getenv("SESSION_CACHE_MAX_SESSIONS", "1000")),
+        max_bytes=int(float(os.getenv("SESSION_CACHE_MAX_MB", "64")) * 1024 * 1024),
+        ttl_seconds=float(os.getenv("SESSION_CACHE_TTL_SECONDS", "1800")),
+    )
+
+    db_path = os.getenv("SESSION_STATE_DB", "session_state.db")
+    if not db_path:
+        # Memory only (tests, notebooks)
+        return memory
+
+    return TieredSessionStore(
+        memory,
+        SQLiteTier(db_path),
+        flush_interval=float(os.getenv("SESSION_FLUSH_INTERVAL_SECONDS", "1.0")),
+    )
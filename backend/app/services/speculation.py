@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Speculative next replies
+#
+# Right after a turn is stored, the graph's predictor runs in the background
+# on the new state and guesses the reply the next turn will end with. It only
+# answers when the user's answer can't change that reply (the next node asks a
+# fixed question; the extraction before it just fills in state), else None.
+#
+# The next turn takes the prediction if the session is still where it was
+# (same stored message count and step; anything else that moved the session
+# invalidates it), replies with it at once and finishes the real turn behind
+# the reply (defer). The following turn first waits for that to be stored
+# (settle). The deferred turn's own reply is compared with the prediction;
+# a mismatch is logged and counted.
+#
+# Every turn is counted once: hit (answered from a prediction), stale
+# (prediction invalidated), unpredictable (the answer decides the reply) or
+# none (nothing prepared, e.g. first turn after a restart).
+#
+# Sessions that stop mid-setup never take their prediction, so predictions
+# are kept for at most SPECULATION_TTL_SECONDS (an expired one counts as
+# stale) and for the SPECULATION_MAX_SESSIONS most recent sessions.
+
+ENABLED = os.getenv("SPECULATION_ENABLED", "1").lower() not in ("0", "false", "no")
+MAX_SESSIONS = int(os.getenv("SPECULATION_MAX_SESSIONS", "10000"))
+TTL_SECONDS = float(os.getenv("SPECULATION_TTL_SECONDS", "900"))
+
+OUTCOMES = ("hit", "stale", "unpredictable", "none")
+_turns = {
+    outcome: metrics.counter("speculation_turns_total", "Chat turns by speculation outcome", {"outcome": outcome})
+    for outcome in OUTCOMES
+}
+_mismatches = metrics.counter("speculation_mismatches_total", "Speculated replies that differed from the real turn")
+_evictions = metrics.counter("speculation_evictions_total", "Predictions dropped unused (expired or over the limit)")
+
+
+class Speculation:
+    __slots__ = ("version", "step", "prediction", "expires")
+
+    def __init__(self, version: int, step: Optional[str], prediction: Optional[dict], expires: float):
+        self.version = version
+        self.step = step
+        self.prediction = prediction
+        self.expires = expires
+
+
+class Speculator:
+    def __init__(self, enabled: bool = ENABLED, max_sessions: int = MAX_SESSIONS, ttl: float = TTL_SECONDS):
+        self.enabled = enabled
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        # Oldest first; with one TTL for all, also soonest to expire first
+        self._speculations: "OrderedDict[str, Speculation]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.counts = {outcome: 0 for outcome in OUTCOMES}
+        self.mismatches = 0
+        self.evicted = 0
+
+    def prepare(self, key: str, version: int, step: Optional[str], predict: Callable[[], Optional[dict]]) -> None:
+        """Run `predict` after the current request returns; its result serves the next turn at (`version`, `step`)"""
+        if not self.enabled:
+            return
+
+        def run():
+            try:
+                prediction = predict()
+            except Exception:
+                logger.exception("Speculation for %s failed", key)
+                prediction = None
+            self._store(key, Speculation(version, step, prediction, time.monotonic() + self.ttl))
+
+        asyncio.get_running_loop().call_soon(run)
+
+    def _store(self, key: str, speculation: Speculation) -> None:
+        speculations = self._speculations
+        speculations.pop(key, None)
+        speculations[key] = speculation
+        now = time.monotonic()
+        while speculations and (
+            len(speculations) > self.max_sessions or next(iter(speculations.values())).expires <= now
+        ):
+            speculations.popitem(last=False)
+            self.evicted += 1
+            _evictions.inc()
+
+    def take(self, key: str, version: int, step: Optional[str]) -> Optional[dict]:
+        """Prediction for this turn, if still valid; counts the turn's outcome"""
+        speculation = self._speculations.pop(key, None)
+        if speculation is None:
+            outcome = "none"
+        elif speculation.version != version or speculation.step != step or speculation.expires <= time.monotonic():
+            outcome = "stale"
+        elif speculation.prediction is None:
+            outcome = "unpredictable"
+        else:
+            outcome = "hit"
+        self.counts[outcome] += 1
+        _turns[outcome].inc()
+        return speculation.prediction if outcome == "hit" else None
+
+    def confirm(self, key: str, predicted: str, actual: str) -> None:
+        if predicted != actual:
+            self.mismatches += 1
+            _mismatches.inc()
+            logger.warning("Speculated reply for %s differed from the turn's own reply", key)
+
+    def defer(self, key: str, finish: Awaitable) -> None:
+        """Finish a turn after its (speculated) reply went out"""
+        task = asyncio.ensure_future(finish)
+        self._pending[key] = task
+
+        def done(_):
+            if self._pending.get(key) is task:
+                del self._pending[key]
+            if not task.cancelled() and task.exception() is not None:
+                logger.error("Deferred turn for %s failed", key, exc_info=task.exception())
+
+        task.add_done_callback(done)
+
+    async def settle(self, key: str) -> None:
+        """Wait for the deferred end of this session's previous turn, if any"""
+        task = self._pending.get(key)
+        if task is not None:
+            await asyncio.wait([task])
+
+    def stats(self) -> dict:
+        turns = sum(self.counts.values())
+        return {
+            "enabled": self.enabled,
+            "turns": dict(self.counts),
+            "hit_rate": round(self.counts["hit"] / turns, 4) if turns else None,
+            "mismatches": self.mismatches,
+            "prepared": len(self._speculations),
+            "evicted": self.evicted,
+            "deferred_in_flight": len(self._pending),
+        }
+
+    async def close(self) -> None:
+        """Store deferred turns before shutdown"""
+        if self._pending:
+            await asyncio.wait(list(self._pending.values()))
+        self._speculations.clear()
+
+
+_speculator: Optional[Speculator] = None
+
+
+def get_speculator() -> Speculator:
+    global _speculator
+    if _speculator is None:
+        _speculator = Speculator()
+    return _speculator
+
+
+async def close() -> None:
+    global _speculator
+    if _speculator is not None:
+        await _speculator.close()
+        _speculator = None
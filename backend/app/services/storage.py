@@ -1,16 +1,101 @@
-from supabase import create_client, Client
-from app.models.session import SetupSession, SessionStatus
+from app.models.element import IndexedElement
+from app.models.session import SetupSession, SessionStatus, Message
+from app.services.storage_backends import (
+    StorageBackend,
+    SupabaseBackend,
+    MemoryBackend,
+    SQLiteBackend,
+)
+from app.services import tracing
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, List, Optional, Tuple
+import asyncio
 import os
 import uuid
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_KEY")
-)
+# Storage backend, created on first use so importing this module (and the
+# routers that use it) needs no credentials or network
+_backend: Optional[StorageBackend] = None
+
+def create_backend() -> StorageBackend:
+    """Build the backend selected by STORAGE_BACKEND (supabase, sqlite, memory)"""
+    kind = os.getenv("STORAGE_BACKEND", "supabase")
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(os.getenv("STORAGE_SQLITE_PATH", "storage.db"))
+    if kind == "supabase":
+        url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+        if not url or not key:
+            raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set (or choose another STORAGE_BACKEND)")
+        return SupabaseBackend(
+            url,
+            key,
+            max_connections=int(os.getenv("STORAGE_MAX_CONNECTIONS", "20")),
+            max_concurrency=int(os.getenv("STORAGE_MAX_CONCURRENCY", "50")),
+            timeout=float(os.getenv("STORAGE_TIMEOUT_SECONDS", "10")),
+            max_retries=int(os.getenv("STORAGE_MAX_RETRIES", "3")),
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND '{kind}'")
+
+def get_backend() -> StorageBackend:
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+def set_backend(backend: Optional[StorageBackend]) -> None:
+    """Swap the backend (tests, benchmarks). None resets to the env default."""
+    global _backend
+    _backend = backend
+
+def stats() -> dict:
+    """Per-operation call counts and timings of the active backend"""
+    return _backend.stats() if _backend is not None else {}
+
+async def close() -> None:
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
+
+# Session header columns in `setup_sessions`; messages live in the
+# append-only `conversation_messages` table and labeled elements in
+# `session_elements` (see migrations/)
+HEADER_FIELDS = [
+    "project_id",
+    "status",
+    "product_description",
+    "domain",
+    "key_actions",
+    "user_segments",
+    "business_goals",
+    "current_step",
+    "taxonomy",
+    "message_count",
+    "created_at",
+    "updated_at",
+]
 
+def _header(session: SetupSession) -> dict:
+    """Session header as stored in `setup_sessions`"""
+    return session.model_dump(mode="json", include=set(HEADER_FIELDS))
+
+def _message_row(message: Message) -> dict:
+    return {
+        "role": message.role,
+        "content": message.content,
+        "created_at": message.timestamp.isoformat(),
+    }
+
+def _to_message(row: dict) -> Message:
+    return Message(role=row["role"], content=row["content"], timestamp=row["created_at"])
+
+def _mark_persisted(session: SetupSession, header: dict) -> None:
+    session._persisted_header = header
+    session._persisted_messages = len(session.messages)
+
+@tracing.traced("storage.create_session")
 async def create_session(project_id: Optional[str] = None) -> SetupSession:
     """Create a new setup session"""
     session = SetupSession(
@@ -20,24 +105,97 @@ async def create_session(project_id: Optional[str] = None) -> SetupSession:
         created_at=datetime.utcnow(),
         updated_at=datetime.utcnow()
     )
-    
-    # Store in Supabase
-    supabase.table("setup_sessions").insert(session.dict()).execute()
-    
+
+    # Store header row
+    header = _header(session)
+    await get_backend().insert_session({"id": session.id, **header})
+    _mark_persisted(session, header)
+
     return session
 
-async def get_session(session_id: str) -> Optional[SetupSession]:
-    """Get session by ID"""
-    result = supabase.table("setup_sessions").select("*").eq("id", session_id).execute()
-    
-    if result.data:
-        return SetupSession(**result.data[0])
-    return None
+@tracing.traced("storage.get_session")
+async def get_session(
+    session_id: str, message_limit: Optional[int] = None, elements: bool = False
+) -> Optional[SetupSession]:
+    """Get session by ID with its latest `message_limit` messages (all if None)
+
+    Labeled elements are loaded only with `elements`; chat turns don't need them.
+    """
+    row = await get_backend().fetch_session(session_id)
+    if row is None:
+        return None
 
+    session = SetupSession(**{k: v for k, v in row.items() if k in HEADER_FIELDS or k == "id"})
+    if elements:
+        session.messages, session.labeled_elements = await asyncio.gather(
+            get_messages(session_id, limit=message_limit), get_elements(session_id)
+        )
+    else:
+        session.messages = await get_messages(session_id, limit=message_limit)
+    _mark_persisted(session, _header(session))
+    return session
+
+@tracing.traced("storage.get_messages")
+async def get_messages(
+    session_id: str,
+    before_seq: Optional[int] = None,
+    limit: Optional[int] = 50,
+) -> List[Message]:
+    """One page of history, oldest first, ending just before `before_seq`
+
+    For a loaded session the oldest message in `session.messages` has
+    seq `session.message_count - len(session.messages)`.
+    """
+    rows = await get_backend().fetch_messages(session_id, before_seq, limit)
+    return [_to_message(row) for row in reversed(rows)]
+
+async def iter_messages(session_id: str, page_size: int = 50) -> AsyncIterator[Message]:
+    """Walk the full history newest first, one page per round-trip"""
+    before_seq = None
+    while True:
+        rows = await get_backend().fetch_messages(session_id, before_seq, page_size)
+        for row in rows:
+            yield _to_message(row)
+
+        if len(rows) < page_size:
+            return
+        before_seq = rows[-1]["seq"]
+
+async def get_elements(session_id: str) -> List[IndexedElement]:
+    """The session's labeled elements, in labeling order"""
+    elements, _ = await get_elements_since(session_id, 0)
+    return elements
+
+@tracing.traced("storage.get_elements")
+async def get_elements_since(session_id: str, after_row: int) -> Tuple[List[IndexedElement], int]:
+    """Elements labeled or re-labeled after row `after_row`, and the last row seen"""
+    rows = await get_backend().fetch_elements(session_id, after_row)
+    return [IndexedElement.model_validate(row) for row in rows], max((row["row_id"] for row in rows), default=after_row)
+
+@tracing.traced("storage.add_element")
+async def add_element(session_id: str, element: IndexedElement) -> None:
+    """Store one labeled element (replaces an earlier label with the same id)"""
+    await get_backend().upsert_element(
+        session_id, {**element.model_dump(mode="json"), "created_at": datetime.utcnow().isoformat()}
+    )
+
+@tracing.traced("storage.update_session")
 async def update_session(session: SetupSession) -> SetupSession:
-    """Update session"""
+    """Persist what changed this turn: new messages and modified header fields
+
+    Message seq numbers are allocated by the backend, so concurrent turns on
+    one session each get their own; `message_count` is taken from its answer.
+    """
+    new_messages = session.messages[session._persisted_messages:]
     session.updated_at = datetime.utcnow()
-    
-    supabase.table("setup_sessions").update(session.dict()).eq("id", session.id).execute()
-    
+
+    header = _header(session)
+    changes = {k: v for k, v in header.items() if k != "message_count" and session._persisted_header.get(k) != v}
+    rows = [_message_row(m) for m in new_messages]
+
+    # Header update and message inserts in one round-trip / transaction; the
+    # turn id makes a retried call after a lost response a no-op
+    session.message_count = await get_backend().append_turn(session.id, changes, rows, uuid.uuid4().hex)
+
+    _mark_persisted(session, _header(session))
     return session
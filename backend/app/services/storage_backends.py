@@ -0,0 +1,434 @@
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+# Storage backends
+#
+# storage.py talks to one of these through four calls: insert a session
+# header, fetch a header, fetch a page of messages, and append a turn
+# (changed header fields + new messages). The backend numbers a turn's
+# messages from the session's stored message_count, under the same lock as
+# the insert, so concurrent turns never compete for a seq; each turn carries
+# an id, and a retry of a turn that was already stored appends nothing.
+# Labeled elements are rows of their
+# own (upsert one, fetch those past a row number), so labeling never rewrites
+# the header or the other elements. SupabaseBackend is the production
+# one; MemoryBackend and SQLiteBackend are local stand-ins for tests,
+# benchmarks and offline development.
+
+JSON_COLUMNS = ("key_actions", "user_segments", "business_goals", "taxonomy")
+
+
+class StorageError(Exception):
+    """A storage call failed after all retries"""
+
+
+class CallStats:
+    """Per-operation call counts and timings"""
+
+    def __init__(self):
+        self._ops: Dict[str, dict] = {}
+
+    def record(self, op: str, elapsed_ms: float, retries: int = 0, error: bool = False) -> None:
+        stats = self._ops.setdefault(op, {"calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["calls"] += 1
+        stats["retries"] += retries
+        stats["errors"] += int(error)
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def to_dict(self) -> dict:
+        return {
+            op: {
+                **stats,
+                "total_ms": round(stats["total_ms"], 3),
+                "max_ms": round(stats["max_ms"], 3),
+                "avg_ms": round(stats["total_ms"] / stats["calls"], 3) if stats["calls"] else None,
+            }
+            for op, stats in self._ops.items()
+        }
+
+
+class StorageBackend:
+    """Interface implemented by every storage backend"""
+
+    def __init__(self):
+        self.call_stats = CallStats()
+
+    async def insert_session(self, row: dict) -> None:
+        raise NotImplementedError
+
+    async def fetch_session(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def fetch_messages(self, session_id: str, before_seq: Optional[int], limit: Optional[int]) -> List[dict]:
+        """Message rows newest first"""
+        raise NotImplementedError
+
+    async def append_turn(self, session_id: str, changes: dict, messages: List[dict], turn_id: str) -> int:
+        """Apply header changes and append messages after the stored ones; returns the new message_count"""
+        raise NotImplementedError
+
+    async def fetch_elements(self, session_id: str, after_row: int) -> List[dict]:
+        """Labeled element rows written after `after_row`, oldest first (each with its `row_id`)"""
+        raise NotImplementedError
+
+    async def upsert_element(self, session_id: str, element: dict) -> None:
+        """Store a labeled element; re-labeling an id replaces it under a new row number"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return self.call_stats.to_dict()
+
+
+class SupabaseBackend(StorageBackend):
+    """Async PostgREST client with pooling, bounded concurrency and retries"""
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        max_connections: int = 20,
+        max_concurrency: int = 50,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.2,
+    ):
+        super().__init__()
+        self._client = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+    async def insert_session(self, row: dict) -> None:
+        await self._request(
+            "insert_session", "POST", "/setup_sessions",
+            params={"on_conflict": "id"},
+            json=row,
+            headers={"Prefer": "return=minimal,resolution=ignore-duplicates"},
+        )
+
+    async def fetch_session(self, session_id: str) -> Optional[dict]:
+        response = await self._request(
+            "fetch_session", "GET", "/setup_sessions",
+            params={"id": f"eq.{session_id}", "select": "*"},
+        )
+        rows = response.json()
+        return rows[0] if rows else None
+
+    async def fetch_messages(self, session_id: str, before_seq: Optional[int], limit: Optional[int]) -> List[dict]:
+        params = {"session_id": f"eq.{session_id}", "select": "*", "order": "seq.desc"}
+        if before_seq is not None:
+            params["seq"] = f"lt.{before_seq}"
+        if limit is not None:
+            params["limit"] = str(limit)
+        response = await self._request("fetch_messages", "GET", "/conversation_messages", params=params)
+        return response.json()
+
+    async def append_turn(self, session_id: str, changes: dict, messages: List[dict], turn_id: str) -> int:
+        response = await self._request(
+            "append_turn", "POST", "/rpc/append_session_turn",
+            json={"p_session_id": session_id, "p_changes": changes, "p_messages": messages, "p_turn_id": turn_id},
+        )
+        return response.json()
+
+    async def fetch_elements(self, session_id: str, after_row: int) -> List[dict]:
+        response = await self._request(
+            "fetch_elements", "GET", "/session_elements",
+            params={"session_id": f"eq.{session_id}", "row_id": f"gt.{after_row}", "select": "*", "order": "row_id.asc"},
+        )
+        return response.json()
+
+    async def upsert_element(self, session_id: str, element: dict) -> None:
+        await self._request(
+            "upsert_element", "POST", "/rpc/upsert_session_element",
+            json={"p_session_id": session_id, "p_element": element},
+        )
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    async def _request(self, op: str, method: str, path: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        attempt = 0
+        async with self._semaphore:
+            while True:
+                try:
+                    response = await self._client.request(method, path, **kwargs)
+                    if response.status_code not in self.RETRY_STATUSES:
+                        response.raise_for_status()
+                        self.call_stats.record(op, (time.perf_counter() - start) * 1000, retries=attempt)
+                        return response
+                    error: Exception = httpx.HTTPStatusError(
+                        f"{response.status_code} from {path}", request=response.request, response=response
+                    )
+                except httpx.HTTPStatusError as e:
+                    # Client errors are not retried
+                    self.call_stats.record(op, (time.perf_counter() - start) * 1000, retries=attempt, error=True)
+                    raise StorageError(f"{op} failed: {e.response.status_code} {e.response.text}") from e
+                except httpx.TransportError as e:
+                    error = e
+
+                if attempt >= self.max_retries:
+                    self.call_stats.record(op, (time.perf_counter() - start) * 1000, retries=attempt, error=True)
+                    raise StorageError(f"{op} failed after {attempt + 1} attempts: {error}") from error
+
+                # Exponential backoff with jitter
+                await asyncio.sleep(self.backoff_base * (2 ** attempt) * (0.5 + random.random()))
+                attempt += 1
+
+
+class MemoryBackend(StorageBackend):
+    """In-process dict storage"""
+
+    def __init__(self):
+        super().__init__()
+        self.sessions: Dict[str, dict] = {}
+        self.messages: Dict[str, List[dict]] = {}
+        self.elements: Dict[str, Dict[str, dict]] = {}  # session -> element id -> row
+        self._rows = 0
+        self._turns: Dict[str, Dict[str, int]] = {}  # session -> turn id -> message_count after it
+
+    async def insert_session(self, row: dict) -> None:
+        start = time.perf_counter()
+        self.sessions.setdefault(row["id"], dict(row))
+        self.messages.setdefault(row["id"], [])
+        self.call_stats.record("insert_session", (time.perf_counter() - start) * 1000)
+
+    async def fetch_session(self, session_id: str) -> Optional[dict]:
+        start = time.perf_counter()
+        row = self.sessions.get(session_id)
+        self.call_stats.record("fetch_session", (time.perf_counter() - start) * 1000)
+        return dict(row) if row else None
+
+    async def fetch_messages(self, session_id: str, before_seq: Optional[int], limit: Optional[int]) -> List[dict]:
+        start = time.perf_counter()
+        rows = self.messages.get(session_id, [])
+        end = len(rows) if before_seq is None else min(before_seq, len(rows))
+        begin = 0 if limit is None else max(0, end - limit)
+        page = [dict(row) for row in reversed(rows[begin:end])]
+        self.call_stats.record("fetch_messages", (time.perf_counter() - start) * 1000)
+        return page
+
+    async def append_turn(self, session_id: str, changes: dict, messages: List[dict], turn_id: str) -> int:
+        start = time.perf_counter()
+        session = self.sessions[session_id]
+        turns = self._turns.setdefault(session_id, {})
+        if turn_id not in turns:
+            session.update({k: v for k, v in changes.items() if k != "message_count"})
+            stored = self.messages[session_id]
+            stored.extend({**message, "seq": len(stored) + i} for i, message in enumerate(messages))
+            session["message_count"] = turns[turn_id] = len(stored)
+        self.call_stats.record("append_turn", (time.perf_counter() - start) * 1000)
+        return turns[turn_id]
+
+    async def fetch_elements(self, session_id: str, after_row: int) -> List[dict]:
+        start = time.perf_counter()
+        rows = sorted(
+            (dict(row) for row in self.elements.get(session_id, {}).values() if row["row_id"] > after_row),
+            key=lambda row: row["row_id"],
+        )
+        self.call_stats.record("fetch_elements", (time.perf_counter() - start) * 1000)
+        return rows
+
+    async def upsert_element(self, session_id: str, element: dict) -> None:
+        start = time.perf_counter()
+        self._rows += 1
+        self.elements.setdefault(session_id, {})[element["id"]] = {**element, "row_id": self._rows}
+        self.call_stats.record("upsert_element", (time.perf_counter() - start) * 1000)
+
+
+class SQLiteBackend(StorageBackend):
+    """Local SQLite file with the same schema as the Supabase tables"""
+
+    HEADER_COLUMNS = (
+        "id", "project_id", "status", "product_description", "domain",
+        "key_actions", "user_segments", "business_goals", "current_step",
+        "taxonomy", "message_count", "created_at", "updated_at",
+    )
+
+    def __init__(self, path: str = "storage.db"):
+        super().__init__()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS setup_sessions (
+                id TEXT PRIMARY KEY,
+                project_id TEXT,
+                status TEXT NOT NULL DEFAULT 'active',
+                product_description TEXT,
+                domain TEXT,
+                key_actions TEXT NOT NULL DEFAULT '[]',
+                user_segments TEXT NOT NULL DEFAULT '[]',
+                business_goals TEXT NOT NULL DEFAULT '[]',
+                current_step TEXT,
+                taxonomy TEXT NOT NULL DEFAULT 'null',
+                message_count INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS conversation_messages (
+                session_id TEXT NOT NULL REFERENCES setup_sessions (id) ON DELETE CASCADE,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                metadata TEXT,
+                created_at TEXT NOT NULL,
+                turn_id TEXT,
+                PRIMARY KEY (session_id, seq)
+            );
+            CREATE TABLE IF NOT EXISTS session_elements (
+                row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL REFERENCES setup_sessions (id) ON DELETE CASCADE,
+                id TEXT NOT NULL,
+                intent TEXT NOT NULL,
+                selector TEXT NOT NULL,
+                page_url TEXT NOT NULL,
+                page_type TEXT,
+                signature TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                UNIQUE (session_id, id)
+            );
+            CREATE INDEX IF NOT EXISTS session_elements_session_row ON session_elements (session_id, row_id);
+            """
+        )
+        # Files created before these columns existed
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(setup_sessions)")}
+        if "current_step" not in columns:
+            self._conn.execute("ALTER TABLE setup_sessions ADD COLUMN current_step TEXT")
+        if "taxonomy" not in columns:
+            self._conn.execute("ALTER TABLE setup_sessions ADD COLUMN taxonomy TEXT NOT NULL DEFAULT 'null'")
+        if "turn_id" not in {row["name"] for row in self._conn.execute("PRAGMA table_info(conversation_messages)")}:
+            self._conn.execute("ALTER TABLE conversation_messages ADD COLUMN turn_id TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS conversation_messages_turn ON conversation_messages (session_id, turn_id)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    async def insert_session(self, row: dict) -> None:
+        await self._run("insert_session", self._insert_session, row)
+
+    async def fetch_session(self, session_id: str) -> Optional[dict]:
+        return await self._run("fetch_session", self._fetch_session, session_id)
+
+    async def fetch_messages(self, session_id: str, before_seq: Optional[int], limit: Optional[int]) -> List[dict]:
+        return await self._run("fetch_messages", self._fetch_messages, session_id, before_seq, limit)
+
+    async def append_turn(self, session_id: str, changes: dict, messages: List[dict], turn_id: str) -> int:
+        return await self._run("append_turn", self._append_turn, session_id, changes, messages, turn_id)
+
+    async def fetch_elements(self, session_id: str, after_row: int) -> List[dict]:
+        return await self._run("fetch_elements", self._fetch_elements, session_id, after_row)
+
+    async def upsert_element(self, session_id: str, element: dict) -> None:
+        await self._run("upsert_element", self._upsert_element, session_id, element)
+
+    async def close(self) -> None:
+        self._conn.close()
+
+    async def _run(self, op: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return await asyncio.to_thread(self._locked, fn, *args)
+        finally:
+            self.call_stats.record(op, (time.perf_counter() - start) * 1000)
+
+    def _locked(self, fn, *args):
+        with self._lock, self._conn:
+            return fn(*args)
+
+    def _insert_session(self, row: dict) -> None:
+        row = self._encode(row)
+        columns = [c for c in self.HEADER_COLUMNS if c in row]
+        self._conn.execute(
+            f"INSERT OR IGNORE INTO setup_sessions ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            [row[c] for c in columns],
+        )
+
+    def _fetch_session(self, session_id: str) -> Optional[dict]:
+        row = self._conn.execute("SELECT * FROM setup_sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        row = dict(row)
+        for column in JSON_COLUMNS:
+            row[column] = json.loads(row[column])
+        return row
+
+    def _fetch_messages(self, session_id: str, before_seq: Optional[int], limit: Optional[int]) -> List[dict]:
+        sql = "SELECT seq, role, content, created_at FROM conversation_messages WHERE session_id = ?"
+        params: list = [session_id]
+        if before_seq is not None:
+            sql += " AND seq < ?"
+            params.append(before_seq)
+        sql += " ORDER BY seq DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def _append_turn(self, session_id: str, changes: dict, messages: List[dict], turn_id: str) -> int:
+        # Runs under the backend lock, in one transaction
+        row = self._conn.execute("SELECT message_count FROM setup_sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            raise StorageError(f"append_turn failed: session {session_id} not found")
+        count = row[0]
+        done = self._conn.execute(
+            "SELECT 1 FROM conversation_messages WHERE session_id = ? AND turn_id = ? LIMIT 1", (session_id, turn_id)
+        ).fetchone()
+        if done is not None:
+            return count
+
+        changes = self._encode({
+            k: v for k, v in changes.items() if k in self.HEADER_COLUMNS and k not in ("id", "message_count")
+        })
+        changes["message_count"] = count + len(messages)
+        self._conn.execute(
+            f"UPDATE setup_sessions SET {', '.join(f'{c} = ?' for c in changes)} WHERE id = ?",
+            [*changes.values(), session_id],
+        )
+        self._conn.executemany(
+            "INSERT INTO conversation_messages (session_id, seq, role, content, created_at, turn_id) VALUES (?, ?, ?, ?, ?, ?)",
+            [(session_id, count + i, m["role"], m["content"], m["created_at"], turn_id) for i, m in enumerate(messages)],
+        )
+        return count + len(messages)
+
+    def _fetch_elements(self, session_id: str, after_row: int) -> List[dict]:
+        rows = self._conn.execute(
+            "SELECT * FROM session_elements WHERE session_id = ? AND row_id > ? ORDER BY row_id", (session_id, after_row)
+        )
+        return [{**dict(row), "signature": json.loads(row["signature"])} for row in rows]
+
+    def _upsert_element(self, session_id: str, element: dict) -> None:
+        # Delete and insert: a re-labeled element gets a new row number
+        self._conn.execute("DELETE FROM session_elements WHERE session_id = ? AND id = ?", (session_id, element["id"]))
+        self._conn.execute(
+            "INSERT INTO session_elements (session_id, id, intent, selector, page_url, page_type, signature, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                session_id, element["id"], element["intent"], element["selector"], element["page_url"],
+                element.get("page_type"), json.dumps(element["signature"]), element["created_at"],
+            ),
+        )
+
+    @staticmethod
+    def _encode(row: dict) -> dict:
+        return {k: json.dumps(v) if k in JSON_COLUMNS else v for k, v in row.items()}
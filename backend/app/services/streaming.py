@@ -0,0 +1,71 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from app.services import tracing
+from app.services.llm_cache import model_name
+from app.services.llm_scheduler import get_scheduler
+from app.services.model_router import get_router
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+# Token streaming
+#
+# LLM nodes call generate() instead of llm.ainvoke(). Outside a stream it is a
+# plain ainvoke; inside stream_events() it switches to llm.astream and forwards
+# every chunk to the stream's queue while still returning the full text, so
+# node logic (parsing, state updates) is unchanged. Both go through the shared
+# LLM scheduler (app/services/llm_scheduler.py). Calls made for a routed
+# `node` are counted in the model router's per-node stats.
+
+_token_queue: ContextVar[Optional[asyncio.Queue]] = ContextVar("token_queue", default=None)
+
+
+async def generate(llm, messages: List["BaseMessage"], node: Optional[str] = None) -> str:
+    """Run a chat completion, forwarding tokens to the active stream if any"""
+    queue = _token_queue.get()
+    prompt_chars = sum(len(m.content) for m in messages if isinstance(m.content, str))
+    start = time.perf_counter()
+    with tracing.span("llm", streamed=queue is not None) as current:
+        if queue is None:
+            response = await get_scheduler().ainvoke(llm, messages)
+            text, metadata = response.content, getattr(response, "response_metadata", None)
+        else:
+            parts = []
+            async for chunk in get_scheduler().astream(llm, messages):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    queue.put_nowait(("token", chunk.content))
+            text, metadata = "".join(parts), None
+        tracing.record_llm(current, prompt_chars, text, metadata)
+    if node is not None:
+        get_router().record(node, model_name(llm), time.perf_counter() - start, prompt_chars, text, metadata)
+    return text
+
+
+async def stream_events(run: Callable[[], Awaitable[Any]]) -> AsyncIterator[Tuple[str, Any]]:
+    """Run `run()` with token forwarding enabled.
+
+    Yields ("token", text) while it runs, then ("done", result). The run is a
+    separate task, so it still finishes (and persists its state) if the
+    consumer goes away mid-stream.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def runner():
+        _token_queue.set(queue)
+        try:
+            return await run()
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(runner())
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        yield item
+
+    yield ("done", await task)
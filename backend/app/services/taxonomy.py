@@ -0,0 +1,80 @@
+import hashlib
+import json
+from typing import Dict
+
+from app.models.session import SetupSession
+from app.models.taxonomy import CanonicalEvent, NoiseRule, PiiRule, Taxonomy
+from app.services.rule_engine import snake_case
+
+# Taxonomy generation
+#
+# Builds a taxonomy preview from what the setup conversation collected: one
+# canonical event per key action and per labeled element intent (intents that
+# normalize to the same name become one event), plus the default PII and
+# noise rules. The user reviews and approves it; the approved taxonomy is what
+# the rule engine (app/services/rule_engine.py) applies to incoming events.
+# The full taxonomy, with properties per event, is built from this preview by
+# a background job (app/graphs/taxonomy_builder.py).
+
+DEFAULT_PII_RULES = [
+    PiiRule(
+        name="personal_property",
+        property_pattern=r"(?i:^\$?(e_?mail|phone(_number)?|password|passwd|ssn|credit_?card|card_?number|cvv|"
+                         r"first_?name|last_?name|full_?name|street_?address|ip)$)",
+    ),
+    # Lookbehinds anchor matches at token starts, which keeps scans linear
+    PiiRule(name="email", value_pattern=r"(?<![\w.+-])[\w.+-]+@[\w-]+\.[\w.-]+"),
+    PiiRule(name="phone", value_pattern=r"(?<![\w+])\+\d[\d ().-]{7,16}\d"),
+    PiiRule(name="card_number", value_pattern=r"(?<![\d-])\d(?:[ -]?\d){14,15}(?!\d)"),
+]
+
+DEFAULT_NOISE_RULES = [
+    NoiseRule(event_pattern=r"^\$?(mousemove|mouse_move|heartbeat|ping|scroll_depth_tick)$"),
+    NoiseRule(event_pattern=r"^\$?(test|debug)_"),
+]
+
+
+def generate_taxonomy(session: SetupSession, version: int = 1) -> Taxonomy:
+    """Taxonomy preview for a session (not approved)"""
+    events: Dict[str, CanonicalEvent] = {}
+
+    def add(raw: str) -> None:
+        name = snake_case(raw)
+        if not name:
+            return
+        event = events.setdefault(name, CanonicalEvent(name=name))
+        if raw != name and raw not in event.aliases:
+            event.aliases.append(raw)
+
+    for action in session.key_actions:
+        add(action)
+    for element in session.labeled_elements:
+        add(element.intent)
+
+    return Taxonomy(
+        id=f"tax_v{version}",
+        canonical_events=list(events.values()),
+        pii_rules=list(DEFAULT_PII_RULES),
+        noise_rules=list(DEFAULT_NOISE_RULES),
+    )
+
+
+def taxonomy_version(taxonomy: Taxonomy) -> int:
+    return int(taxonomy.id.rsplit("v", 1)[-1])
+
+
+def next_version(session: SetupSession) -> int:
+    return taxonomy_version(session.taxonomy) + 1 if session.taxonomy else 1
+
+
+def inputs_key(session: SetupSession) -> str:
+    """Identifies what a taxonomy for the session is built from"""
+    raw = json.dumps([
+        session.product_description,
+        session.domain.value if session.domain else None,
+        session.key_actions,
+        session.user_segments,
+        session.business_goals,
+        [(e.intent, e.selector, e.page_url) for e in session.labeled_elements],
+    ])
+    return f"{session.id}:{hashlib.sha1(raw.encode()).hexdigest()[:16]}"
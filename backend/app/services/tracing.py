@@ -0,0 +1,159 @@
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services import metrics
+
+# Tracing
+#
+# Spans time graph nodes, LLM calls (prompt build / request / parse), graph
+# compilation and storage calls. Every finished span feeds the
+# span_duration_seconds{span=...} histogram; spans opened inside another span
+# become its children, and a finished root span (one chat turn) is written to
+# TRACE_FILE as a JSON line when that is set.
+#
+# TRACING_ENABLED=0 turns it off: span() hands out a shared no-op and
+# instrument() returns functions unwrapped, so nothing is added per call.
+
+ENABLED = os.getenv("TRACING_ENABLED", "1").lower() not in ("0", "false", "no")
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+_tokens = {
+    kind: metrics.counter("llm_tokens_total", "Tokens reported by the LLM provider", {"kind": kind})
+    for kind in ("prompt", "completion")
+}
+_payload = {
+    direction: metrics.counter("llm_payload_bytes_total", "Characters sent to / received from the LLM", {"direction": direction})
+    for direction in ("request", "response")
+}
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "duration", "children", "_token", "_parent")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.children: List["Span"] = []
+        self.duration = 0.0
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self._parent = _current.get()
+        if self._parent is not None:
+            self._parent.children.append(self)
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self.start
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        metrics.histogram(
+            "span_duration_seconds", "Time spent per span", labels={"span": self.name}
+        ).observe(self.duration)
+        if self._parent is None and TRACE_FILE:
+            _export(self)
+
+    def to_dict(self, offset: Optional[float] = None) -> dict:
+        offset = self.start if offset is None else offset
+        data = {
+            "name": self.name,
+            "start_ms": round((self.start - offset) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.children:
+            data["children"] = [child.to_dict(offset) for child in self.children]
+        return data
+
+
+class _NoopSpan:
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """Context manager timing a block as a child of the current span"""
+    if not ENABLED:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def instrument(name: str, fn: Callable) -> Callable:
+    """Wrap a sync or async function in a span"""
+    if not ENABLED:
+        return fn
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with Span(name, {}):
+                return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with Span(name, {}):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def traced(name: str):
+    """Decorator form of instrument()"""
+    return lambda fn: instrument(name, fn)
+
+
+def record_llm(current, prompt_chars: int, content, response_metadata: Optional[dict] = None) -> None:
+    """Attach payload sizes and provider token usage to an LLM span"""
+    response_chars = len(content) if isinstance(content, str) else 0
+    _payload["request"].inc(prompt_chars)
+    _payload["response"].inc(response_chars)
+
+    usage = (response_metadata or {}).get("token_usage") or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    completion_tokens = usage.get("completion_tokens")
+    if prompt_tokens is not None:
+        _tokens["prompt"].inc(prompt_tokens)
+    if completion_tokens is not None:
+        _tokens["completion"].inc(completion_tokens)
+
+    current.set(
+        request_chars=prompt_chars,
+        response_chars=response_chars,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+    )
+
+
+# Trace file exporter
+
+_export_lock = threading.Lock()
+
+
+def _export(root: Span) -> None:
+    line = json.dumps(root.to_dict(), default=str)
+    with _export_lock:
+        with open(TRACE_FILE, "a") as f:
+            f.write(line + "\n")
@@ -1,5 +1,4 @@
-from typing import TypedDict, List, Optional, Annotated
-from langgraph.graph import add_messages
+from typing import TypedDict, List, Optional
 
 class Message(TypedDict):
     role: str  # "user" or "assistant"
@@ -12,7 +11,7 @@ class ConversationState(TypedDict):
     project_name: Optional[str]
     
     # Conversation flow
-    messages: Annotated[List[Message], add_messages]  # LangGraph will append messages
+    messages: List[Message]  # Nodes append in place and return the full state
     current_stage: str  # "greeting", "product_discovery", "goal_understanding", "labeling_ready"
     
     # Extracted information
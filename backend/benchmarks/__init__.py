@@ -0,0 +1,34 @@
+"""Benchmarks, run from backend/ as `python -m benchmarks.<name>`.
+
+Importing the package sets up the environment every benchmark runs in,
+before any app module reads it: a placeholder API key, in-memory storage
+with no SQLite files, no background warm-up and no LLM response cache
+(identical sessions would otherwise be answered from it, and their calls go
+uncounted). Variables already set in the environment win.
+"""
+import os
+
+DEFAULTS = {
+    "OPENAI_API_KEY": "sk-benchmark",
+    "STORAGE_BACKEND": "memory",
+    "SESSION_STATE_DB": "",
+    "CHECKPOINT_DB": "",
+    "JOBS_DB": "",
+    "STARTUP_WARMUP": "0",
+    "LLM_CACHE_MAX_ENTRIES": "0",
+}
+
+for name, value in DEFAULTS.items():
+    os.environ.setdefault(name, value)
+
+
+def lift_llm_limits() -> None:
+    """Replace the shared LLM scheduler with one without concurrency or rate limits, unless set in the environment"""
+    from app.services import llm_scheduler
+
+    llm_scheduler.close()
+    llm_scheduler._scheduler = llm_scheduler.LLMScheduler(
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "100000")),
+        requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")),
+        tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+    )
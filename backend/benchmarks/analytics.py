@@ -0,0 +1,99 @@
+"""Latency benchmark for analytics queries over the columnar event store.
+
+Appends a synthetic shop event stream (users walking a product view -> add
+to cart -> checkout -> purchase funnel with drop-off, plus searches) spread
+over --days days, then times each query kind against a cold store, next to
+a raw scan of the event column for the same counts, and the funnel again
+through the query result cache.
+
+    cd backend
+    python -m benchmarks.analytics --events 2000000 --days 7
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from app.models.analytics import AnalyticsQuery
+from app.services.analytics import run_query
+from app.services.event_store import EventStore
+from app.services.query_cache import QueryCache
+
+START = date(2024, 5, 1)
+FUNNEL = ["product_viewed", "add_to_cart", "checkout_started", "purchase_completed"]
+CONTINUE = 0.45  # Chance of going on to the next funnel step
+CATEGORIES = ["shoes", "shirts", "bags", "hats", "socks", "jackets"]
+
+
+def make_events(count: int, days: int, users: int, seed: int = 7):
+    """Batches of clean events in time order"""
+    rng = random.Random(seed)
+    start_ms = int(datetime(START.year, START.month, START.day, tzinfo=timezone.utc).timestamp() * 1000)
+    span_ms = days * 86_400_000
+    batch = []
+    for i in range(count):
+        ts = start_ms + i * span_ms // count
+        user = rng.randint(1, users)
+        if rng.random() < 0.2:
+            name = "search_performed"
+        else:
+            step = 0
+            while step < len(FUNNEL) - 1 and rng.random() < CONTINUE:
+                step += 1
+            name = FUNNEL[step]
+        batch.append({
+            "event": name,
+            "distinct_id": f"u{user}",
+            "timestamp": ts,
+            "properties": {"category": rng.choice(CATEGORIES), "price": rng.randint(1, 40) * 5},
+        })
+        if len(batch) == 5000:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def timed(label: str, fn, repeat: int = 5):
+    fn()  # Rollups loaded, files paged in
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    print(f"{label:>28}: {(time.perf_counter() - start) / repeat * 1000:8.2f} ms")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--users", type=int, default=100_000)
+    args = parser.parse_args()
+    end = START + timedelta(days=args.days - 1)
+
+    with tempfile.TemporaryDirectory() as root:
+        store = EventStore(root)
+        start = time.perf_counter()
+        for batch in make_events(args.events, args.days, args.users):
+            store.append("bench", batch)
+        elapsed = time.perf_counter() - start
+        print(f"{'append + rollups':>28}: {args.events / elapsed:,.0f} events/s ({args.events} events)")
+
+        store = EventStore(root)  # Cold: rollups loaded from disk
+
+        def query(kind: str, **params):
+            return lambda: run_query("bench", AnalyticsQuery(kind=kind, start=START, end=end, **params), store)
+
+        timed("raw scan: events per name", lambda: store.count_by_event("bench", START, end))
+        timed("counts (daily)", query("counts"))
+        timed("counts (hourly)", query("counts", interval="hour"))
+        timed("unique users", query("unique_users", events=FUNNEL[:1]))
+        timed("conversion", query("conversion", events=FUNNEL))
+        timed("top categories", query("top_values", property="category", events=FUNNEL[-1:], limit=5))
+        result = timed("funnel (ordered)", query("funnel", events=FUNNEL), repeat=3)
+        print("  " + " -> ".join(f"{step.event} {step.users} ({step.conversion:.0%})" for step in result.steps))
+
+        cache = QueryCache(store)
+        funnel = AnalyticsQuery(kind="funnel", events=FUNNEL, start=START, end=end)
+        timed("funnel (cached)", lambda: cache.run("bench", funnel))
@@ -0,0 +1,240 @@
+"""Load test for the conversation API.
+
+Drives the HTTP endpoints in-process (httpx ASGI transport, no network) with
+many concurrent simulated setup sessions, a deterministic fake LLM and the
+in-memory storage backend. Two scenarios:
+
+- main:   POST /api/v1/sessions/create, then POST /api/v1/chat/message per turn
+- router: POST /api/v1/sessions, POST /api/v1/sessions/{id}/message per turn,
+          then GET /api/v1/sessions/{id} (app/api/setup.py and app/api/chat.py)
+
+Reports p50/p95/p99 latency per endpoint, throughput and retained memory per
+session. Results can be saved and compared against an earlier run:
+
+    cd backend
+    python -m benchmarks.api_load --sessions 200 --latency 0.05 --output before.json
+    python -m benchmarks.api_load --sessions 200 --latency 0.05 --compare before.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+from app import conversation
+from app.api import chat, setup
+from app.graphs import conversation_graph
+from app.main import app
+from app.services.fake_llm import FakeChatModel
+
+app.include_router(setup.router, prefix="/api/v1")
+app.include_router(chat.router, prefix="/api/v1")
+
+# One full setup session, one entry per turn
+TURNS = [
+    "Hi",
+    "An online store selling handmade goods",
+    "Product views, add to cart and purchases",
+    "Buyers and sellers",
+    "Conversion rate and revenue",
+]
+
+# Metrics compared by --compare: name -> True if higher is better
+COMPARED = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "requests_per_second": True,
+    "bytes_per_session": False,
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[name].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+        return response
+
+
+async def main_session(client: httpx.AsyncClient, recorder: Recorder) -> None:
+    response = await recorder.request(
+        client, "POST /sessions/create", "POST", "/api/v1/sessions/create", json={"user_id": "bench"}
+    )
+    session_id = response.json()["session_id"]
+    for message in TURNS:
+        await recorder.request(
+            client, "POST /chat/message", "POST", "/api/v1/chat/message",
+            json={"session_id": session_id, "message": message},
+        )
+
+
+async def router_session(client: httpx.AsyncClient, recorder: Recorder) -> None:
+    response = await recorder.request(client, "POST /sessions", "POST", "/api/v1/sessions", json={})
+    session_id = response.json()["id"]
+    for message in TURNS:
+        await recorder.request(
+            client, "POST /sessions/{id}/message", "POST", f"/api/v1/sessions/{session_id}/message",
+            json={"message": message},
+        )
+    await recorder.request(client, "GET /sessions/{id}", "GET", f"/api/v1/sessions/{session_id}")
+
+
+SCENARIOS = {"main": main_session, "router": router_session}
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> dict:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+async def run_load(scenario: str, sessions: int, concurrency: int) -> dict:
+    """Run `sessions` sessions, at most `concurrency` at a time"""
+    recorder = Recorder()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(client):
+        async with limit:
+            await SCENARIOS[scenario](client, recorder)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client) for _ in range(sessions)))
+        wall = time.perf_counter() - start
+
+    all_samples = [s for samples in recorder.latencies.values() for s in samples]
+    return {
+        "wall_seconds": round(wall, 3),
+        "requests": len(all_samples),
+        "errors": sum(recorder.errors.values()),
+        "requests_per_second": round(len(all_samples) / wall, 1),
+        "sessions_per_second": round(sessions / wall, 2),
+        **summarize(all_samples),
+        "endpoints": {name: summarize(samples) for name, samples in sorted(recorder.latencies.items())},
+    }
+
+
+async def measure_memory(scenario: str, sessions: int) -> int:
+    """Bytes still allocated per session after the sessions finish"""
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Warm up imports, graph compilation and caches outside the measurement
+        await SCENARIOS[scenario](client, recorder)
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(sessions):
+            await SCENARIOS[scenario](client, recorder)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    return max(after - before, 0) // sessions
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Print metric deltas per scenario; return the regressions over the threshold"""
+    regressions = []
+    for scenario, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        print(f"\n{scenario} vs baseline")
+        for metric, higher_is_better in COMPARED.items():
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > max_regression else ""
+            print(f"{metric:>22}: {old} -> {new} ({change:+.1%}){flag}")
+            if flag:
+                regressions.append(f"{scenario}.{metric} {change:+.1%}")
+    return regressions
+
+
+async def main(args) -> dict:
+    fake = FakeChatModel(latency=args.latency)
+    conversation.llm = fake
+    conversation_graph.llm = fake
+
+    results = {
+        "config": {
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "turns": len(TURNS),
+        },
+        "scenarios": {},
+    }
+    for scenario in args.scenarios:
+        result = await run_load(scenario, args.sessions, args.concurrency)
+        if args.memory_sessions:
+            result["bytes_per_session"] = await measure_memory(scenario, args.memory_sessions)
+        results["scenarios"][scenario] = result
+    results["llm_calls"] = fake.calls
+    return results
+
+
+def report(results: dict) -> None:
+    for scenario, result in results["scenarios"].items():
+        print(f"\n{scenario}")
+        for key, value in result.items():
+            if key != "endpoints":
+                print(f"{key:>22}: {value}")
+        for name, summary in result["endpoints"].items():
+            print(f"  {name:<28} n={summary['count']:<6} p50={summary['p50_ms']}ms "
+                  f"p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="sessions in flight at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency in seconds")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("--memory-sessions", type=int, default=50,
+                        help="sessions for the retained-memory pass (0 to skip)")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --output")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="with --compare, exit non-zero if a metric is this much worse")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            sys.exit("regressions: " + ", ".join(regressions))
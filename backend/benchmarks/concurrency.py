@@ -0,0 +1,92 @@
+"""Concurrency load test for the conversation graph.
+
+Runs many setup sessions at once through the async graph path against a fake
+LLM with fixed latency and reports how much of the LLM wait time overlapped.
+With blocking nodes the effective concurrency stays at ~1; with async nodes it
+approaches the number of sessions, until the graph's own CPU per turn fills
+the wall time instead: at ~8 ms a turn, one process runs ~100 turns/s, so
+200 sessions at 0.5 s overlap ~20 calls (50 at 0.2 s: ~7).
+
+Every answer is one the keyword rules can't explain, and differs per session,
+so extraction goes to the LLM in every session (no rule hits, no cache hits
+or coalescing): two calls each, as the fake answers every field at once. The
+LLM scheduler's limits are lifted unless set in the environment; it would
+otherwise cap the overlap at LLM_MAX_CONCURRENCY.
+
+    cd backend
+    python -m benchmarks.concurrency --sessions 50 --latency 0.2 --min-concurrency 4
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from app.graphs import conversation_graph
+from app.services.fake_llm import FakeChatModel
+from benchmarks import lift_llm_limits
+
+
+# One full setup session, one entry per turn ({n}: the session's number).
+# None of the extraction answers is covered by the keyword rules.
+TURNS = [
+    "Hi",
+    "A place where makers trade pottery, studio {n}",
+    "Bookmarking patterns and messaging makers in studio {n}",
+    "Hobbyists and studios like studio {n}",
+    "Repeat visits and referrals for studio {n}",
+]
+
+
+def new_state() -> dict:
+    return {
+        "messages": [],
+        "product_description": None,
+        "domain": None,
+        "key_actions": [],
+        "user_segments": [],
+        "business_goals": [],
+        "current_step": "greeting",
+        "ready_for_labeling": False,
+    }
+
+
+async def run_session(n: int) -> None:
+    state = new_state()
+    for message in TURNS:
+        state["messages"].append({"role": "user", "content": message.format(n=n)})
+        state = await conversation_graph.get_conversation_workflow().ainvoke(state)
+
+
+async def main(sessions: int, latency: float) -> dict:
+    lift_llm_limits()
+    fake = FakeChatModel(latency=latency)
+    conversation_graph.llm = fake
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(n) for n in range(sessions)))
+    wall = time.perf_counter() - start
+
+    llm_wait = fake.calls * latency
+    return {
+        "sessions": sessions,
+        "llm_calls": fake.calls,
+        "wall_seconds": round(wall, 3),
+        "serial_llm_seconds": round(llm_wait, 3),
+        "effective_concurrency": round(llm_wait / wall, 1) if wall else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency in seconds")
+    parser.add_argument("--min-concurrency", type=float, default=None,
+                        help="exit non-zero if effective concurrency is below this")
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args.sessions, args.latency))
+    for key, value in result.items():
+        print(f"{key:>22}: {value}")
+
+    if args.min_concurrency is not None and result["effective_concurrency"] < args.min_concurrency:
+        sys.exit(f"effective concurrency {result['effective_concurrency']} < {args.min_concurrency}")
@@ -0,0 +1,88 @@
+"""Similar-element checks and label writes over a growing session.
+
+Labels --labels elements in one session through element_index.check_and_add
+(the analyze endpoint's session step) on SQLite storage, two labelers at a
+time. Reports per-label time for the first and last --bucket labels, bytes
+written per label (WAL growth), the labels stored against the labels sent,
+and a re-label from a cold process (no cached index) on the full session,
+which should still find the element it looks like.
+
+    cd backend
+    python -m benchmarks.element_labels --labels 1000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from app.models.element import LabeledElement
+from app.services import element_index, storage
+from app.services.storage_backends import SQLiteBackend
+
+
+def word(n: int) -> str:
+    """A distinct lowercase word per number (selectors with digits count as generated)"""
+    letters = ""
+    while True:
+        n, rest = divmod(n, 26)
+        letters += "abcdefghijklmnopqrstuvwxyz"[rest]
+        if not n:
+            return letters + "x"
+
+
+def element(i: int) -> LabeledElement:
+    """Mostly distinct elements; every 10th looks like the one before it"""
+    j = i - 1 if i % 10 == 9 else i
+    return LabeledElement(
+        id=f"el_{i}",
+        selector=f"section.{word(j // 4)} > div.{word(j + 500)} > button.{word(j)}",
+        text_content=f"{word(j + 1000)} {word(j)}",
+        page_url=f"https://shop.example.com/{word(j // 8)}/{word(j // 2)}",
+        intent=f"clicked {word(j)} {word(j + 2000)}",
+    )
+
+
+async def main(args) -> dict:
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "storage.db")
+        storage.set_backend(SQLiteBackend(path))
+        session = await storage.create_session()
+        latencies = []
+
+        async def label(i: int) -> None:
+            start = time.perf_counter()
+            await element_index.check_and_add(session.id, element(i))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        wal_start = os.path.getsize(path + "-wal")
+        for i in range(0, args.labels, 2):
+            await asyncio.gather(*(label(j) for j in range(i, min(i + 2, args.labels))))
+        written = os.path.getsize(path + "-wal") - wal_start
+
+        stored = len(await storage.get_elements(session.id))
+        element_index.clear()
+        start = time.perf_counter()
+        # Re-label one that looks like the label before it
+        similar = await element_index.check_and_add(session.id, element(args.labels - 1))
+        cold_ms = (time.perf_counter() - start) * 1000
+        await storage.close()
+
+    return {
+        "labels": args.labels,
+        "stored": stored,
+        "first_labels_p50_ms": round(statistics.median(latencies[:args.bucket]), 2),
+        "last_labels_p50_ms": round(statistics.median(latencies[-args.bucket:]), 2),
+        "bytes_written_per_label": written // args.labels,
+        "cold_check_ms": round(cold_ms, 1),
+        "cold_check_similar": len(similar),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--labels", type=int, default=1000)
+    parser.add_argument("--bucket", type=int, default=50)
+    for key, value in asyncio.run(main(parser.parse_args())).items():
+        print(f"{key:>24}: {value}")
@@ -0,0 +1,75 @@
+"""Append and scan benchmark for the columnar event store.
+
+Cleans a synthetic event stream with the rule engine, spreads it over
+--days days, appends it in batches and then runs scans that touch one column
+(events per name) and one property column, over all days and over a single
+day. Reports append events/second, scan time and on-disk size versus the
+same events as NDJSON.
+
+    cd backend
+    python -m benchmarks.event_store --events 500000 --days 7
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from app.services.event_store import EventStore, code_counts
+from app.services.rule_engine import RuleEngine
+from benchmarks.rule_engine import TAXONOMY, make_events
+
+START = date(2024, 5, 1)
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def timed(label: str, fn, repeat: int = 5):
+    fn()  # Page in the mapped files
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    print(f"{label:>34}: {(time.perf_counter() - start) / repeat * 1000:8.2f} ms")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    events = RuleEngine(TAXONOMY).process(make_events(args.events)).events
+    for i, event in enumerate(events):
+        day = START + timedelta(days=i * args.days // len(events))
+        event["timestamp"] = f"{day.isoformat()}T{i % 24:02d}:00:00Z"
+    ndjson_bytes = sum(len(json.dumps(e)) + 1 for e in events)
+
+    with tempfile.TemporaryDirectory() as root:
+        store = EventStore(root)
+        start = time.perf_counter()
+        for i in range(0, len(events), args.batch_size):
+            store.append("bench", events[i:i + args.batch_size])
+        elapsed = time.perf_counter() - start
+        size = directory_size(root)
+        print(f"{'append':>34}: {len(events) / elapsed:,.0f} events/s ({len(events)} events)")
+        print(f"{'on disk':>34}: {size / 1e6:.1f} MB (NDJSON {ndjson_bytes / 1e6:.1f} MB)")
+
+        store = EventStore(root)  # Cold: dictionaries reloaded on demand
+        timed("events per name, all days", lambda: store.count_by_event("bench"))
+        timed("events per name, one day", lambda: store.count_by_event("bench", START, START))
+
+        def category_counts():
+            counts = {}
+            for partition in store.partitions("bench"):
+                column = partition.property("category")
+                cardinality = len(partition.dictionaries.values.values)
+                for code, count in code_counts(column, cardinality).items():
+                    counts[code] = counts.get(code, 0) + count
+            return counts
+
+        timed("rows per category value, all days", category_counts)
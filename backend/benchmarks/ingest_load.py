@@ -0,0 +1,150 @@
+"""Load test for the batch event ingestion endpoint.
+
+Posts gzip-compressed NDJSON batches to POST /api/v1/events/batch in-process
+(httpx ASGI transport) from several concurrent clients, honoring 429
+Retry-After, and waits until the writer has drained the queue into the sink.
+Reports events/second through parse + taxonomy + sink, the number of 429s,
+peak RSS (which should stay flat as --batches grows) and how late a 10 ms
+timer on the event loop fires meanwhile (what any other request would wait). Then posts a gzip
+bomb (--bomb-mb of newlines, about 1 KB per MB compressed) and exits non-zero
+unless it is rejected with 413 without RSS growing by the inflated size.
+
+    cd backend
+    python -m benchmarks.ingest_load --batches 200 --batch-events 2000 --sink sqlite
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+import httpx
+
+from app.main import app
+from app.services import ingestion, storage
+from benchmarks.rule_engine import TAXONOMY, make_events
+
+
+def make_bodies(batches: int, batch_events: int, distinct: int = 8):
+    """A few distinct compressed bodies, reused round-robin"""
+    bodies = []
+    for i in range(min(batches, distinct)):
+        lines = "\n".join(json.dumps(e) for e in make_events(batch_events, seed=i))
+        bodies.append(gzip.compress(lines.encode(), compresslevel=5))
+    return bodies
+
+
+def make_bomb(megabytes: int) -> bytes:
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    block = b"\n" * (1024 * 1024)
+    return b"".join(compressor.compress(block) for _ in range(megabytes)) + compressor.flush()
+
+
+async def post_bomb(http: httpx.AsyncClient, session_id: str, megabytes: int) -> dict:
+    body = make_bomb(megabytes)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    response = await http.post(
+        f"/api/v1/events/batch?session_id={session_id}", content=body,
+        headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+    )
+    return {
+        "compressed_kb": len(body) // 1024,
+        "status": response.status_code,
+        "peak_rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1),
+    }
+
+
+async def loop_lag(lags: list, interval: float = 0.01) -> None:
+    """Record how late each `interval` sleep wakes up, until cancelled"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def main(args) -> dict:
+    session = await storage.create_session()
+    session.taxonomy = TAXONOMY.model_copy(update={"approved": True})
+    await storage.update_session(session)
+
+    bodies = make_bodies(args.batches, args.batch_events)
+    headers = {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+    pending = list(range(args.batches))
+    throttled = 0
+    accepted = 0
+
+    async def client(http: httpx.AsyncClient):
+        nonlocal throttled, accepted
+        while pending:
+            body = bodies[pending.pop() % len(bodies)]
+            while True:
+                response = await http.post(
+                    f"/api/v1/events/batch?session_id={session.id}", content=body, headers=headers
+                )
+                if response.status_code != 429:
+                    response.raise_for_status()
+                    accepted += response.json()["accepted"]
+                    break
+                # Whole-body retry (fine here: rejected before any line was taken)
+                throttled += 1
+                await asyncio.sleep(float(response.headers["Retry-After"]) / 10)
+
+    lags = []
+    probe = asyncio.ensure_future(loop_lag(lags))
+    start = time.perf_counter()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        await asyncio.gather(*(client(http) for _ in range(args.concurrency)))
+        await ingestion.get_ingestor().queue.join()
+        elapsed = time.perf_counter() - start
+        probe.cancel()
+        bomb = await post_bomb(http, session.id, args.bomb_mb)
+
+    total = args.batches * args.batch_events
+    return {
+        "events_sent": total,
+        "events_accepted": accepted,
+        "seconds": round(elapsed, 2),
+        "events_per_second": round(total / elapsed),
+        "throttled_requests": throttled,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "loop_lag_ms": {
+            "p50": round(statistics.median(lags) * 1000, 1),
+            "p99": round(sorted(lags)[int(len(lags) * 0.99)] * 1000, 1),
+            "max": round(max(lags) * 1000, 1),
+        },
+        "ingestor": ingestion.get_ingestor().stats(),
+        "gzip_bomb": bomb,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--batch-events", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sink", choices=["sqlite", "file", "columnar"], default="sqlite")
+    parser.add_argument("--bomb-mb", type=int, default=1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["EVENT_SINK"] = args.sink
+        os.environ["EVENT_SINK_PATH"] = os.path.join(tmp, "events.db" if args.sink == "sqlite" else "events.ndjson")
+        os.environ["EVENT_STORE_PATH"] = os.path.join(tmp, "event_store")
+        results = asyncio.run(main(args))
+        asyncio.run(ingestion.close())
+
+    for key, value in results.items():
+        print(f"{key:>20}: {value}")
+
+    bomb = results["gzip_bomb"]
+    if bomb["status"] != 413:
+        sys.exit(f"gzip bomb answered {bomb['status']}, expected 413")
+    if bomb["peak_rss_growth_mb"] > ingestion.MAX_BODY_BYTES / 1024 / 1024 / 2:
+        sys.exit(f"gzip bomb grew peak RSS by {bomb['peak_rss_growth_mb']} MB")
@@ -0,0 +1,88 @@
+"""LLM scheduler against a rate-limited fake provider.
+
+The fake provider accepts --rate calls per second (sliding window) and
+answers others with a 429. A burst of --background background calls is
+queued, then --interactive interactive calls arrive; each scenario reports
+failed calls, 429s seen, and p50 latency per priority:
+
+- direct: every call hits the provider at once (no scheduler)
+- scheduled: the request bucket matches the provider's limit
+- scheduled, limit unknown: no request bucket; 429s drive the backoff
+- coalescing: --interactive identical prompts in flight at once
+
+    cd backend
+    python -m benchmarks.llm_scheduler --rate 20 --background 100 --interactive 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+
+from app.services.fake_llm import FakeChatModel
+from app.services.llm_scheduler import BACKGROUND, INTERACTIVE, LLMScheduler
+
+
+async def timed_call(invoke, messages, latencies):
+    start = time.perf_counter()
+    try:
+        await invoke(messages)
+    except Exception:
+        return False
+    latencies.append((time.perf_counter() - start) * 1000)
+    return True
+
+
+async def burst(args, invoke_at):
+    """Background burst, then interactive calls; returns (failed, p50 per priority)"""
+    latencies = {"background": [], "interactive": []}
+    tasks = [
+        asyncio.ensure_future(timed_call(invoke_at(BACKGROUND), [HumanMessage(content=f"background {i}")], latencies["background"]))
+        for i in range(args.background)
+    ]
+    await asyncio.sleep(0.05)
+    tasks += [
+        asyncio.ensure_future(timed_call(invoke_at(INTERACTIVE), [HumanMessage(content=f"chat {i}")], latencies["interactive"]))
+        for i in range(args.interactive)
+    ]
+    results = await asyncio.gather(*tasks)
+    p50 = {name: round(statistics.median(values), 1) if values else None for name, values in latencies.items()}
+    return results.count(False), p50
+
+
+def provider(args) -> FakeChatModel:
+    return FakeChatModel(latency=args.latency, rate_limit=args.rate, rate_window=1.0)
+
+
+async def main(args) -> None:
+    llm = provider(args)
+    failed, p50 = await burst(args, lambda priority: llm.ainvoke)
+    print(f"{'direct':>26}: failed {failed:4d}  429s {llm.rejected:4d}  p50 ms {p50}")
+
+    for label, per_minute in (("scheduled", args.rate * 60), ("scheduled, limit unknown", 0)):
+        llm = provider(args)
+        scheduler = LLMScheduler(
+            max_concurrency=args.concurrency, requests_per_minute=per_minute, tokens_per_minute=0,
+            backoff_seconds=0.2, burst_seconds=1.0,
+        )
+        failed, p50 = await burst(args, lambda priority: lambda m: scheduler.ainvoke(llm, m, priority))
+        print(f"{label:>26}: failed {failed:4d}  429s {llm.rejected:4d}  p50 ms {p50}")
+        scheduler.close()
+
+    llm = provider(args)
+    scheduler = LLMScheduler(max_concurrency=args.concurrency, requests_per_minute=args.rate * 60, burst_seconds=1.0)
+    same = [HumanMessage(content="What should we track on the checkout page?")]
+    await asyncio.gather(*(scheduler.ainvoke(llm, same) for _ in range(args.interactive)))
+    print(f"{'coalescing':>26}: {args.interactive} identical calls -> {llm.calls} provider call(s)")
+    scheduler.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=20, help="Provider limit, calls per second")
+    parser.add_argument("--latency", type=float, default=0.1, help="Provider latency, seconds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--background", type=int, default=100)
+    parser.add_argument("--interactive", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,80 @@
+"""Per-turn cost of a long conversation through POST /api/v1/sessions/{id}/message.
+
+Runs one session through setup and then keeps chatting (as during a long
+labeling session) with the fake LLM and in-memory storage. Reports turn
+latency over the first and last --bucket turns, and the messages and
+estimated tokens handed to the graph on the last turn; with the context
+window these stay flat as --turns grows. Then sends --burst turns to the
+session at once and exits non-zero unless every message of every turn is
+stored (a user message and a reply each).
+
+    cd backend
+    python -m benchmarks.long_session --turns 1000
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+from app.api import chat, setup
+from app.graphs import conversation_graph
+from app.main import app
+from app.services import storage
+from app.services.context_window import CONTEXT_LOAD_MESSAGES, MessageLog, estimate_tokens
+from app.services.fake_llm import FakeChatModel
+from benchmarks.api_load import TURNS
+
+app.include_router(setup.router, prefix="/api/v1")
+app.include_router(chat.router, prefix="/api/v1")
+
+
+async def main(args) -> dict:
+    conversation_graph.llm = FakeChatModel()
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        session_id = (await client.post("/api/v1/sessions", json={})).json()["id"]
+        for turn in range(args.turns):
+            message = TURNS[turn] if turn < len(TURNS) else f"Labeled the checkout button on page {turn}"
+            start = time.perf_counter()
+            response = await client.post(f"/api/v1/sessions/{session_id}/message", json={"message": message})
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+        session = await storage.get_session(session_id, message_limit=CONTEXT_LOAD_MESSAGES)
+
+        burst = await asyncio.gather(*(
+            client.post(f"/api/v1/sessions/{session_id}/message", json={"message": f"Labeled the banner, burst {i}"})
+            for i in range(args.burst)
+        ))
+        for response in burst:
+            response.raise_for_status()
+
+    context = MessageLog(session.messages).window()
+    stored = [m async for m in storage.iter_messages(session_id)]
+    return {
+        "turns": args.turns,
+        "messages_stored": session.message_count,
+        "first_turns_p50_ms": round(statistics.median(latencies[len(TURNS):len(TURNS) + args.bucket]), 2),
+        "last_turns_p50_ms": round(statistics.median(latencies[-args.bucket:]), 2),
+        "context_messages": len(context),
+        "context_tokens": sum(estimate_tokens(m["content"]) for m in context),
+        "burst_turns": args.burst,
+        "messages_expected": 2 * (args.turns + args.burst),
+        "messages_after_burst": len(stored),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--bucket", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=10)
+    args = parser.parse_args()
+    result = asyncio.run(main(args))
+    for key, value in result.items():
+        print(f"{key:>20}: {value}")
+    if result["messages_after_burst"] != result["messages_expected"]:
+        sys.exit("concurrent turns lost messages")
@@ -0,0 +1,142 @@
+"""Per-node model routing: latency, cost and answers against a fake model registry.
+
+The registry builds a fast model (--fast-latency seconds per call) that
+answers --invalid of the extraction prompts with text that doesn't parse
+and --unsure with no actions, and a large model (--large-latency) that
+always answers. --messages action answers the keyword rules can't handle go
+through extraction (extract_actions) with --concurrency in flight, under:
+
+- large only: every call on the large model
+- routed: fast first, escalated on a parse failure or an empty answer
+- tight budget: routed, with a budget the large model no longer fits
+
+Each reports p50/p95, the share of messages answered, escalations, calls
+skipped for the budget and estimated cost. A routes file is then edited
+under a live router to check the policy reloads. Exits non-zero if routing
+answers fewer messages than the large model alone, or the reload fails.
+
+    cd backend
+    python -m benchmarks.model_router --messages 200 --invalid 0.1 --unsure 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+from app.graphs import extraction
+from app.services import model_router
+from app.services.fake_llm import FakeChatModel
+from app.services.model_router import DEFAULT_POLICY, ModelRegistry, ModelRouter, merge
+from benchmarks import lift_llm_limits
+
+FAST = DEFAULT_POLICY["tiers"]["fast"]["model"]
+LARGE = DEFAULT_POLICY["tiers"]["large"]["model"]
+NODE = "extract_actions"
+
+
+def fake_registry(args) -> ModelRegistry:
+    def fast(messages) -> str:
+        case = int(re.search(r"case (\d+)", messages[-1].content).group(1)) % 100
+        if case < args.invalid * 100:
+            return "They mostly bookmark recipes and follow chefs."
+        if case < (args.invalid + args.unsure) * 100:
+            return json.dumps({"actions": []})
+        return json.dumps({"actions": ["recipe_bookmarked", "chef_followed"]})
+
+    def large(messages) -> str:
+        return json.dumps({"actions": ["recipe_bookmarked", "chef_followed"]})
+
+    models = {
+        FAST: FakeChatModel(latency=args.fast_latency, responder=fast),
+        LARGE: FakeChatModel(latency=args.large_latency, responder=large),
+    }
+    return ModelRegistry(lambda model, temperature: models[model])
+
+
+async def run(args, overrides: dict) -> dict:
+    router = model_router._router = ModelRouter(merge(DEFAULT_POLICY, overrides), fake_registry(args), overrides="", routes_file="")
+    slots = asyncio.Semaphore(args.concurrency)
+    latencies, answered = [], 0
+
+    async def one(i: int) -> None:
+        nonlocal answered
+        async with slots:
+            start = time.perf_counter()
+            result = await extraction.extract(None, f"Users bookmark recipes and follow chefs, case {i}", "actions", node=NODE)
+            latencies.append((time.perf_counter() - start) * 1000)
+            answered += extraction.answers(result, "actions")
+
+    await asyncio.gather(*(one(i) for i in range(args.messages)))
+    stats = router.stats()["nodes"][NODE]
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        "answered": round(answered / args.messages, 3),
+        "escalations": stats["escalations"],
+        "budget_skips": stats["budget_skips"],
+        "calls": {model: m["calls"] for model, m in stats["models"].items()},
+        "cost_usd": stats["cost_usd"],
+    }
+
+
+def check_reload(root: str) -> bool:
+    """Edit a routes file under a live router: the node's tier follows the file"""
+    path = os.path.join(root, "routes.json")
+    with open(path, "w") as f:
+        json.dump({"nodes": {NODE: {"tier": "large"}}}, f)
+    router = ModelRouter(overrides="", routes_file=path, reload_interval=0)
+    before = router.route(NODE).tier
+    with open(path, "w") as f:
+        json.dump({"nodes": {NODE: {"tier": "fast", "latency_budget_ms": 1500}}}, f)
+    os.utime(path, (time.time() + 1, time.time() + 1))
+    after = router.route(NODE)
+    with open(path, "w") as f:
+        f.write('{"nodes": {"extract_actions": {"tier": "huge"}}}')
+    os.utime(path, (time.time() + 2, time.time() + 2))
+    kept = router.route(NODE).tier  # Unknown tier: the file is ignored
+    return (before, after.tier, after.latency_budget_ms, kept) == ("large", "fast", 1500, "fast")
+
+
+async def main(args) -> int:
+    lift_llm_limits()
+    scenarios = {
+        "large only": {"nodes": {NODE: {"tier": "large", "escalate_to": None}}},
+        "routed": {},
+        "tight budget": {"nodes": {NODE: {"latency_budget_ms": args.large_latency * 1000}}},
+    }
+    reports = {}
+    for name, overrides in scenarios.items():
+        reports[name] = report = await run(args, overrides)
+        print(name)
+        for key, value in report.items():
+            print(f"  {key:>14}: {value}")
+
+    with tempfile.TemporaryDirectory() as root:
+        reloaded = check_reload(root)
+    print(f"policy reload: {'ok' if reloaded else 'FAILED'}")
+
+    failures = []
+    if reports["routed"]["answered"] < reports["large only"]["answered"]:
+        failures.append("routing answered fewer messages than the large model")
+    if not reloaded:
+        failures.append("routes file edits were not picked up")
+    if failures:
+        sys.exit("; ".join(failures))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--invalid", type=float, default=0.1)
+    parser.add_argument("--unsure", type=float, default=0.1)
+    parser.add_argument("--fast-latency", type=float, default=0.1)
+    parser.add_argument("--large-latency", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,86 @@
+"""Reply latency per setup step with and without speculative next replies.
+
+Runs --sessions setup conversations (the api_load turns) through
+POST /api/v1/sessions/{id}/message with the fake LLM (--latency seconds per
+call) and in-memory storage, once with speculation off and once on. The
+simulated user takes --think seconds to answer each reply. Reports p50 reply
+latency per turn and the speculation hit rate, then checks that predictions
+of abandoned sessions stay within the size limit and expire.
+
+    cd backend
+    python -m benchmarks.speculation --sessions 10 --latency 0.5 --think 1
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+from app.api import chat, setup
+from app.graphs import conversation_graph
+from app.main import app
+from app.services import speculation
+from app.services.fake_llm import FakeChatModel
+from benchmarks.api_load import TURNS
+
+app.include_router(setup.router, prefix="/api/v1")
+app.include_router(chat.router, prefix="/api/v1")
+
+
+async def conversation(client, latencies, think: float) -> None:
+    session_id = (await client.post("/api/v1/sessions", json={})).json()["id"]
+    for turn, message in enumerate(TURNS):
+        start = time.perf_counter()
+        response = await client.post(f"/api/v1/sessions/{session_id}/message", json={"message": message})
+        latencies[turn].append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+        # The user reads the reply before answering
+        await asyncio.sleep(think)
+
+
+async def run(args, enabled: bool) -> dict:
+    speculation._speculator = speculator = speculation.Speculator(enabled=enabled)
+    latencies = [[] for _ in TURNS]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(*(conversation(client, latencies, args.think) for _ in range(args.sessions)))
+    await speculator.close()
+    return {"p50_ms": [round(statistics.median(values), 1) for values in latencies], **speculator.stats()}
+
+
+async def check_abandoned(limit: int) -> bool:
+    """10x `limit` sessions that never come back: at most `limit` kept, none past the TTL"""
+    speculator = speculation.Speculator(enabled=True, max_sessions=limit, ttl=0.05)
+    for i in range(limit * 10):
+        speculator.prepare(f"ssn_{i}", 2, "ask_goals", lambda: {"reply": "What are your goals?"})
+    await asyncio.sleep(0)
+    capped = speculator.stats()["prepared"]
+    await asyncio.sleep(0.1)
+    speculator.prepare("ssn_new", 2, "ask_goals", lambda: None)
+    await asyncio.sleep(0)
+    expired = speculator.stats()["prepared"]
+    print(f"abandoned sessions: {capped} of {limit * 10} kept (limit {limit}), {expired} after the TTL")
+    return capped == limit and expired == 1
+
+
+async def main(args) -> None:
+    conversation_graph.llm = FakeChatModel(latency=args.latency)
+    for enabled in (False, True):
+        report = await run(args, enabled)
+        print(f"speculation {'on' if enabled else 'off'}")
+        for turn, (message, p50) in enumerate(zip(TURNS, report["p50_ms"])):
+            print(f"  turn {turn + 1} {message[:40]!r:>44}: p50 {p50:8.1f} ms")
+        if enabled:
+            print(f"  turns: {report['turns']}  hit rate: {report['hit_rate']}  mismatches: {report['mismatches']}")
+    if not await check_abandoned(args.sessions):
+        sys.exit("predictions of abandoned sessions were not evicted")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--think", type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
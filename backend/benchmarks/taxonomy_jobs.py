@@ -0,0 +1,112 @@
+"""Taxonomy build jobs: fan-out, chat latency while they run, and crash resume.
+
+Sessions get --events key actions; each taxonomy job makes one fake LLM call
+per event (--latency seconds each). Reports:
+
+- job time against one call after another (the per-event fan-out)
+- chat turn p50 with no job running and while --jobs jobs build, with
+  --llm-concurrency provider slots shared by both (chat goes first)
+- a job whose runner is stopped halfway and started again on the same
+  queue: LLM calls made in total (one per event when nothing is redone)
+
+    cd backend
+    python -m benchmarks.taxonomy_jobs --events 12 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from app.api import chat, setup
+from app.graphs import conversation_graph, taxonomy_builder
+from app.main import app
+from app.services import jobs, llm_scheduler, storage
+from app.services.fake_llm import FakeChatModel
+
+app.include_router(setup.router, prefix="/api/v1")
+app.include_router(chat.router, prefix="/api/v1")
+
+CHAT_TURNS = 20
+
+
+async def make_session(events: int) -> str:
+    session = await storage.create_session()
+    session.key_actions = [f"action {i}" for i in range(events)]
+    session.product_description = "An online store selling handmade goods"
+    await storage.update_session(session)
+    return session.id
+
+
+async def wait(client, job_id: str) -> dict:
+    while True:
+        job = (await client.get(f"/api/v1/taxonomy/jobs/{job_id}")).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        await asyncio.sleep(0.05)
+
+
+async def chat_p50(client, session_id: str) -> float:
+    latencies = []
+    for turn in range(CHAT_TURNS):
+        start = time.perf_counter()
+        response = await client.post(f"/api/v1/sessions/{session_id}/message", json={"message": f"We sell item {turn}"})
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+async def main(args) -> dict:
+    llm_scheduler._scheduler = llm_scheduler.LLMScheduler(max_concurrency=args.llm_concurrency)
+    conversation_graph.llm = FakeChatModel(latency=args.chat_latency)
+    taxonomy_builder.llm = builder = FakeChatModel(latency=args.latency)
+    report = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        chat_session = (await client.post("/api/v1/sessions", json={})).json()["id"]
+        report["chat_p50_idle_ms"] = round(await chat_p50(client, chat_session), 1)
+
+        sessions = [await make_session(args.events) for _ in range(args.jobs)]
+        start = time.perf_counter()
+        submitted = [(await client.post("/api/v1/taxonomy/jobs", json={"session_id": s})).json() for s in sessions]
+        again = (await client.post("/api/v1/taxonomy/jobs", json={"session_id": sessions[0]})).json()
+        report["resubmit_same_job"] = again["id"] == submitted[0]["id"]
+        report["chat_p50_during_jobs_ms"] = round(await chat_p50(client, chat_session), 1)
+        finished = [await wait(client, job["id"]) for job in submitted]
+        report["jobs_seconds"] = round(time.perf_counter() - start, 2)
+        report["sequential_seconds"] = round(args.jobs * args.events * args.latency, 2)
+        report["jobs_done"] = sum(job["status"] == "done" for job in finished)
+        taxonomy = finished[0]["result"]["taxonomy"]
+        report["event_properties"] = taxonomy["canonical_events"][0]["required_properties"]
+
+        # Stop the runner halfway through a job, then start a new one on the same queue
+        session_id = await make_session(args.events)
+        builder.calls = 0
+        job = (await client.post("/api/v1/taxonomy/jobs", json={"session_id": session_id})).json()
+        while jobs.get_runner().get(job["id"]).done < args.events // 2:
+            await asyncio.sleep(0.01)
+        await jobs.get_runner().close()
+        runner = jobs.get_runner()
+        runner.start()
+        report["resumed_status"] = (await wait(client, job["id"]))["status"]
+        report["resume_llm_calls"] = builder.calls
+        report["resumed_steps"] = runner.stats()["steps"]["resumed"]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=12)
+    parser.add_argument("--jobs", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--chat-latency", type=float, default=0.05)
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["JOBS_DB"] = os.path.join(root, "jobs.db")
+        for key, value in asyncio.run(main(args)).items():
+            print(f"{key:>24}: {value}")
@@ -0,0 +1,64 @@
+-- Setup sessions: header row per session, messages in an append-only table.
+-- Each chat turn is persisted with one call to append_session_turn().
+
+create table if not exists setup_sessions (
+    id text primary key,
+    project_id text,
+    status text not null default 'active',
+    product_description text,
+    domain text,
+    key_actions jsonb not null default '[]',
+    user_segments jsonb not null default '[]',
+    business_goals jsonb not null default '[]',
+    message_count integer not null default 0,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create table if not exists conversation_messages (
+    session_id text not null references setup_sessions (id) on delete cascade,
+    seq integer not null,
+    role text not null,
+    content text not null,
+    metadata jsonb,
+    created_at timestamptz not null default now(),
+    primary key (session_id, seq)
+);
+
+-- Apply changed header fields and append new messages in one transaction.
+-- p_changes: {"column": value, ...} (only the columns that changed)
+-- p_messages: [{"seq", "role", "content", "created_at"}, ...]
+create or replace function append_session_turn(
+    p_session_id text,
+    p_changes jsonb,
+    p_messages jsonb
+) returns void
+language plpgsql
+as $$
+declare
+    r setup_sessions;
+begin
+    if p_changes <> '{}'::jsonb then
+        select * into r from setup_sessions where id = p_session_id for update;
+        r := jsonb_populate_record(r, p_changes);
+
+        update setup_sessions set
+            project_id = r.project_id,
+            status = r.status,
+            product_description = r.product_description,
+            domain = r.domain,
+            key_actions = r.key_actions,
+            user_segments = r.user_segments,
+            business_goals = r.business_goals,
+            message_count = r.message_count,
+            updated_at = r.updated_at
+        where id = p_session_id;
+    end if;
+
+    insert into conversation_messages (session_id, seq, role, content, created_at)
+    select p_session_id, m.seq, m.role, m.content, m.created_at
+    from jsonb_to_recordset(p_messages) as m(seq integer, role text, content text, created_at timestamptz)
+    -- Safe to retry: messages already stored by a lost-response attempt are skipped
+    on conflict (session_id, seq) do nothing;
+end;
+$$;
@@ -0,0 +1,39 @@
+-- Persist the conversation graph step so a session resumes where it stopped
+-- instead of guessing from the message history.
+
+alter table setup_sessions add column if not exists current_step text;
+
+create or replace function append_session_turn(
+    p_session_id text,
+    p_changes jsonb,
+    p_messages jsonb
+) returns void
+language plpgsql
+as $$
+declare
+    r setup_sessions;
+begin
+    if p_changes <> '{}'::jsonb then
+        select * into r from setup_sessions where id = p_session_id for update;
+        r := jsonb_populate_record(r, p_changes);
+
+        update setup_sessions set
+            project_id = r.project_id,
+            status = r.status,
+            product_description = r.product_description,
+            domain = r.domain,
+            key_actions = r.key_actions,
+            user_segments = r.user_segments,
+            business_goals = r.business_goals,
+            current_step = r.current_step,
+            message_count = r.message_count,
+            updated_at = r.updated_at
+        where id = p_session_id;
+    end if;
+
+    insert into conversation_messages (session_id, seq, role, content, created_at)
+    select p_session_id, m.seq, m.role, m.content, m.created_at
+    from jsonb_to_recordset(p_messages) as m(seq integer, role text, content text, created_at timestamptz)
+    on conflict (session_id, seq) do nothing;
+end;
+$$;
@@ -0,0 +1,42 @@
+-- Labeled elements with their MinHash signatures, for duplicate detection
+-- (app/services/element_index.py). One row per element: labeling writes one
+-- row, concurrent labelers don't overwrite each other, and an index reads
+-- only the rows past the last one it saw (`row_id` is bumped when an element
+-- is re-labeled).
+
+create table if not exists session_elements (
+    row_id bigint generated by default as identity primary key,
+    session_id text not null references setup_sessions (id) on delete cascade,
+    id text not null,
+    intent text not null,
+    selector text not null,
+    page_url text not null,
+    page_type text,
+    signature jsonb not null,
+    created_at timestamptz not null default now(),
+    unique (session_id, id)
+);
+
+create index if not exists session_elements_session_row on session_elements (session_id, row_id);
+
+-- p_element: {"id", "intent", "selector", "page_url", "page_type", "signature", "created_at"}
+create or replace function upsert_session_element(
+    p_session_id text,
+    p_element jsonb
+) returns void
+language sql
+as $$
+    insert into session_elements (session_id, id, intent, selector, page_url, page_type, signature, created_at)
+    values (
+        p_session_id, p_element->>'id', p_element->>'intent', p_element->>'selector', p_element->>'page_url',
+        p_element->>'page_type', p_element->'signature', coalesce((p_element->>'created_at')::timestamptz, now())
+    )
+    on conflict (session_id, id) do update set
+        row_id = nextval(pg_get_serial_sequence('session_elements', 'row_id')),
+        intent = excluded.intent,
+        selector = excluded.selector,
+        page_url = excluded.page_url,
+        page_type = excluded.page_type,
+        signature = excluded.signature,
+        created_at = excluded.created_at;
+$$;
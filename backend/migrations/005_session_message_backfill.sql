@@ -0,0 +1,102 @@
+-- Messages of sessions created before 001, which kept the whole history in
+-- the setup_sessions.messages array, and seq numbers allocated here instead
+-- of by the client.
+--
+-- append_session_turn() numbers a turn's messages from the stored
+-- message_count while it holds the session row lock, so two turns on one
+-- session get consecutive ranges instead of the same seq (the old
+-- client-computed seq plus "on conflict do nothing" silently dropped the
+-- second turn's messages). p_turn_id replaces that conflict clause as the
+-- retry guard: a turn whose messages are already stored is not appended again.
+
+alter table setup_sessions add column if not exists message_count integer not null default 0;
+alter table conversation_messages add column if not exists turn_id text;
+create index if not exists conversation_messages_turn on conversation_messages (session_id, turn_id);
+
+do $$
+begin
+    if exists (
+        select 1 from information_schema.columns
+        where table_schema = current_schema() and table_name = 'setup_sessions' and column_name = 'messages'
+    ) then
+        -- Turns stored since 001 started at seq 0: move them after the old history
+        create temporary table old_history on commit drop as
+        select id as session_id, messages, jsonb_array_length(messages) as n
+        from setup_sessions
+        where jsonb_typeof(messages) = 'array' and jsonb_array_length(messages) > 0;
+
+        -- Two steps through negative numbers so no row collides with another mid-update
+        update conversation_messages c set seq = -(c.seq + o.n) - 1
+        from old_history o where c.session_id = o.session_id;
+        update conversation_messages set seq = -seq - 1 where seq < 0;
+
+        insert into conversation_messages (session_id, seq, role, content, created_at)
+        select o.session_id, m.position - 1, m.value->>'role', m.value->>'content',
+               coalesce((m.value->>'timestamp')::timestamptz, s.created_at)
+        from old_history o
+        join setup_sessions s on s.id = o.session_id
+        cross join lateral jsonb_array_elements(o.messages) with ordinality as m(value, position);
+
+        update setup_sessions s set message_count = s.message_count + o.n
+        from old_history o where s.id = o.session_id;
+
+        -- Renamed rather than dropped; running this migration again is a no-op
+        alter table setup_sessions rename column messages to messages_before_001;
+    end if;
+end;
+$$;
+
+-- p_changes: {"column": value, ...} (only the columns that changed; message_count is ignored)
+-- p_messages: [{"role", "content", "created_at"}, ...]
+-- Returns the session's message_count after the turn.
+drop function if exists append_session_turn(text, jsonb, jsonb);
+
+create or replace function append_session_turn(
+    p_session_id text,
+    p_changes jsonb,
+    p_messages jsonb,
+    p_turn_id text default null
+) returns integer
+language plpgsql
+as $$
+declare
+    r setup_sessions;
+    first_seq integer;
+begin
+    select * into r from setup_sessions where id = p_session_id for update;
+    if not found then
+        raise exception 'Session % not found', p_session_id;
+    end if;
+
+    -- A retry after a lost response: the first attempt already committed
+    if p_turn_id is not null and exists (
+        select 1 from conversation_messages where session_id = p_session_id and turn_id = p_turn_id
+    ) then
+        return r.message_count;
+    end if;
+
+    first_seq := r.message_count;
+    r := jsonb_populate_record(r, p_changes - 'message_count');
+
+    update setup_sessions set
+        project_id = r.project_id,
+        status = r.status,
+        product_description = r.product_description,
+        domain = r.domain,
+        key_actions = r.key_actions,
+        user_segments = r.user_segments,
+        business_goals = r.business_goals,
+        current_step = r.current_step,
+        taxonomy = r.taxonomy,
+        message_count = first_seq + jsonb_array_length(p_messages),
+        updated_at = r.updated_at
+    where id = p_session_id;
+
+    insert into conversation_messages (session_id, seq, role, content, created_at, turn_id)
+    select p_session_id, first_seq + m.position - 1, m.value->>'role', m.value->>'content',
+           (m.value->>'created_at')::timestamptz, p_turn_id
+    from jsonb_array_elements(p_messages) with ordinality as m(value, position);
+
+    return first_seq + jsonb_array_length(p_messages);
+end;
+$$;
@@ -0,0 +1,54 @@
+"""Import-time budget for the API entry point.
+
+LangChain, LangGraph and the OpenAI client load on first use or in the
+background warm-up, not when app.main is imported. Each check imports
+app.main in a fresh interpreter; IMPORT_BUDGET_MS sets the budget.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+RUNS = 3
+
+# Must not be imported by `import app.main`
+DEFERRED = ["langgraph", "langchain", "langchain_core", "langchain_openai", "openai"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "eager": sorted(m for m in %r if m in sys.modules),
+}))
+""" % (DEFERRED,)
+
+
+def measure() -> dict:
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-import-check")}
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.fixture(scope="module")
+def runs():
+    measure()  # Warms the bytecode cache; not counted
+    return [measure() for _ in range(RUNS)]
+
+
+def test_heavy_libraries_are_not_imported(runs):
+    assert sorted({m for r in runs for m in r["eager"]}) == []
+
+
+def test_import_within_budget(runs):
+    median_ms = statistics.median(r["seconds"] for r in runs) * 1000
+    assert median_ms <= BUDGET_MS, f"import app.main took {median_ms:.0f} ms (budget {BUDGET_MS:.0f} ms)"
@@ -0,0 +1,170 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.services.fake_llm import FakeChatModel, FakeRateLimitError
+from app.services.llm_scheduler import BACKGROUND, INTERACTIVE, LLMScheduler, TokenBucket, background
+
+
+def scheduler(**kwargs) -> LLMScheduler:
+    """Scheduler with no rate limits unless given"""
+    kwargs.setdefault("requests_per_minute", 0)
+    kwargs.setdefault("tokens_per_minute", 0)
+    return LLMScheduler(**kwargs)
+
+
+def prompt(text: str):
+    return [HumanMessage(content=text)]
+
+
+def recording_model(order: list, **kwargs) -> FakeChatModel:
+    """Fake model that appends each prompt to `order` as it answers"""
+
+    def responder(messages) -> str:
+        order.append(messages[-1].content)
+        return "ok"
+
+    return FakeChatModel(responder=responder, **kwargs)
+
+
+def test_interactive_calls_go_ahead_of_queued_background_calls():
+    order = []
+    llm = recording_model(order, latency=0.02)
+    calls = scheduler(max_concurrency=1)
+
+    async def run():
+        blocker = asyncio.ensure_future(calls.ainvoke(llm, prompt("first")))
+        await asyncio.sleep(0)  # Holds the only slot
+        with background():
+            queued = [asyncio.ensure_future(calls.ainvoke(llm, prompt(f"background {i}"))) for i in range(3)]
+        await asyncio.sleep(0)
+        chat = calls.ainvoke(llm, prompt("chat"))
+        await asyncio.gather(blocker, chat, *queued)
+
+    asyncio.run(run())
+    assert order == ["first", "chat", "background 0", "background 1", "background 2"]
+
+
+def test_explicit_priority_overrides_the_context():
+    order = []
+    llm = recording_model(order, latency=0.02)
+    calls = scheduler(max_concurrency=1)
+
+    async def run():
+        blocker = asyncio.ensure_future(calls.ainvoke(llm, prompt("first")))
+        await asyncio.sleep(0)
+        later = asyncio.ensure_future(calls.ainvoke(llm, prompt("background"), priority=BACKGROUND))
+        await asyncio.sleep(0)
+        with background():
+            urgent = calls.ainvoke(llm, prompt("interactive"), priority=INTERACTIVE)
+            await asyncio.gather(blocker, later, urgent)
+
+    asyncio.run(run())
+    assert order == ["first", "interactive", "background"]
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(per_minute=60, burst_seconds=2)  # 1 per second, holds 2
+    now = bucket.updated
+    assert bucket.delay(2, now) == 0
+    bucket.take(2)
+    assert bucket.delay(1, now) == pytest.approx(1.0)
+    assert bucket.delay(1, now + 0.5) == pytest.approx(0.5)
+    assert bucket.delay(5, now + 10) == 0  # Capped at the bucket size, which is full again
+
+
+def test_requests_per_minute_limits_dispatch():
+    llm = FakeChatModel()
+    calls = scheduler(requests_per_minute=600, burst_seconds=0.1)  # 10/s, bursts of 1
+
+    async def run():
+        await asyncio.gather(*(calls.ainvoke(llm, prompt(f"call {i}")) for i in range(5)))
+
+    start = time.monotonic()
+    asyncio.run(run())
+    assert time.monotonic() - start >= 0.35
+    assert llm.calls == 5
+
+
+def test_tokens_per_minute_limits_dispatch():
+    llm = FakeChatModel()
+    # Each call is estimated at ~260 tokens; the bucket holds one and refills it in ~0.1 s
+    calls = scheduler(tokens_per_minute=160_000, burst_seconds=0.1)
+
+    async def run():
+        await asyncio.gather(*(calls.ainvoke(llm, prompt(f"call {i}")) for i in range(4)))
+
+    start = time.monotonic()
+    asyncio.run(run())
+    assert time.monotonic() - start >= 0.25
+
+
+def test_rate_limited_call_is_retried_after_retry_after():
+    llm = FakeChatModel(rate_limit=1, rate_window=0.2)
+    calls = scheduler(max_concurrency=4)
+
+    async def run():
+        return await asyncio.gather(calls.ainvoke(llm, prompt("a")), calls.ainvoke(llm, prompt("b")))
+
+    start = time.monotonic()
+    results = asyncio.run(run())
+    assert len(results) == 2
+    assert time.monotonic() - start >= 0.15
+    assert llm.rejected == 1
+    stats = calls.stats()
+    assert (stats["rate_limited"], stats["retries"]) == (1, 1)
+    assert stats["concurrency_limit"] < 4  # Halved on the 429, growing back by one per window
+
+
+def test_rate_limit_without_retry_after_backs_off_exponentially():
+    failures = []
+
+    def responder(messages) -> str:
+        if len(failures) < 2:
+            failures.append(time.monotonic())
+            raise FakeRateLimitError(0)
+        return "ok"
+
+    llm = FakeChatModel(responder=responder)
+    calls = scheduler(backoff_seconds=0.05)
+    start = time.monotonic()
+    assert asyncio.run(calls.ainvoke(llm, prompt("a"))).content == "ok"
+    # ~0.05 s, then ~0.1 s (each +-20%)
+    assert failures[1] - failures[0] >= 0.04
+    assert time.monotonic() - failures[1] >= 0.08
+    assert time.monotonic() - start >= 0.12
+    assert calls.stats()["retries"] == 2
+
+
+def test_rate_limit_error_raised_after_the_last_retry():
+    llm = FakeChatModel(rate_limit=1, rate_window=60)
+    calls = scheduler(max_retries=0)
+
+    async def run():
+        await calls.ainvoke(llm, prompt("a"))
+        await calls.ainvoke(llm, prompt("b"))
+
+    with pytest.raises(FakeRateLimitError):
+        asyncio.run(run())
+
+
+def test_identical_in_flight_prompts_share_one_call():
+    llm = FakeChatModel(latency=0.05)
+    calls = scheduler()
+
+    async def run():
+        return await asyncio.gather(
+            *(calls.ainvoke(llm, prompt("same")) for _ in range(5)),
+            calls.ainvoke(llm, prompt("different")),
+        )
+
+    results = asyncio.run(run())
+    assert llm.calls == 2
+    assert calls.stats()["coalesced"] == 4
+    assert len({r.content for r in results[:5]}) == 1
+
+    # Finished calls aren't reused
+    asyncio.run(calls.ainvoke(llm, prompt("same")))
+    assert llm.calls == 3
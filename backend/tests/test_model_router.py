@@ -0,0 +1,119 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from langchain_core.messages import HumanMessage
+
+from app.services.fake_llm import FakeChatModel
+from app.services.model_router import DEFAULT_POLICY, ModelRegistry, ModelRouter, merge
+
+FAST = DEFAULT_POLICY["tiers"]["fast"]["model"]
+LARGE = DEFAULT_POLICY["tiers"]["large"]["model"]
+NODE = "extract_actions"
+ANSWER = json.dumps({"actions": ["recipe_bookmarked"]})
+MESSAGES = [HumanMessage(content="Users bookmark recipes")]
+
+
+def fake_router(fast_answer: str = ANSWER, **kwargs):
+    """Router over a registry of fake models: (router, {model: fake})"""
+    models = {
+        FAST: FakeChatModel(responder=lambda messages: fast_answer),
+        LARGE: FakeChatModel(responder=lambda messages: ANSWER),
+    }
+    registry = ModelRegistry(lambda model, temperature: models[model])
+    kwargs.setdefault("overrides", "")
+    kwargs.setdefault("routes_file", "")
+    return ModelRouter(registry=registry, **kwargs), models
+
+
+def complete(router, confident=None):
+    return asyncio.run(router.complete(NODE, MESSAGES, json.loads, confident))
+
+
+def test_nodes_route_to_their_tier():
+    router, models = fake_router()
+    assert router.route(NODE).tiers() == ["fast", "large"]
+    assert router.route("taxonomy_event").tiers() == ["large"]
+    assert router.route("not_a_node").tier == DEFAULT_POLICY["default"]["tier"]
+    assert router.model(NODE) is models[FAST]
+    assert router.model(NODE, "large") is models[LARGE]
+
+    assert complete(router) == {"actions": ["recipe_bookmarked"]}
+    assert (models[FAST].calls, models[LARGE].calls) == (1, 0)
+
+
+def test_unparseable_answer_escalates():
+    router, models = fake_router("They mostly bookmark recipes.")
+    assert complete(router) == {"actions": ["recipe_bookmarked"]}
+    assert (models[FAST].calls, models[LARGE].calls) == (1, 1)
+    assert router.stats()["nodes"][NODE]["escalations"] == {"invalid": 1, "low_confidence": 0}
+
+
+def test_unconfident_answer_escalates():
+    router, models = fake_router(json.dumps({"actions": []}))
+    assert complete(router, lambda result: bool(result["actions"])) == {"actions": ["recipe_bookmarked"]}
+    assert (models[FAST].calls, models[LARGE].calls) == (1, 1)
+    assert router.stats()["nodes"][NODE]["escalations"] == {"invalid": 0, "low_confidence": 1}
+
+
+def test_escalation_skipped_when_it_would_miss_the_budget():
+    router, models = fake_router(json.dumps({"actions": []}))
+    router.record("other_node", LARGE, 60.0, 100, ANSWER)  # Large model now expected to take a minute
+    assert complete(router, lambda result: bool(result["actions"])) == {"actions": []}
+    assert models[LARGE].calls == 0
+    assert router.stats()["nodes"][NODE]["budget_skips"] == 1
+
+
+def test_stats_per_node_and_model():
+    router, _ = fake_router("not json")
+    complete(router)
+    router.record("product_discovery", LARGE, 0.5, 400, "x" * 40, {"token_usage": {"prompt_tokens": 100, "completion_tokens": 10}})
+
+    nodes = router.stats()["nodes"]
+    assert nodes[NODE]["calls"] == 1
+    assert {model: m["calls"] for model, m in nodes[NODE]["models"].items()} == {FAST: 1, LARGE: 1}
+    assert nodes[NODE]["cost_usd"] > 0
+    reply = nodes["product_discovery"]
+    assert reply["models"][LARGE]["tokens"] == 110
+    assert reply["cost_usd"] == round((100 * 0.01 + 10 * 0.03) / 1000, 6)
+
+
+def _write(path, overrides: dict, bump: float) -> None:
+    path.write_text(json.dumps(overrides))
+    os.utime(path, (time.time() + bump, time.time() + bump))
+
+
+def test_routes_file_reloads(tmp_path):
+    path = tmp_path / "routes.json"
+    _write(path, {"nodes": {NODE: {"tier": "large"}}}, 0)
+    router, _ = fake_router(routes_file=str(path), reload_interval=0)
+    assert router.route(NODE).tier == "large"
+
+    _write(path, {"nodes": {NODE: {"tier": "fast", "latency_budget_ms": 1500}}}, 1)
+    route = router.route(NODE)
+    assert (route.tier, route.latency_budget_ms) == ("fast", 1500)
+
+    _write(path, {"nodes": {NODE: {"tier": "huge"}}}, 2)  # Unknown tier: file ignored
+    assert router.route(NODE).tier == "fast"
+
+
+def test_routes_file_checked_once_per_interval(tmp_path):
+    path = tmp_path / "routes.json"
+    _write(path, {"nodes": {NODE: {"tier": "large"}}}, 0)
+    router, _ = fake_router(routes_file=str(path), reload_interval=60)
+    assert router.route(NODE).tier == "large"
+
+    _write(path, {"nodes": {NODE: {"tier": "fast"}}}, 1)
+    assert router.route(NODE).tier == "large"
+    assert router.reload()
+    assert router.route(NODE).tier == "fast"
+
+
+def test_invalid_model_routes_fall_back_to_defaults(caplog):
+    with caplog.at_level(logging.ERROR, logger="app.services.model_router"):
+        for overrides in ("{not json", '["fast"]', '{"nodes": {"extract_goals": {"tier": "huge"}}}'):
+            router, _ = fake_router(overrides=overrides)
+            assert router.policy == merge(DEFAULT_POLICY, {})
+    assert len(caplog.records) == 3